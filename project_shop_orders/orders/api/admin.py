@@ -62,3 +62,36 @@ class OrderItemAdmin(admin.ModelAdmin):
 
 admin.site.site_title = 'Админ-панель Сервис заказа товаров для розничных сетей'
 admin.site.site_header = 'Админ-панель Сервис заказа товаров для розничных сетей'
+
+
+@admin.register(Shipment)
+class ShipmentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'shop', 'status', 'total_sum', 'total_quantity', 'created', 'updated', 'counted']
+    search_fields = ('status',)
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'contact', 'created', 'updated', 'archived']
+    search_fields = ('status',)
+
+
+@admin.register(CoPurchase)
+class CoPurchaseAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'related', 'count']
+
+
+@admin.register(RelatedProduct)
+class RelatedProductAdmin(admin.ModelAdmin):
+    list_display = ['id', 'product', 'rank', 'related', 'count']
+
+
+@admin.register(RecommendationState)
+class RecommendationStateAdmin(admin.ModelAdmin):
+    list_display = ['id', 'rebuilt', 'refreshed']
+
+
+@admin.register(BestOffer)
+class BestOfferAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model', 'price', 'quantity', 'shop', 'product']
+    search_fields = ('model',)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'Сервис заказа товаров'
+
+    def ready(self):
+        from api.metrics import instrument_serializers
+        import api.signals  # noqa: F401 подключает обработчики сигналов
+        import api.task_metrics  # noqa: F401 подключает сигналы Celery
+        instrument_serializers()
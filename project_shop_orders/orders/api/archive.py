@@ -0,0 +1,52 @@
+"""
+Перенос старых заказов в архивные таблицы.
+
+Доставленные и отмененные заказы, которые не менялись дольше ORDER_ARCHIVE_DAYS дней,
+копируются в ArchivedOrder/ArchivedOrderItem с теми же идентификаторами и удаляются
+из Order/OrderItem. Таблица проходится окнами по первичному ключу, каждое окно
+переносится в отдельной короткой транзакции.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.metrics import registry
+from api.models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from api.reaper import pk_windows, BATCH_SIZE
+
+
+ARCHIVE_STATUSES = ('delivered', 'canceled')
+
+ORDER_FIELDS = ('id', 'user_id', 'status', 'contact_id', 'created', 'updated', 'version')
+
+ITEM_FIELDS = ('id', 'order_id', 'category_id', 'shop_id', 'product_name', 'external_id', 'quantity', 'price',
+               'total_amount')
+
+
+def archive_orders(days=None, batch_size=BATCH_SIZE):
+    """
+    Переносит в архив завершенные заказы старше days дней.
+    Возвращает {'orders': ..., 'items': ...}.
+    """
+    days = getattr(settings, 'ORDER_ARCHIVE_DAYS', 180) if days is None else days
+    orders = Order.objects.filter(status__in=ARCHIVE_STATUSES, updated__lt=timezone.now() - timedelta(days=days))
+    result = {'orders': 0, 'items': 0}
+    for start, stop in pk_windows(orders, batch_size):
+        with transaction.atomic():
+            rows = list(orders.select_for_update().filter(pk__gte=start, pk__lt=stop).values_list(*ORDER_FIELDS))
+            if not rows:
+                continue
+            ids = [row[0] for row in rows]
+            items = list(OrderItem.objects.filter(order_id__in=ids).values_list(*ITEM_FIELDS))
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(**dict(zip(ORDER_FIELDS, row))) for row in rows])
+            ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**dict(zip(ITEM_FIELDS, row)))
+                                                   for row in items])
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(pk__in=ids).delete()
+        result['orders'] += len(rows)
+        result['items'] += len(items)
+        registry.inc('archive_moved_rows_total', (('table', 'api_order'),), len(rows))
+        registry.inc('archive_moved_rows_total', (('table', 'api_orderitem'),), len(items))
+    return result
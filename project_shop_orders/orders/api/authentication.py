@@ -0,0 +1,110 @@
+"""
+Аутентификация по токену с кэшированием пользователя.
+
+TokenAuthentication из DRF на каждый запрос выполняет запрос Token JOIN User.
+CachedTokenAuthentication хранит снимок пользователя по ключу токена в пространстве
+auth двухуровневого кэша (api.cache). Снимок помечен версией токена из общего кэша,
+и на каждый запрос версия читается заново: удаление токена (выход, ротация) или
+сохранение пользователя (смена пароля, is_active) меняет версию, и снимок перестает
+действовать во всех процессах сразу, а не по истечении AUTH_CACHE_LOCAL_TIMEOUT.
+Массовое изменение пользователей (User.objects.filter(...).update()) сбрасывает
+версии через сигнал users_updated.
+Хэш пароля в снимок не попадает.
+"""
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.cache import TwoTierCache
+from api.models import User
+
+
+token_cache = TwoTierCache('auth', timeout=getattr(settings, 'AUTH_CACHE_TIMEOUT', 300),
+                           local_timeout=getattr(settings, 'AUTH_CACHE_LOCAL_TIMEOUT', 5),
+                           local_size=getattr(settings, 'AUTH_CACHE_LOCAL_SIZE', 10000))
+
+# поля пользователя в снимке; password при обращении загружается из базы
+USER_FIELDS = tuple(field.attname for field in User._meta.concrete_fields if field.name != 'password')
+
+
+def version_key(key):
+    return f'auth:token:{key}'
+
+
+def token_version(key):
+    """
+    Версия снимков токена в общем кэше. Если версии нет (новый токен, сброс,
+    вытеснение), создается новая, поэтому ранее сохраненные снимки не совпадут с ней.
+    """
+    version = cache.get(version_key(key))
+    if version is None:
+        cache.add(version_key(key), uuid4().hex, token_cache.timeout)
+        version = cache.get(version_key(key))
+    return version
+
+
+def make_snapshot(token, version):
+    return {
+        'version': version,
+        'created': token.created,
+        'db': token.user._state.db,
+        'user': tuple(getattr(token.user, name) for name in USER_FIELDS),
+    }
+
+
+def invalidate_tokens(*keys):
+    """
+    Сбрасывает версии токенов и их снимки в общем кэше. Повторяется после фиксации
+    транзакции, чтобы снимок, прочитанный из базы до фиксации, тоже перестал действовать.
+    """
+    if not keys:
+        return
+
+    def drop():
+        cache.delete_many([version_key(key) for key in keys])
+        token_cache.delete(*keys)
+
+    drop()
+    transaction.on_commit(drop)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по заголовку "Authorization: Token <key>" без запроса к базе
+    данных, пока снимок пользователя есть в кэше и его версия совпадает с версией токена.
+    Если задан AUTH_TOKEN_TTL (секунды), токены старше этого срока отклоняются.
+    """
+
+    def authenticate_credentials(self, key):
+        # версия читается до базы: сброс между чтением базы и записью снимка
+        # оставит в кэше снимок с прежней версией, и он не будет использован
+        version = token_version(key)
+        snapshot = token_cache.get(key)
+        if snapshot is None or snapshot['version'] != version:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            snapshot = make_snapshot(token, version)
+            token_cache.set(key, snapshot)
+
+        ttl = getattr(settings, 'AUTH_TOKEN_TTL', None)
+        if ttl and snapshot['created'] + timedelta(seconds=ttl) < timezone.now():
+            Token.objects.filter(key=key).delete()
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+        user = User.from_db(snapshot['db'], USER_FIELDS, snapshot['user'])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        token = Token(key=key, user_id=user.pk, created=snapshot['created'])
+        token.user = user
+        return (user, token)
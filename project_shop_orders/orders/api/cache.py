@@ -0,0 +1,214 @@
+"""
+Двухуровневый кэш проекта.
+
+Первый уровень - ограниченный LRU-кэш в памяти процесса, второй - общий кэш Django
+(Redis). Ключи строятся с версией пространства имен, поэтому все пространство
+сбрасывается одной заменой версии. Версия - случайная строка, а не счетчик: после
+очистки или вытеснения общего кэша она не повторит выданную раньше (ETag каталога,
+записи в памяти процессов). Процессы перечитывают версию из общего кэша
+не чаще раза в poll_interval секунд, так что локальные уровни разных воркеров
+расходятся не дольше этого интервала. get_or_set вычисляет значение один раз на ключ:
+остальные потоки и воркеры ждут результат вместо повторного вычисления.
+"""
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from api.metrics import registry
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру кэш процесса с временем жизни записей.
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    """
+
+    def __init__(self, maxsize=10000, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_MISSING = object()
+
+_namespaces = []
+
+
+class TwoTierCache:
+    """
+    Пространство имен двухуровневого кэша.
+    Аргументы:
+        namespace (str): префикс ключей и метка в метриках.
+        timeout (int): время жизни записей в общем кэше, секунды.
+        local_timeout (int): время жизни записей в памяти процесса, секунды.
+        local_size (int): максимальное число записей в памяти процесса.
+        poll_interval (float): как часто перечитывать версию пространства имен.
+        lock_timeout (int): сколько секунд другие воркеры ждут вычисления значения.
+    """
+
+    def __init__(self, namespace, timeout=300, local_timeout=5, local_size=10000, poll_interval=1, lock_timeout=10):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local = LRUCache(maxsize=local_size, timeout=local_timeout)
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._version = None
+        self._checked = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        _namespaces.append(self)
+
+    @property
+    def version_key(self):
+        return f'{self.namespace}:version'
+
+    def version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._checked >= self.poll_interval:
+            version = cache.get(self.version_key)
+            if version is None:
+                version = uuid4().hex
+                cache.add(self.version_key, version, None)
+                version = cache.get(self.version_key, version)
+            self._version, self._checked = version, now
+        return self._version
+
+    def make_key(self, key):
+        return f'{self.namespace}:{self.version()}:{key}'
+
+    def _count(self, result):
+        registry.inc('cache_requests_total', (('namespace', self.namespace), ('result', result)))
+
+    def _get(self, full_key):
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count('local_hit')
+            return value
+        value = cache.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count('shared_hit')
+            self.local.set(full_key, value)
+            return value
+        self._count('miss')
+        return _MISSING
+
+    def get(self, key, default=None):
+        value = self._get(self.make_key(key))
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=None):
+        full_key = self.make_key(key)
+        cache.set(full_key, value, self.timeout if timeout is None else timeout)
+        self.local.set(full_key, value)
+
+    def delete(self, *keys):
+        """
+        Удаляет ключи из общего кэша и из памяти текущего процесса. Другие процессы
+        могут отдавать свою копию до истечения local_timeout; если это недопустимо,
+        значение нужно сверять с версией в общем кэше (см. api.authentication).
+        """
+        full_keys = [self.make_key(key) for key in keys]
+        for full_key in full_keys:
+            self.local.delete(full_key)
+        cache.delete_many(full_keys)
+
+    def get_or_set(self, key, default, timeout=None):
+        """
+        Значение по ключу; при промахе вызывает default() и кладет результат в кэш.
+        Одновременно значение вычисляет только один поток во всех воркерах.
+        """
+        full_key = self.make_key(key)
+        value = self._get(full_key)
+        if value is not _MISSING:
+            return value
+
+        with self._locks_guard:
+            lock = self._locks.setdefault(full_key, threading.Lock())
+        with lock:
+            value = self.local.get(full_key, _MISSING)
+            if value is _MISSING:
+                value = self._compute(full_key, default, timeout)
+        with self._locks_guard:
+            self._locks.pop(full_key, None)
+        return value
+
+    def _compute(self, full_key, default, timeout):
+        lock_key = f'lock:{full_key}'
+        token = uuid4().hex
+        owned = cache.add(lock_key, token, self.lock_timeout)
+        if not owned:
+            # значение уже вычисляет другой воркер; если он не успел за lock_timeout,
+            # значение вычисляется без блокировки, а чужая блокировка не трогается
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                value = cache.get(full_key, _MISSING)
+                if value is not _MISSING:
+                    self.local.set(full_key, value)
+                    return value
+                time.sleep(0.05)
+                owned = cache.add(lock_key, token, self.lock_timeout)
+                if owned:
+                    break
+        try:
+            value = default()
+            cache.set(full_key, value, self.timeout if timeout is None else timeout)
+            self.local.set(full_key, value)
+            return value
+        finally:
+            # блокировка могла истечь и достаться другому воркеру: удаляется только своя
+            if owned and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def invalidate(self):
+        """Сбрасывает все пространство имен заменой версии"""
+        version = uuid4().hex
+        cache.set(self.version_key, version, None)
+        self._version, self._checked = version, time.monotonic()
+        self.local.clear()
+        registry.inc('cache_invalidations_total', (('namespace', self.namespace),))
+
+
+def clear_local_caches():
+    """Очищает уровни в памяти процесса всех пространств имен"""
+    for namespace in _namespaces:
+        namespace.local.clear()
+        namespace._version = None
+
+
+# Каталог: магазины, категории, товары
+catalog_cache = TwoTierCache('catalog')
@@ -0,0 +1,289 @@
+"""
+Хранилища корзин покупателей.
+
+DatabaseCartStorage хранит корзину как заказ со статусом cart в таблицах Order/OrderItem.
+CacheCartStorage держит корзину в общем кэше компактной записью на пользователя
+со временем жизни CART_TTL и записывает позиции в OrderItem только при оформлении
+заказа, поэтому просмотр и правка корзин не пишут в базу данных.
+Хранилище выбирается настройкой CART_STORAGE; формат ответов API от него не зависит.
+"""
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Q, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+from api.concurrency import VersionConflict, bump_version, compare_and_swap, current_version
+from api.models import Order, OrderItem, Product
+from api.serializers import OrderSerializer, OrderItemAddSerializer
+from api.shipments import create_shipments
+
+
+class CartError(Exception):
+    """Корзину нельзя изменить; data - тело ответа 400"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.data = data
+
+
+def find_product(external_id):
+    product = Product.objects.filter(external_id=external_id).values(
+        'category', 'category__name', 'shop', 'shop__name', 'name', 'price').first()
+    if product is None:
+        raise CartError({'status': False, 'error': f'Товар {external_id} не найден'})
+    return product
+
+
+class DatabaseCartStorage:
+    """Корзина - заказ со статусом cart"""
+
+    def get(self, user_id):
+        cart = Order.objects.filter(
+            user_id=user_id, status='cart'
+        ).prefetch_related('ordered_items').annotate(
+            total_sum=Sum('ordered_items__total_amount'),
+            total_quantity=Sum('ordered_items__quantity')
+        )
+        return OrderSerializer(cart, many=True).data
+
+    @transaction.atomic
+    def add(self, user_id, items, expected=None):
+        """Добавляет товары [{external_id, quantity}], возвращает (число добавленных, версия)"""
+        cart, _ = Order.objects.get_or_create(user_id=user_id, status='cart')
+        version = bump_version(cart, expected)
+        for order_item in items:
+            product = find_product(order_item['external_id'])
+            order_item.update({'order': cart.id, 'category': product['category'], 'shop': product['shop'],
+                               'product_name': product['name'], 'price': product['price']})
+            serializer = OrderItemAddSerializer(data=order_item)
+            if not serializer.is_valid():
+                raise CartError({'status': False, 'error': serializer.errors})
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError as error:
+                raise CartError({'status': False, 'errors': str(error)})
+        return len(items), version
+
+    @transaction.atomic
+    def update(self, user_id, items, expected=None):
+        """Меняет количество [{id, quantity}], возвращает (число измененных, версия)"""
+        cart, _ = Order.objects.get_or_create(user_id=user_id, status='cart')
+        version = bump_version(cart, expected)
+        objects_updated = 0
+        for item in items:
+            if isinstance(item['id'], int) and isinstance(item['quantity'], int):
+                objects_updated += OrderItem.objects.filter(order_id=cart.id, id=item['id']).update(
+                    quantity=item['quantity'])
+        return objects_updated, version
+
+    @transaction.atomic
+    def remove(self, user_id, item_ids, expected=None):
+        """Удаляет позиции по идентификаторам, возвращает (число удаленных, версия)"""
+        cart, _ = Order.objects.get_or_create(user_id=user_id, status='cart')
+        version = bump_version(cart, expected)
+        count = OrderItem.objects.filter(Q(order_id=cart.id) & Q(id__in=item_ids)).delete()[0]
+        return count, version
+
+    @transaction.atomic
+    def checkout(self, user_id, order_id, contact_id, expected=None):
+        """
+        Переводит корзину в статус new и создает отправления по магазинам.
+        Возвращает новую версию заказа или 0, если такой корзины у пользователя нет
+        (в том числе если заказ уже оформлен).
+        """
+        carts = Order.objects.filter(user_id=user_id, status='cart')
+        with transaction.atomic():
+            if expected is not None:
+                version = compare_and_swap(carts, order_id, expected, contact_id=contact_id, status='new')
+            else:
+                updated = carts.filter(id=order_id).update(contact_id=contact_id, status='new',
+                                                           version=F('version') + 1, updated=timezone.now())
+                version = current_version(Order.objects.all(), order_id) if updated else 0
+            if version:
+                create_shipments([order_id])
+        return version
+
+
+class CacheCartStorage:
+    """
+    Корзина в общем кэше (алиас CART_CACHE) по ключу cart:<user_id>.
+    Запись: {'id', 'version', 'created', 'updated', 'next_item',
+             'items': {item_id: (external_id, quantity, price, shop_id, shop_name,
+                                 category_id, category_name, product_name)}}
+    Идентификатор корзины - строка Order со статусом cart, которая создается один раз
+    на корзину (или берется уже существующая вместе с позициями), поэтому он не совпадает
+    с другими заказами, не зависит от очистки кэша и сохраняется при оформлении.
+    Изменения и оформление одной корзины выполняются под короткой блокировкой в кэше.
+    """
+    lock_timeout = 5
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'CART_CACHE', 'default')]
+        self.timeout = getattr(settings, 'CART_TTL', 7 * 24 * 60 * 60)
+        self.database = DatabaseCartStorage()
+        self.datetime_field = serializers.DateTimeField()
+
+    def key(self, user_id):
+        return f'cart:{user_id}'
+
+    def load(self, user_id):
+        return self.cache.get(self.key(user_id))
+
+    @contextmanager
+    def locked(self, user_id):
+        """
+        Блокировка корзины пользователя. Если другой запрос держит ее дольше
+        lock_timeout - VersionConflict (ответ 409) с текущей версией корзины.
+        """
+        lock_key = f'lock:{self.key(user_id)}'
+        token = uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(lock_key, token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                cart = self.load(user_id) or {}
+                raise VersionConflict(cart.get('id'), cart.get('version'))
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            # блокировка могла истечь и достаться другому запросу: удаляется только своя
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def create(self, user_id):
+        """Запись новой корзины для строки Order со статусом cart"""
+        order, _ = Order.objects.get_or_create(user_id=user_id, status='cart')
+        items = {row[0]: row[1:] for row in OrderItem.objects.filter(order_id=order.id).values_list(
+            'id', 'external_id', 'quantity', 'price', 'shop_id', 'shop__name', 'category_id', 'category__name',
+            'product_name')}
+        return {'id': order.id, 'version': order.version, 'created': order.created, 'updated': order.updated,
+                'next_item': max(items, default=0) + 1, 'items': items}
+
+    def modify(self, user_id, expected, change):
+        """Применяет change(cart) к корзине под блокировкой, проверяя ожидаемую версию"""
+        with self.locked(user_id):
+            cart = self.load(user_id) or self.create(user_id)
+            if expected is not None and expected != cart['version']:
+                raise VersionConflict(cart['id'], cart['version'])
+            result = change(cart)
+            cart['version'] += 1
+            cart['updated'] = timezone.now()
+            self.cache.set(self.key(user_id), cart, self.timeout)
+            return result, cart['version']
+
+    def get(self, user_id):
+        cart = self.load(user_id)
+        if cart is None:
+            return []
+        items = [{
+            'id': item_id,
+            'shop': shop_name,
+            'category': category_name,
+            'product_name': product_name,
+            'external_id': external_id,
+            'quantity': quantity,
+            'price': price,
+            'total_amount': price * quantity,
+        } for item_id, (external_id, quantity, price, shop_id, shop_name, category_id, category_name,
+                        product_name) in cart['items'].items()]
+        return [{
+            'id': cart['id'],
+            'ordered_items': items,
+            'total_sum': sum(item['total_amount'] for item in items) if items else None,
+            'total_quantity': sum(item['quantity'] for item in items) if items else None,
+            'contact': None,
+            'status': 'cart',
+            'created': self.datetime_field.to_representation(cart['created']),
+            'updated': self.datetime_field.to_representation(cart['updated']),
+            'version': cart['version'],
+            'user': user_id,
+        }]
+
+    def add(self, user_id, items, expected=None):
+        products = []
+        for order_item in items:
+            quantity = order_item.get('quantity', 1)
+            if not isinstance(quantity, int) or quantity < 0:
+                raise CartError({'status': False, 'error': {'quantity': ['Требуется целое число.']}})
+            products.append((find_product(order_item['external_id']), order_item['external_id'], quantity))
+
+        def change(cart):
+            names = {item[7] for item in cart['items'].values()}
+            for product, external_id, quantity in products:
+                if product['name'] in names:
+                    raise CartError({'status': False, 'errors': f'Товар {product["name"]} уже в корзине'})
+                names.add(product['name'])
+                cart['items'][cart['next_item']] = (
+                    external_id, quantity, product['price'], product['shop'], product['shop__name'],
+                    product['category'], product['category__name'], product['name'])
+                cart['next_item'] += 1
+            return len(products)
+        return self.modify(user_id, expected, change)
+
+    def update(self, user_id, items, expected=None):
+        def change(cart):
+            objects_updated = 0
+            for item in items:
+                if isinstance(item['id'], int) and isinstance(item['quantity'], int) and item['id'] in cart['items']:
+                    cart['items'][item['id']] = cart['items'][item['id']][:1] + (item['quantity'],) + \
+                        cart['items'][item['id']][2:]
+                    objects_updated += 1
+            return objects_updated
+        return self.modify(user_id, expected, change)
+
+    def remove(self, user_id, item_ids, expected=None):
+        def change(cart):
+            return sum(cart['items'].pop(int(item_id), None) is not None for item_id in item_ids)
+        return self.modify(user_id, expected, change)
+
+    def checkout(self, user_id, order_id, contact_id, expected=None):
+        """
+        Записывает позиции корзины из кэша в OrderItem и оформляет ее строку Order;
+        выполняется под блокировкой корзины, поэтому параллельные изменения не теряются.
+        Корзины из базы оформляются как раньше. Возвращает новую версию заказа или 0.
+        """
+        with self.locked(user_id):
+            cart = self.load(user_id)
+            if cart is None or cart['id'] != order_id:
+                return self.database.checkout(user_id, order_id, contact_id, expected)
+            if expected is not None and expected != cart['version']:
+                raise VersionConflict(cart['id'], cart['version'])
+            if not cart['items']:
+                return 0
+            with transaction.atomic():
+                order = Order.objects.select_for_update().filter(
+                    id=order_id, user_id=user_id, status='cart').first()
+                if order is None:
+                    # строку корзины удалила очистка брошенных корзин
+                    order = Order(user_id=user_id)
+                order.status, order.contact_id, order.version = 'new', contact_id, cart['version'] + 1
+                order.save()
+                OrderItem.objects.filter(order_id=order.id).delete()
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, external_id=external_id, quantity=quantity, price=price,
+                              total_amount=price * quantity, shop_id=shop_id, category_id=category_id,
+                              product_name=product_name)
+                    for external_id, quantity, price, shop_id, shop_name, category_id, category_name, product_name
+                    in cart['items'].values()])
+                create_shipments([order.id])
+            self.cache.delete(self.key(user_id))
+            return order.version
+
+
+_storages = {}
+
+
+def get_cart_storage():
+    path = getattr(settings, 'CART_STORAGE', 'api.cart.DatabaseCartStorage')
+    storage = _storages.get(path)
+    if storage is None:
+        storage = _storages[path] = import_string(path)()
+    return storage
@@ -0,0 +1,40 @@
+"""
+Версия каталога и условные HTTP-запросы к нему.
+
+Версия пространства имен catalog двухуровневого кэша меняется при каждом изменении
+каталога, из нее строится ETag. Время изменения хранится в общем кэше рядом с версией;
+если его там нет, берется время последнего импорта прайса (Shop.imported_at).
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import catalog_cache
+from api.models import Shop
+
+
+MODIFIED_KEY = 'catalog:modified'
+
+
+def invalidate_catalog(modified=None):
+    """Сбрасывает кэш каталога и запоминает время изменения"""
+    catalog_cache.invalidate()
+    cache.set(MODIFIED_KEY, (modified or timezone.now()).replace(microsecond=0), None)
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        modified = Shop.objects.aggregate(modified=Max('imported_at'))['modified']
+        # False - импортов еще не было, запоминается, чтобы не повторять запрос
+        modified = modified.replace(microsecond=0) if modified else False
+        cache.add(MODIFIED_KEY, modified, None)
+    return modified or None
+
+
+def catalog_etag(request, *args, **kwargs):
+    """Сильный ETag: версия каталога, адрес запроса и формат ответа"""
+    source = f'{catalog_cache.version()}:{request.get_full_path()}:{request.META.get("HTTP_ACCEPT", "")}'
+    return hashlib.md5(source.encode()).hexdigest()
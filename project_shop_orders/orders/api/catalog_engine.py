@@ -0,0 +1,146 @@
+"""
+Поиск товаров каталога для списка products.
+
+DatabaseCatalog выполняет фильтрацию, сортировку и постраничный вывод запросами к базе.
+ArrayCatalog держит в памяти процесса столбцы id, shop_id, category_id, price, quantity
+и признак активного магазина в массивах NumPy. Столбцы загружаются один раз на версию
+каталога (api.catalog), фильтры считаются булевыми масками, а из базы читаются только
+товары текущей страницы. Движок выбирается настройкой CATALOG_ENGINE.
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from api.cache import catalog_cache
+from api.models import Product
+
+
+# Порядок списка по умолчанию - Product.Meta.ordering; id - для устойчивых страниц
+DEFAULT_ORDERING = ('category', '-name', 'id')
+
+ORDERINGS = ('price', '-price', 'quantity', '-quantity')
+
+CHUNK_SIZE = 10000
+
+
+class ProductFilter:
+    """
+    Параметры списка товаров: shop_id, category_id, price_min, price_max,
+    in_stock (только с остатком) и ordering (price, -price, quantity, -quantity).
+    Неверные значения - ValueError.
+    """
+
+    def __init__(self, params):
+        self.shop_id = self.number(params, 'shop_id')
+        self.category_id = self.number(params, 'category_id')
+        self.price_min = self.number(params, 'price_min')
+        self.price_max = self.number(params, 'price_max')
+        self.in_stock = params.get('in_stock', '').lower() in ('1', 'true', 'yes', 'on')
+        self.ordering = params.get('ordering') or None
+        if self.ordering is not None and self.ordering not in ORDERINGS:
+            raise ValueError(f'Сортировка возможна по полям: {", ".join(ORDERINGS)}')
+
+    @staticmethod
+    def number(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        if not value.isdigit():
+            raise ValueError(f'Параметр {name} должен быть целым числом')
+        return int(value)
+
+
+class DatabaseCatalog:
+    """Фильтры и сортировка запросом к таблице товаров"""
+
+    def queryset(self, query):
+        """Товары в порядке вывода"""
+        queryset = Product.objects.filter(shop__state=True)
+        if query.shop_id is not None:
+            queryset = queryset.filter(shop_id=query.shop_id)
+        if query.category_id is not None:
+            queryset = queryset.filter(category_id=query.category_id)
+        if query.price_min is not None:
+            queryset = queryset.filter(price__gte=query.price_min)
+        if query.price_max is not None:
+            queryset = queryset.filter(price__lte=query.price_max)
+        if query.in_stock:
+            queryset = queryset.filter(quantity__gt=0)
+        return queryset.order_by(*((query.ordering, 'id') if query.ordering else DEFAULT_ORDERING))
+
+    def product_ids(self, query):
+        """Идентификаторы товаров в порядке вывода"""
+        return self.queryset(query).values_list('id', flat=True)
+
+
+class Snapshot:
+    """Столбцы товаров одной версии каталога; строки в порядке DEFAULT_ORDERING"""
+
+    def __init__(self, version):
+        self.version = version
+        rows = np.fromiter(Product.objects.order_by(*DEFAULT_ORDERING).values_list(
+            'id', 'shop_id', 'category_id', 'price', 'quantity', 'shop__state').iterator(CHUNK_SIZE),
+            dtype=np.dtype((np.int64, 6))).reshape(-1, 6)
+        self.id = rows[:, 0].copy()
+        self.shop_id = rows[:, 1].astype(np.int32)
+        self.category_id = rows[:, 2].astype(np.int32)
+        self.price = rows[:, 3].astype(np.int32)
+        self.quantity = rows[:, 4].astype(np.int32)
+        self.active = rows[:, 5].astype(bool)
+
+    def __len__(self):
+        return len(self.id)
+
+
+class ArrayCatalog:
+    """Фильтры и сортировка масками над столбцами в памяти процесса"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Столбцы текущей версии каталога; перечитываются после изменения каталога"""
+        version = catalog_cache.version()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = Snapshot(version)
+        return snapshot
+
+    def product_ids(self, query):
+        """Идентификаторы товаров в порядке вывода (массив NumPy)"""
+        snapshot = self.snapshot()
+        mask = snapshot.active.copy()
+        if query.shop_id is not None:
+            mask &= snapshot.shop_id == query.shop_id
+        if query.category_id is not None:
+            mask &= snapshot.category_id == query.category_id
+        if query.price_min is not None:
+            mask &= snapshot.price >= query.price_min
+        if query.price_max is not None:
+            mask &= snapshot.price <= query.price_max
+        if query.in_stock:
+            mask &= snapshot.quantity > 0
+        rows = np.flatnonzero(mask)
+        if query.ordering:
+            column = getattr(snapshot, query.ordering.lstrip('-'))[rows]
+            if query.ordering.startswith('-'):
+                column = -column.astype(np.int64)
+            rows = rows[np.lexsort((snapshot.id[rows], column))]
+        return snapshot.id[rows]
+
+
+_engines = {}
+
+
+def get_catalog_engine():
+    path = getattr(settings, 'CATALOG_ENGINE', 'api.catalog_engine.DatabaseCatalog')
+    engine = _engines.get(path)
+    if engine is None:
+        engine = _engines[path] = import_string(path)()
+    return engine
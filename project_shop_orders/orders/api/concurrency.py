@@ -0,0 +1,95 @@
+"""
+Оптимистичные блокировки заказов.
+
+Каждое изменение заказа выполняется условным UPDATE ... WHERE version = <ожидаемая>,
+который одновременно увеличивает версию. Если строку успел изменить другой запрос,
+UPDATE не затрагивает ни одной строки и клиент получает 409 с текущей версией.
+Ожидаемую версию клиент передает заголовком If-Match ("3") или полем version.
+"""
+from functools import wraps
+
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.models import Order
+
+
+class VersionConflict(Exception):
+    """Заказ изменен другим запросом; version - текущая версия или None, если заказа нет"""
+
+    def __init__(self, order_id, version):
+        super().__init__('Заказ изменен другим запросом')
+        self.order_id = order_id
+        self.version = version
+
+
+def etag(version):
+    return f'"{version}"'
+
+
+def expected_version(request):
+    """Версия из заголовка If-Match или поля version запроса; None - проверка не нужна"""
+    value = request.headers.get('If-Match') or request.data.get('version')
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value == '*':
+        return None
+    value = value.removeprefix('W/').strip('"')
+    return int(value) if value.isdigit() else None
+
+
+def current_version(queryset, order_id):
+    return queryset.filter(id=order_id).values_list('version', flat=True).first()
+
+
+def compare_and_swap(queryset, order_id, version, **fields):
+    """
+    Обновляет заказ, только если его версия равна version, и увеличивает версию.
+    Возвращает новую версию или 0, если заказа нет; при расхождении версий
+    вызывает VersionConflict.
+    """
+    updated = queryset.filter(id=order_id, version=version).update(
+        version=F('version') + 1, updated=timezone.now(), **fields)
+    if not updated:
+        current = current_version(queryset, order_id)
+        if current is None:
+            return 0
+        raise VersionConflict(order_id, current)
+    return version + 1
+
+
+def bump_version(order, expected=None):
+    """
+    Фиксирует изменение заказа order, прочитанного ранее. С expected (версия из запроса)
+    версия проверяется условным UPDATE; без нее увеличивается без сравнения, поэтому
+    параллельные запросы без If-Match не получают 409.
+    """
+    if expected is not None:
+        order.version = compare_and_swap(Order.objects.all(), order.id, expected)
+    else:
+        Order.objects.filter(id=order.id).update(version=F('version') + 1, updated=timezone.now())
+        order.version = current_version(Order.objects.all(), order.id)
+    return order.version
+
+
+def conflict_response(error):
+    response = Response({'status': False, 'error': str(error), 'id': error.order_id, 'version': error.version},
+                        status=status.HTTP_409_CONFLICT)
+    if error.version is not None:
+        response['ETag'] = etag(error.version)
+    return response
+
+
+def handle_conflicts(method):
+    """Декоратор метода представления: VersionConflict превращается в ответ 409"""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            return method(self, request, *args, **kwargs)
+        except VersionConflict as error:
+            return conflict_response(error)
+    return wrapper
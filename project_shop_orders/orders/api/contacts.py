@@ -0,0 +1,80 @@
+"""
+Массовые операции с контактами пользователя.
+
+Создание, изменение и удаление выполняются одним запросом к базе на операцию
+(bulk_create, bulk_update, DELETE ... WHERE id IN) и всегда ограничены user_id,
+поэтому синхронизация адресной книги из внешней системы не зависит от числа контактов.
+"""
+from ujson import loads as load_json
+
+from api.models import Contact
+from api.serializers import ContactSerializer
+
+
+class ContactError(Exception):
+    """Контакты нельзя изменить; data - тело ответа 400"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.data = data
+
+
+def parse_items(items):
+    """Список контактов из поля items: JSON-строка (form-data) или список (JSON)"""
+    if isinstance(items, str):
+        try:
+            items = load_json(items)
+        except ValueError:
+            raise ContactError({'status': False, 'error': 'Неверный формат запроса'})
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ContactError({'status': False, 'error': 'Неверный формат запроса'})
+    return items
+
+
+def validated(items, instances=None):
+    """Проверяет поля контактов сериализатором; поле user из запроса не принимается"""
+    errors, rows = {}, []
+    for index, item in enumerate(items):
+        serializer = ContactSerializer(instances[index] if instances else None, data=item,
+                                       partial=instances is not None)
+        if serializer.is_valid():
+            data = dict(serializer.validated_data)
+            data.pop('user', None)
+            rows.append(data)
+        else:
+            errors[index] = serializer.errors
+    if errors:
+        raise ContactError({'status': False, 'error': errors})
+    return rows
+
+
+def create_contacts(user_id, items):
+    """Создает контакты [{city, street, phone, ...}], возвращает созданные объекты"""
+    rows = validated(items)
+    return Contact.objects.bulk_create([Contact(user_id=user_id, **row) for row in rows])
+
+
+def update_contacts(user_id, items):
+    """Меняет контакты [{id, ...}] пользователя, возвращает число измененных"""
+    try:
+        ids = [int(item['id']) for item in items]
+    except (KeyError, TypeError, ValueError):
+        raise ContactError({'status': False, 'error': 'Не верный тип поля ID'})
+    contacts = Contact.objects.filter(user_id=user_id, id__in=ids).in_bulk()
+    missing = [contact_id for contact_id in ids if contact_id not in contacts]
+    if missing:
+        raise ContactError({'status': False, 'error': f'Контакты {missing} не найдены'})
+    instances = [contacts[contact_id] for contact_id in ids]
+    fields = set()
+    for contact, row in zip(instances, validated(items, instances)):
+        for field, value in row.items():
+            setattr(contact, field, value)
+        fields.update(row)
+    if not fields:
+        return 0
+    return Contact.objects.bulk_update(instances, sorted(fields))
+
+
+def delete_contacts(user_id, ids):
+    """Удаляет контакты пользователя по id, возвращает число удаленных"""
+    return Contact.objects.filter(user_id=user_id, id__in=ids).delete()[1].get('api.Contact', 0)
@@ -0,0 +1,193 @@
+"""
+Потоковая выгрузка каталога товаров в NDJSON и CSV, а также прайса магазина
+в формате импорта.
+
+Товары читаются курсором на стороне сервера (QuerySet.iterator) пачками по chunk_size,
+параметры для каждой пачки загружаются одним запросом. Строки собираются в буфер
+фиксированного размера и при необходимости сжимаются gzip на лету, поэтому память
+процесса не зависит от числа выгружаемых товаров.
+"""
+import csv
+import io
+import zlib
+from itertools import islice
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from ujson import dumps as dump_json
+
+from api.models import Category, Product, ProductParameter
+from api.pricelist import iter_price_list
+
+
+EXPORT_FIELDS = ('id', 'shop', 'category', 'external_id', 'name', 'model', 'price', 'price_rrc', 'quantity')
+
+# поля запроса в порядке EXPORT_FIELDS
+QUERY_FIELDS = ('id', 'shop__name', 'category__name', 'external_id', 'name', 'model', 'price', 'price_rrc',
+                'quantity')
+
+# поля товара в схеме прайса; первым идет первичный ключ для загрузки параметров
+PRICE_LIST_QUERY_FIELDS = ('id', 'external_id', 'category_id', 'model', 'name', 'price', 'price_rrc', 'quantity')
+PRICE_LIST_FIELDS = ('pk', 'id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity')
+
+CHUNK_SIZE = 2000
+
+BUFFER_SIZE = 64 * 1024
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Одна JSON-запись на строку. Выгрузку формирует ProductExport,
+    рендерер выбирает формат по ?format= и выводит ответы с ошибками.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (dump_json(data, ensure_ascii=False) + '\n').encode()
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.getvalue().encode()
+
+
+def iter_products(queryset, chunk_size=CHUNK_SIZE, query_fields=QUERY_FIELDS, fields=EXPORT_FIELDS):
+    """
+    Генератор словарей товаров с параметрами.
+    Аргументы:
+        queryset: товары для выгрузки.
+        chunk_size (int): размер пачки курсора и запроса параметров.
+        query_fields: поля запроса, первым - первичный ключ товара.
+        fields: ключи словаря товара в порядке query_fields.
+    """
+    rows = queryset.order_by('pk').values_list(*query_fields).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        parameters = {}
+        for product_id, name, value in ProductParameter.objects.filter(
+                product_id__in=[row[0] for row in batch]).values_list('product_id', 'parameter__name', 'value'):
+            parameters.setdefault(product_id, {})[name] = value
+        for row in batch:
+            item = dict(zip(fields, row))
+            item['parameters'] = parameters.get(row[0], {})
+            yield item
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield dump_json(item, ensure_ascii=False, escape_forward_slashes=False) + '\n'
+
+
+def csv_lines(items):
+    """Строки CSV; параметры товара записываются в последнюю колонку объектом JSON"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS + ('parameters',))
+    for item in items:
+        writer.writerow([item[name] for name in EXPORT_FIELDS]
+                        + [dump_json(item['parameters'], ensure_ascii=False)])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Объединяет строки в блоки байтов размером не меньше size"""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode()
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(blocks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(header):
+    """
+    Принимает ли клиент gzip по заголовку Accept-Encoding с учетом весов q:
+    gzip;q=0 - отказ, при отсутствии gzip решает запись *.
+    """
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def export_response(request, lines, content_type, filename):
+    """
+    Потоковый ответ выгрузки из строк lines: строки собираются в блоки
+    и сжимаются gzip, если клиент его принимает.
+    """
+    blocks = buffered(lines)
+    compress = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = StreamingHttpResponse(gzipped(blocks) if compress else blocks,
+                                     content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Vary'] = 'Accept-Encoding'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+FORMATS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
+
+
+def products_for_export(shop_id=None, category_id=None):
+    """Товары включенных магазинов с фильтрами, как в списке товаров"""
+    queryset = Product.objects.filter(shop__state=True)
+    if shop_id:
+        queryset = queryset.filter(shop_id=shop_id)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset
+
+
+def iter_shop_price_list(shop, chunk_size=CHUNK_SIZE):
+    """
+    Генератор фрагментов прайса магазина в формате импорта (shop/categories/goods).
+    Повторный импорт выгрузки не меняет каталог.
+    """
+    categories = Category.objects.filter(Q(shops=shop) | Q(products__shop=shop)).distinct().order_by('id')
+    goods = iter_products(shop.products_info.all(), chunk_size, PRICE_LIST_QUERY_FIELDS, PRICE_LIST_FIELDS)
+    return iter_price_list(shop.name, categories.values_list('id', 'name'), goods)
@@ -0,0 +1,167 @@
+"""
+Загрузка прайс-листов поставщиков по ссылке.
+
+Запросы идут через requests.Session с пулом соединений (своя сессия на поток)
+с таймаутами на соединение и чтение и общим ограничением времени загрузки.
+Тело ответа читается частями во временный файл на диске не больше FETCH_MAX_BYTES;
+каждое чтение из сокета ждет не дольше времени, оставшегося до конца загрузки,
+поэтому поставщик, отдающий тело по байту, не задерживает воркер сверх FETCH_TOTAL_TIMEOUT;
+разбор получает отображение файла в память (mmap), а не копию в памяти процесса.
+Сетевые ошибки, обрывы тела и ответы 429/5xx повторяются с экспоненциальной паузой.
+"""
+import mmap
+import tempfile
+import threading
+import time
+import zlib
+from http.client import HTTPException
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from api.metrics import registry
+
+
+CHUNK_SIZE = 64 * 1024
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# сжатие тела, которое принимает загрузчик, и параметр wbits для zlib
+DECODERS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+_local = threading.local()
+
+
+class FetchError(Exception):
+    """Прайс-лист не удалось загрузить"""
+
+
+class RetryableError(FetchError):
+    """Временная ошибка: загрузку можно повторить"""
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def get_session():
+    """Сессия потока с пулом соединений"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=option('FETCH_POOL_SIZE', 10),
+                              pool_maxsize=option('FETCH_POOL_SIZE', 10))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def read_body(response, file, max_bytes, deadline):
+    """
+    Пишет тело ответа в file, возвращает (байт получено, байт записано).
+    Чтение идет напрямую из http.client (read1 - не больше одного recv),
+    а таймаут сокета перед каждым чтением сокращается до времени, оставшегося до deadline.
+    """
+    read_timeout = option('FETCH_READ_TIMEOUT', 30)
+    connection = response.raw.connection
+    sock = getattr(connection, 'sock', None)
+    encoding = response.headers.get('Content-Encoding', '').strip().lower()
+    decoder = zlib.decompressobj(DECODERS[encoding]) if encoding in DECODERS else None
+    received = size = 0
+
+    def write(data):
+        if size + len(data) > max_bytes:
+            raise FetchError(f'Прайс-лист больше {max_bytes} байт')
+        file.write(data)
+        return len(data)
+
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise FetchError('Превышено время загрузки прайс-листа')
+        if sock is not None:
+            sock.settimeout(min(read_timeout, left))
+        try:
+            chunk = response.raw._fp.read1(CHUNK_SIZE)
+        except TimeoutError:
+            if time.monotonic() >= deadline:
+                raise FetchError('Превышено время загрузки прайс-листа')
+            raise RetryableError('Ошибка загрузки прайс-листа: ReadTimeout')
+        except (OSError, HTTPException) as error:
+            raise RetryableError(f'Ошибка загрузки прайс-листа: {error.__class__.__name__}')
+        if not chunk:
+            break
+        received += len(chunk)
+        try:
+            size += write(decoder.decompress(chunk, max_bytes - size + 1) if decoder else chunk)
+        except zlib.error:
+            raise FetchError('Прайс-лист сжат с ошибкой')
+    if decoder is not None:
+        size += write(decoder.flush())
+    return received, size
+
+
+def download(url, file, max_bytes, deadline):
+    """Одна попытка: пишет тело ответа в file, возвращает число байт"""
+    timeout = (option('FETCH_CONNECT_TIMEOUT', 5), option('FETCH_READ_TIMEOUT', 30))
+    headers = {'Accept-Encoding': ', '.join(DECODERS)}
+    try:
+        with get_session().get(url, stream=True, timeout=timeout, headers=headers) as response:
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f'Сервер поставщика ответил {response.status_code}')
+            if response.status_code >= 400:
+                raise FetchError(f'Сервер поставщика ответил {response.status_code}')
+            length = response.headers.get('Content-Length')
+            length = int(length) if length and length.isdigit() else None
+            if length is not None and length > max_bytes:
+                raise FetchError(f'Прайс-лист больше {max_bytes} байт')
+            file.seek(0)
+            file.truncate()
+            received, size = read_body(response, file, max_bytes, deadline)
+    except (requests.ConnectionError, requests.Timeout) as error:
+        raise RetryableError(f'Ошибка загрузки прайс-листа: {error.__class__.__name__}')
+    # http.client не проверяет длину тела: оборванный ответ отличается только по Content-Length
+    if length is not None and received != length:
+        raise RetryableError(f'Прайс-лист загружен не полностью: {received} из {length} байт')
+    file.flush()
+    return size
+
+
+def spool(url, file, max_bytes=None):
+    """Загружает url в file с повторами, возвращает число байт"""
+    max_bytes = option('FETCH_MAX_BYTES', 100 * 1024 * 1024) if max_bytes is None else max_bytes
+    retries = option('FETCH_RETRIES', 3)
+    backoff = option('FETCH_BACKOFF', 0.5)
+    deadline = time.monotonic() + option('FETCH_TOTAL_TIMEOUT', 300)
+    for attempt in range(retries + 1):
+        try:
+            size = download(url, file, max_bytes, deadline)
+        except RetryableError as error:
+            if attempt == retries or time.monotonic() + backoff * 2 ** attempt > deadline:
+                registry.inc('fetch_attempts_total', (('result', 'error'),))
+                raise FetchError(str(error))
+            registry.inc('fetch_attempts_total', (('result', 'retry'),))
+            time.sleep(backoff * 2 ** attempt)
+        except FetchError:
+            registry.inc('fetch_attempts_total', (('result', 'error'),))
+            raise
+        else:
+            registry.inc('fetch_attempts_total', (('result', 'ok'),))
+            return size
+
+
+@contextmanager
+def fetch(url, max_bytes=None):
+    """
+    Загружает прайс-лист и отдает его содержимое отображением файла в память.
+    Отображение и временный файл закрываются при выходе из блока with.
+    """
+    with tempfile.TemporaryFile(dir=option('FETCH_SPOOL_DIR', None)) as file:
+        if not spool(url, file, max_bytes):
+            yield b''
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
@@ -0,0 +1,93 @@
+"""
+Заголовок Idempotency-Key для изменяющих запросов.
+
+Первый запрос с ключом выполняется, его ответ сохраняется в общем кэше на
+IDEMPOTENCY_TTL секунд вместе с отпечатком запроса (метод, путь, тело). Повтор с тем же
+ключом и тем же телом получает сохраненный ответ без повторного выполнения; повтор
+с другим телом получает 422, а пока первый запрос выполняется - 409.
+Отметка о выполнении живет IDEMPOTENCY_LOCK_TTL секунд (порядка таймаута запроса),
+поэтому ключ воркера, убитого во время запроса, освобождается быстро.
+Ключи действуют в пределах пользователя.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+HEADER = 'Idempotency-Key'
+
+# ответы, которые не сохраняются: клиент может повторить запрос и получить другой результат
+RETRYABLE_STATUSES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+# заголовки ответа, которые воспроизводятся при повторе
+STORED_HEADERS = ('ETag',)
+
+PENDING = 'pending'
+
+
+def get_cache():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE', 'default')]
+
+
+def make_key(request, key):
+    scope = f'{request.user.pk}:{request.method}:{request.path}:{key}'
+    return 'idempotency:' + hashlib.sha1(scope.encode()).hexdigest()
+
+
+def fingerprint(request):
+    return hashlib.sha1(request.method.encode() + request.get_full_path().encode() + request.body).hexdigest()
+
+
+def idempotent(method):
+    """Декоратор метода APIView: повтор запроса с тем же Idempotency-Key возвращает первый ответ"""
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'status': False, 'error': f'{HEADER} длиннее 255 символов'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cache = get_cache()
+        cache_key = make_key(request, key)
+        request_fingerprint = fingerprint(request)
+        ttl = getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+        lock_ttl = getattr(settings, 'IDEMPOTENCY_LOCK_TTL', 60)
+        # запись: (отпечаток, статус или PENDING, данные, заголовки)
+        if not cache.add(cache_key, (request_fingerprint, PENDING, None, None), lock_ttl):
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return replay(stored, request_fingerprint)
+            cache.add(cache_key, (request_fingerprint, PENDING, None, None), lock_ttl)
+
+        try:
+            response = method(self, request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+            cache.delete(cache_key)
+        else:
+            headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+            cache.set(cache_key, (request_fingerprint, response.status_code, response.data, headers), ttl)
+        return response
+    return wrapper
+
+
+def replay(stored, request_fingerprint):
+    stored_fingerprint, stored_status, data, headers = stored
+    if stored_fingerprint != request_fingerprint:
+        return Response({'status': False, 'error': f'{HEADER} уже использован с другим запросом'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if stored_status == PENDING:
+        return Response({'status': False, 'error': f'Запрос с этим {HEADER} еще выполняется'},
+                        status=status.HTTP_409_CONFLICT)
+    response = Response(data, status=stored_status, headers=headers)
+    response['Idempotent-Replayed'] = 'true'
+    return response
@@ -0,0 +1,298 @@
+"""
+Поэтапный импорт прайс-листа поставщика.
+
+Импорт разбит на стадии fetch -> parse -> validate -> diff -> write -> refresh.
+Каждая стадия замеряется отдельно (время и число обработанных строк),
+поэтому регрессии get_import/PartnerUpdate видны по стадиям.
+"""
+import time
+from contextlib import ExitStack
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+from yaml import load as load_yaml
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+from api.fetcher import fetch
+from api.models import Shop, Category, Product, Parameter, ProductParameter
+from api.offers import refresh_shop_offers
+from api.validation import validate_goods
+from api.signals import catalog_updated, catalog_bulk_write
+
+
+def delete_parameters(product_ids):
+    """
+    Удаляет характеристики товаров одним DELETE ... WHERE product_id IN (...) без загрузки строк
+    и построчных сигналов: на ProductParameter не ссылаются другие таблицы, а каталог
+    после импорта сбрасывается сигналом catalog_updated. Возвращает число удаленных строк.
+    """
+    if not product_ids:
+        return 0
+    connection = connections[router.db_for_write(ProductParameter)]
+    quote = connection.ops.quote_name
+    table = quote(ProductParameter._meta.db_table)
+    column = quote(ProductParameter._meta.get_field('product').column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(product_ids))})',
+                       list(product_ids))
+        return cursor.rowcount
+
+
+STAGES = ('fetch', 'parse', 'validate', 'diff', 'write', 'refresh')
+
+# Поля товара, которые сравниваются при поиске изменений
+PRODUCT_FIELDS = ('name', 'model', 'price', 'price_rrc', 'quantity')
+
+BATCH_SIZE = 1000
+
+# Сколько ошибок проверки прайса возвращается в отчете
+ERRORS_LIMIT = 1000
+
+
+class PriceListError(Exception):
+    """Ошибка в содержимом прайс-листа"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class ImportPlan:
+    """
+    Результат стадии diff: что нужно создать, обновить и удалить.
+    Ключ товара - пара (category_id, external_id), как в ограничении unique_product_info.
+    """
+
+    def __init__(self):
+        self.create = []
+        self.update = []
+        self.delete = []
+        self.parameters = {}
+        self.parameters_only = 0
+        self.unchanged = 0
+
+    @property
+    def changed(self):
+        return len(self.create) + len(self.update) + len(self.delete) + self.parameters_only
+
+
+def chunks(sequence, size=BATCH_SIZE):
+    for start in range(0, len(sequence), size):
+        yield sequence[start:start + size]
+
+
+class PriceListImport:
+    """
+    Импорт прайс-листа одного поставщика.
+
+    Аргументы:
+        partner (int): идентификатор пользователя-магазина.
+        url (str): ссылка на файл прайса.
+        content (bytes): уже загруженное содержимое прайса, стадия fetch тогда не ходит в сеть.
+
+    После run() в атрибуте stats лежат замеры по стадиям:
+    {'fetch': {'seconds': ..., 'rows': ...}, ...}
+    Для стадии fetch в rows записывается размер прайса в байтах.
+    """
+
+    def __init__(self, partner, url=None, content=None):
+        self.partner = partner
+        self.url = url
+        self.content = content
+        self.data = None
+        self.items = None
+        self.shop = None
+        self.plan = None
+        self.stats = {}
+        self.resources = None
+
+    def run(self):
+        # загруженный по ссылке прайс (временный файл и mmap) закрывается после импорта
+        with ExitStack() as self.resources:
+            for stage in STAGES:
+                started = time.perf_counter()
+                rows = getattr(self, stage)()
+                self.stats[stage] = {'seconds': time.perf_counter() - started, 'rows': rows}
+        return self.plan
+
+    def fetch(self):
+        if self.content is None:
+            self.content = self.resources.enter_context(fetch(self.url))
+        return len(self.content)
+
+    def parse(self):
+        self.data = load_yaml(self.content, Loader=Loader)
+        if not isinstance(self.data, dict):
+            raise PriceListError('Некорректный формат файла')
+        return len(self.data.get('goods') or [])
+
+    def validate(self):
+        errors = []
+        for key in ('shop', 'categories', 'goods'):
+            if key not in self.data:
+                errors.append({'row': None, 'field': key, 'error': 'Не указано поле'})
+        if errors:
+            raise PriceListError('Некорректный формат файла', errors)
+
+        if not isinstance(self.data['goods'], list):
+            raise PriceListError('Некорректный формат файла', [{'row': None, 'field': 'goods',
+                                                                 'error': 'Ожидается список товаров'}])
+        category_ids = self.validate_categories(self.data['categories'])
+        columns, report = validate_goods(self.data['goods'], category_ids)
+        total = len(report)
+        if total:
+            message = 'Ошибки в прайс-листе'
+            if total > ERRORS_LIMIT:
+                message = f'{message}: {total}, показаны первые {ERRORS_LIMIT}'
+            raise PriceListError(message, report.errors(ERRORS_LIMIT))
+        self.items = [
+            {'external_id': external_id, 'category_id': category_id, 'name': name, 'model': model, 'price': price,
+             'price_rrc': price_rrc, 'quantity': quantity,
+             'parameters': {str(key): str(value) for key, value in parameters.items()}}
+            for external_id, category_id, name, model, price, price_rrc, quantity, parameters in zip(
+                columns['external_id'].tolist(), columns['category_id'].tolist(), columns['name'], columns['model'],
+                columns['price'].tolist(), columns['price_rrc'].tolist(), columns['quantity'].tolist(),
+                columns['parameters'])]
+        return len(self.items)
+
+    @staticmethod
+    def validate_categories(categories):
+        """
+        Проверяет список категорий [{'id': int, 'name': str}], возвращает множество их id.
+        Ошибки - PriceListError с номером категории в row и полем categories.
+        """
+        if not isinstance(categories, list):
+            raise PriceListError('Некорректный формат файла', [{'row': None, 'field': 'categories',
+                                                                 'error': 'Ожидается список категорий'}])
+        max_length = Category._meta.get_field('name').max_length
+        errors = []
+        for row, category in enumerate(categories):
+            if not isinstance(category, dict):
+                errors.append({'row': row, 'field': 'categories', 'error': 'Ожидается описание категории'})
+                continue
+            category_id, name = category.get('id'), category.get('name')
+            if type(category_id) is not int or category_id < 0:
+                errors.append({'row': row, 'field': 'categories', 'error': 'Ожидается целый неотрицательный id'})
+            if not isinstance(name, str) or not name.strip():
+                errors.append({'row': row, 'field': 'categories', 'error': 'Не указано название категории'})
+            elif len(name) > max_length:
+                errors.append({'row': row, 'field': 'categories', 'error': f'Длиннее {max_length} символов'})
+        if errors:
+            raise PriceListError('Ошибки в категориях прайс-листа', errors[:ERRORS_LIMIT])
+        return {category['id'] for category in categories}
+
+    def diff(self):
+        self.shop = Shop.objects.filter(user_id=self.partner).first()
+        if self.shop is not None and self.shop.name != self.data['shop']:
+            raise PriceListError('В файле некорректное название магазина')
+
+        existing = {}
+        parameters = {}
+        if self.shop is not None:
+            for row in Product.objects.filter(shop_id=self.shop.id).values_list(
+                    'id', 'category_id', 'external_id', *PRODUCT_FIELDS).iterator(chunk_size=BATCH_SIZE):
+                existing[(row[1], row[2])] = row
+            for product_id, name, value in ProductParameter.objects.filter(
+                    product__shop_id=self.shop.id).values_list(
+                    'product_id', 'parameter__name', 'value').iterator(chunk_size=BATCH_SIZE):
+                parameters.setdefault(product_id, {})[name] = value
+
+        plan = ImportPlan()
+        for item in self.items:
+            row = existing.pop((item['category_id'], item['external_id']), None)
+            if row is None:
+                plan.create.append(item)
+                continue
+            product_id = row[0]
+            if row[3:] != tuple(item[field] for field in PRODUCT_FIELDS):
+                plan.update.append((product_id, item))
+            elif parameters.get(product_id, {}) != item['parameters']:
+                plan.parameters[product_id] = item['parameters']
+                plan.parameters_only += 1
+            else:
+                plan.unchanged += 1
+        plan.delete = [row[0] for row in existing.values()]
+        for product_id, item in plan.update:
+            if parameters.get(product_id, {}) != item['parameters']:
+                plan.parameters[product_id] = item['parameters']
+        self.plan = plan
+        return len(self.items)
+
+    @transaction.atomic
+    def write(self):
+        plan = self.plan
+        if self.shop is None:
+            self.shop = Shop.objects.create(name=self.data['shop'], url=self.url, user_id=self.partner)
+        elif self.url and self.shop.url != self.url:
+            Shop.objects.filter(id=self.shop.id).update(url=self.url)
+
+        categories = {category['id']: category['name'] for category in self.data['categories']}
+        known = set(Category.objects.filter(id__in=categories).values_list('id', flat=True))
+        Category.objects.bulk_create([Category(id=category_id, name=name) for category_id, name in categories.items()
+                                      if category_id not in known])
+        self.shop.categories.add(*categories)
+
+        if plan.changed == 0:
+            return 0
+
+        # у Product есть обработчики удаления, поэтому товары удаляются через Collector
+        # построчно (сбросы каталога заглушены, импорт отправит catalog_updated);
+        # их характеристики удаляются заранее одним запросом на пачку
+        with catalog_bulk_write():
+            for ids in chunks(plan.delete):
+                delete_parameters(ids)
+                Product.objects.filter(id__in=ids).delete()
+
+        Product.objects.bulk_update(
+            [Product(id=product_id, **{field: item[field] for field in PRODUCT_FIELDS})
+             for product_id, item in plan.update],
+            PRODUCT_FIELDS, batch_size=BATCH_SIZE)
+
+        Product.objects.bulk_create(
+            [Product(shop_id=self.shop.id, category_id=item['category_id'], external_id=item['external_id'],
+                     **{field: item[field] for field in PRODUCT_FIELDS}) for item in plan.create],
+            batch_size=BATCH_SIZE)
+        if plan.create:
+            created = {(item['category_id'], item['external_id']): item['parameters'] for item in plan.create}
+            for product_id, category_id, external_id in Product.objects.filter(shop_id=self.shop.id).values_list(
+                    'id', 'category_id', 'external_id').iterator(chunk_size=BATCH_SIZE):
+                values = created.get((category_id, external_id))
+                if values:
+                    plan.parameters[product_id] = values
+
+        self.write_parameters(plan.parameters)
+        self.shop.imported_at = timezone.now()
+        Shop.objects.filter(id=self.shop.id).update(imported_at=self.shop.imported_at)
+        return plan.changed
+
+    @staticmethod
+    def write_parameters(product_parameters):
+        """Перезаписывает характеристики товаров: {product_id: {name: value}}"""
+        names = {name for values in product_parameters.values() for name in values}
+        parameter_ids = {}
+        for parameter_id, name in Parameter.objects.filter(name__in=names).values_list('id', 'name'):
+            parameter_ids.setdefault(name, parameter_id)
+        missing = names - set(parameter_ids)
+        if missing:
+            Parameter.objects.bulk_create([Parameter(name=name) for name in missing])
+            for parameter_id, name in Parameter.objects.filter(name__in=missing).values_list('id', 'name'):
+                parameter_ids.setdefault(name, parameter_id)
+
+        for ids in chunks(list(product_parameters)):
+            delete_parameters(ids)
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_id=product_id, parameter_id=parameter_ids[name], value=value)
+             for product_id, values in product_parameters.items() for name, value in values.items()],
+            batch_size=BATCH_SIZE)
+
+    def refresh(self):
+        """Перестраивает предложения магазина и сбрасывает каталог после фиксации транзакции"""
+        changed = self.plan.changed
+        if changed:
+            with transaction.atomic():
+                refresh_shop_offers(self.shop.id)
+            catalog_updated.send(sender=Shop, shop=self.shop, changed=changed, modified=self.shop.imported_at)
+        return changed
@@ -0,0 +1,252 @@
+"""
+Нагрузочное воспроизведение запросов из файла requests.http.
+
+Файл разбирается на сценарий (список запросов, разделенных ###), который выполняют
+параллельно несколько виртуальных пользователей. У каждого пользователя свои email,
+токены и идентификаторы: они подставляются в тела запросов и заголовки и
+запоминаются из ответов сервера. По итогам считаются пропускная способность,
+доля ошибок и гистограммы задержек по каждому эндпоинту.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from ujson import loads as load_json, dumps as dump_json
+
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS')
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Поля ответа, которые запоминаются в контексте виртуального пользователя
+CAPTURES = {
+    'token': 'token',
+    'token for confirm email': 'confirm_token',
+}
+
+# Откуда брать id для запроса, если он не был получен из ответа того же эндпоинта
+ID_SOURCES = {
+    '/order': '/cart',
+    '/user/contact': '/user/contacts',
+}
+
+PLACEHOLDER = re.compile(r'{{\s*(\w+)\s*}}')
+
+
+class HttpCall:
+    """Один запрос из файла .http"""
+
+    def __init__(self, method, url, headers, body):
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+
+    @property
+    def path(self):
+        return urlsplit(self.url).path or '/'
+
+    @property
+    def endpoint(self):
+        return f'{self.method} {self.path}'
+
+    def __repr__(self):
+        return f'<HttpCall {self.endpoint}>'
+
+
+def parse_http_file(text):
+    """Разбирает содержимое файла .http в список HttpCall"""
+    calls = []
+    for block in re.split(r'^###.*$', text, flags=re.MULTILINE):
+        lines = block.splitlines()
+        while lines and (not lines[0].strip() or lines[0].lstrip().startswith(('#', '//'))):
+            lines.pop(0)
+        if not lines:
+            continue
+        parts = lines.pop(0).split()
+        if len(parts) < 2 or parts[0].upper() not in METHODS:
+            continue
+        headers = {}
+        while lines and lines[0].strip():
+            name, _, value = lines.pop(0).partition(':')
+            headers[name.strip()] = value.strip()
+        body = '\n'.join(lines).strip() or None
+        calls.append(HttpCall(parts[0].upper(), parts[1], headers, body))
+    return calls
+
+
+class VirtualUser:
+    """Контекст одного виртуального пользователя: подстановки и запомненные значения"""
+
+    def __init__(self, number):
+        self.number = number
+        self.context = {'vu': str(number)}
+        self.emails = {}
+        self.ids = {}
+        self.session = requests.Session()
+
+    def email(self, original):
+        if original not in self.emails:
+            name, _, domain = original.partition('@')
+            self.emails[original] = f'vu{self.number}.{name}@{domain or "example.com"}'
+        return self.emails[original]
+
+    def substitute(self, text):
+        return PLACEHOLDER.sub(lambda match: self.context.get(match.group(1), match.group(0)), text)
+
+    def prepare(self, call, base_url):
+        url = self.substitute(call.url)
+        if base_url:
+            parts = urlsplit(url)
+            url = base_url.rstrip('/') + parts.path + (f'?{parts.query}' if parts.query else '')
+
+        headers = {name: self.substitute(value) for name, value in call.headers.items()}
+        if 'token' in self.context:
+            for name in headers:
+                if name.lower() == 'authorization' and headers[name].startswith('Token '):
+                    headers[name] = f'Token {self.context["token"]}'
+
+        body = call.body
+        if body is not None:
+            body = self.substitute(body)
+            try:
+                data = load_json(body)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                if 'email' in data:
+                    data['email'] = self.email(str(data['email']))
+                if 'token' in data and 'confirm_token' in self.context:
+                    data['token'] = self.context['confirm_token']
+                if 'id' in data:
+                    captured = self.ids.get(call.path, self.ids.get(ID_SOURCES.get(call.path)))
+                    if captured is not None:
+                        data['id'] = captured
+                body = dump_json(data, ensure_ascii=False)
+            body = body.encode()
+        return url, headers, body
+
+    def capture(self, call, response):
+        try:
+            data = response.json()
+        except ValueError:
+            return
+        if isinstance(data, list) and data and isinstance(data[0], dict):
+            data = data[0]
+            if 'id' in data:
+                self.ids[call.path] = data['id']
+        if isinstance(data, dict):
+            for key, name in CAPTURES.items():
+                if data.get(key):
+                    self.context[name] = str(data[key])
+
+
+class EndpointStats:
+    """Счетчики одного эндпоинта"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latencies = []
+
+    def add(self, status, latency_ms):
+        self.count += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency_ms)] += 1
+        self.latencies.append(latency_ms)
+
+    def percentile(self, percent):
+        if not self.latencies:
+            return 0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class LoadReport:
+    """Итоги прогона, общие для всех потоков"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, status, latency_ms):
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).add(status, latency_ms)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def total(self):
+        return sum(stats.count for stats in self.endpoints.values())
+
+    @property
+    def errors(self):
+        return sum(stats.errors for stats in self.endpoints.values())
+
+    def lines(self):
+        elapsed = self.elapsed or 1
+        total = self.total
+        yield (f'Запросов: {total} за {self.elapsed:.2f} с, {total / elapsed:.1f} запр/с, '
+               f'ошибок: {self.errors} ({self.errors / (total or 1):.1%})')
+        yield ''
+        yield f'{"эндпоинт":<32}{"запр":>7}{"запр/с":>9}{"ошибок":>8}{"p50":>9}{"p95":>9}{"p99":>9}  статусы'
+        for endpoint, stats in sorted(self.endpoints.items()):
+            statuses = ' '.join(f'{status or "ERR"}:{count}' for status, count in sorted(
+                stats.statuses.items(), key=lambda item: item[0] or 0))
+            yield (f'{endpoint:<32}{stats.count:>7}{stats.count / elapsed:>9.1f}{stats.errors:>8}'
+                   f'{stats.percentile(50):>9.1f}{stats.percentile(95):>9.1f}{stats.percentile(99):>9.1f}'
+                   f'  {statuses}')
+        yield ''
+        yield 'Гистограммы задержек, мс:'
+        labels = [f'<={bound}' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}']
+        for endpoint, stats in sorted(self.endpoints.items()):
+            yield f'  {endpoint}'
+            peak = max(stats.buckets) or 1
+            for label, count in zip(labels, stats.buckets):
+                if count:
+                    yield f'    {label:>7} {count:>7} {"#" * max(1, count * 40 // peak)}'
+
+
+def run_scenario(user, calls, base_url, iterations, report, timeout):
+    for _ in range(iterations):
+        for call in calls:
+            url, headers, body = user.prepare(call, base_url)
+            started = time.perf_counter()
+            try:
+                response = user.session.request(call.method, url, headers=headers, data=body, timeout=timeout)
+            except requests.RequestException:
+                report.add(call.endpoint, None, (time.perf_counter() - started) * 1000)
+                continue
+            report.add(call.endpoint, response.status_code, (time.perf_counter() - started) * 1000)
+            user.capture(call, response)
+
+
+def replay(calls, base_url=None, users=1, iterations=1, timeout=10):
+    """
+    Воспроизводит сценарий calls параллельно users виртуальными пользователями.
+    Каждый пользователь проходит сценарий iterations раз. Возвращает LoadReport.
+    """
+    report = LoadReport()
+    virtual_users = [VirtualUser(number) for number in range(1, users + 1)]
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        futures = [executor.submit(run_scenario, user, calls, base_url, iterations, report, timeout)
+                   for user in virtual_users]
+        for future in futures:
+            future.result()
+    report.finished = time.perf_counter()
+    for user in virtual_users:
+        user.session.close()
+    return report
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_orders
+from api.reaper import BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Переносит доставленные и отмененные заказы в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Возраст заказов, дни (по умолчанию ORDER_ARCHIVE_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Заказов в одной транзакции')
+
+    def handle(self, *args, **options):
+        result = archive_orders(options['days'], options['batch_size'])
+        self.stdout.write(f'Заказов перенесено в архив: {result["orders"]}, позиций: {result["items"]}')
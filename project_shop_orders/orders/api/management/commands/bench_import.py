@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import TestCase
+
+from api.importer import PriceListImport, STAGES
+from api.models import User
+from api.pricelist import write_price_list
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Замеряет импорт прайса по стадиям (fetch, parse, validate, diff, write, refresh). '
+            'Прайс генерируется и раздается локальным HTTP-сервером, '
+            'каждый размер импортируется дважды: начальная загрузка и повторная без изменений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, nargs='+', default=[1000, 100000, 1000000],
+                            help='Размеры прайсов в товарах')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Не откатывать записанные в базу товары')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                for count in options['goods']:
+                    name = f'pricelist-{count}.yaml'
+                    write_price_list(os.path.join(directory, name), count, shop=f'Бенчмарк {count}',
+                                     seed=options['seed'])
+                    url = f'http://127.0.0.1:{server.server_port}/{name}'
+                    self.bench(count, url, options['keep'])
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def bench(self, count, url, keep):
+        with transaction.atomic():
+            user, _ = User.objects.get_or_create(email=f'bench-import-{count}@example.com',
+                                                 defaults={'type': 'shop', 'is_active': True})
+            for attempt in ('initial', 'reimport'):
+                price_list = PriceListImport(user.id, url=url)
+                # внутри транзакции бенчмарка on_commit не срабатывает: сброс каталога
+                # выполняется сразу после импорта и учитывается во времени стадии refresh
+                with TestCase.captureOnCommitCallbacks() as callbacks:
+                    price_list.run()
+                started = time.perf_counter()
+                for callback in callbacks:
+                    callback()
+                price_list.stats['refresh']['seconds'] += time.perf_counter() - started
+                self.report(count, attempt, price_list.stats)
+            if not keep:
+                transaction.set_rollback(True)
+
+    def report(self, count, attempt, stats):
+        self.stdout.write(f'\n{count} товаров, {attempt}')
+        self.stdout.write(f'{"стадия":<10}{"секунд":>12}{"строк":>12}{"строк/с":>14}')
+        total = 0
+        for stage in STAGES:
+            seconds, rows = stats[stage]['seconds'], stats[stage]['rows']
+            total += seconds
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{stage:<10}{seconds:>12.3f}{rows:>12}{rate:>14.0f}')
+        self.stdout.write(f'{"всего":<10}{total:>12.3f}')
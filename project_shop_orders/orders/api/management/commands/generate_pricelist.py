@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.pricelist import write_price_list
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический прайс-лист в формате импорта'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл, в который будет записан прайс')
+        parser.add_argument('--goods', type=int, default=1000, help='Количество товаров')
+        parser.add_argument('--shop', default='Синтетический магазин', help='Название магазина')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        write_price_list(options['path'], options['goods'], shop=options['shop'], seed=options['seed'])
+        self.stdout.write(f'{options["path"]}: {options["goods"]} товаров')
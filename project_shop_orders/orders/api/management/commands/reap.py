@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.reaper import reap_carts, reap_confirm_tokens, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные корзины и устаревшие токены подтверждения email'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Срок хранения корзин без изменений, дни '
+                                                     '(по умолчанию CART_RETENTION_DAYS)')
+        parser.add_argument('--token-ttl', type=int, help='Срок жизни токенов подтверждения, секунды '
+                                                          '(по умолчанию CONFIRM_EMAIL_TOKEN_TTL)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Строк в одной транзакции')
+        parser.add_argument('--skip-carts', action='store_true')
+        parser.add_argument('--skip-tokens', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_carts']:
+            result = reap_carts(options['days'], options['batch_size'])
+            self.stdout.write(f'Корзин удалено: {result["orders"]}, позиций: {result["items"]}')
+        if not options['skip_tokens']:
+            result = reap_confirm_tokens(options['token_ttl'], options['batch_size'])
+            self.stdout.write(f'Токенов удалено: {result["tokens"]}')
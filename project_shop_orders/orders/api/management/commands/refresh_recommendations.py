@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации "покупают вместе" по новым или всем заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать по всем заказам')
+        parser.add_argument('--top-k', type=int, help='Соседей на товар (по умолчанию RECOMMENDATIONS_TOP_K)')
+
+    def handle(self, *args, **options):
+        result = refresh_recommendations(options['full'], options['top_k'])
+        self.stdout.write(f'Позиций обработано: {result["lines"]}, пар: {result["pairs"]}, '
+                          f'товаров: {result["products"]}')
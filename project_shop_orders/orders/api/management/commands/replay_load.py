@@ -0,0 +1,30 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.loadtest import parse_http_file, replay
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит запросы из requests.http параллельно несколькими виртуальными пользователями '
+            'и выводит пропускную способность, ошибки и гистограммы задержек по эндпоинтам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=os.path.join(settings.BASE_DIR, 'requests.http'),
+                            help='Файл со сценарием в формате .http')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Адрес сервера, который подставляется вместо адреса из файла')
+        parser.add_argument('--users', type=int, default=10, help='Количество виртуальных пользователей')
+        parser.add_argument('--iterations', type=int, default=1, help='Сколько раз каждый пользователь проходит сценарий')
+        parser.add_argument('--timeout', type=float, default=10, help='Таймаут запроса, с')
+
+    def handle(self, *args, **options):
+        with open(options['file'], encoding='utf-8') as file:
+            calls = parse_http_file(file.read())
+        self.stdout.write(f'Сценарий: {len(calls)} запросов, пользователей: {options["users"]}, '
+                          f'повторов: {options["iterations"]}')
+        report = replay(calls, base_url=options['base_url'], users=options['users'],
+                        iterations=options['iterations'], timeout=options['timeout'])
+        for line in report.lines():
+            self.stdout.write(line)
@@ -0,0 +1,403 @@
+"""
+Метрики сервиса в текстовом формате Prometheus.
+
+Счетчики и гистограммы хранятся в памяти процесса. Если задан METRICS_MULTIPROCESS_DIR,
+каждый процесс (воркер gunicorn, celery) не чаще раза в METRICS_FLUSH_INTERVAL секунд
+сбрасывает свой снимок в файл metrics-<имя процесса>.json; последний интервал дописывается
+таймером и при выходе процесса. Пока процесс жив, он держит блокировку файла
+metrics-<имя процесса>.lock. Эндпоинт /metrics суммирует файлы процессов, а снимки
+процессов, чья блокировка освободилась, переносит в общий файл metrics-finished.json,
+поэтому суммы счетчиков не уменьшаются при перезапуске воркеров.
+
+Эндпоинт доступен по токену METRICS_TOKEN (заголовок Authorization: Bearer <токен>),
+а если токен не задан - только с адресов INTERNAL_IPS.
+"""
+import atexit
+import contextvars
+import fcntl
+import glob
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection
+from ujson import dumps as dump_json, loads as load_json
+
+
+# Границы корзин гистограмм, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    'http_requests_total': 'Количество запросов',
+    'http_request_duration_seconds': 'Время обработки запроса',
+    'http_db_queries_total': 'Количество запросов к базе данных',
+    'http_db_duration_seconds_total': 'Время выполнения запросов к базе данных',
+    'http_serializer_duration_seconds_total': 'Время сериализации ответа',
+    'http_response_size_bytes_total': 'Размер ответов',
+    'celery_tasks_published_total': 'Количество поставленных в очередь задач',
+    'celery_task_queue_latency_seconds': 'Время от постановки задачи в очередь до начала выполнения',
+    'celery_task_payload_bytes': 'Размер аргументов задачи',
+    'celery_task_run_duration_seconds': 'Время выполнения задачи',
+    'celery_task_runs_total': 'Количество выполненных задач',
+    'celery_task_retries_total': 'Количество повторов задач',
+    'celery_task_failures_total': 'Количество ошибок задач',
+    'import_stage_seconds_total': 'Время стадий импорта прайса',
+    'import_stage_rows_total': 'Строк обработано стадиями импорта прайса',
+    'import_stage_rows_per_second': 'Скорость обработки строк стадией импорта прайса',
+    'cache_requests_total': 'Обращения к двухуровневому кэшу',
+    'cache_invalidations_total': 'Сбросы пространств имен кэша',
+    'reaper_deleted_rows_total': 'Строк удалено очисткой брошенных корзин и токенов',
+    'archive_moved_rows_total': 'Строк перенесено в архив заказов',
+    'fetch_attempts_total': 'Попытки загрузки прайс-листов поставщиков',
+}
+
+
+class Registry:
+    """
+    Хранилище метрик процесса.
+    Ключ метрики - пара (имя, кортеж пар меток); гистограмма хранится списком
+    [счетчики корзин..., сумма, количество].
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed = 0
+        self._timer = None
+        # (pid, каталог, имя снимка, файл удерживаемой блокировки)
+        self._owner = None
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=DURATION_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                self.buckets.setdefault(name, buckets)
+                histogram = self.histograms[key] = [0] * (len(buckets) + 3)
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in
+                               self.histograms.items()],
+                'buckets': {name: list(buckets) for name, buckets in self.buckets.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.buckets.clear()
+        self._flushed = 0
+
+    def maybe_flush(self):
+        """
+        Сбрасывает снимок процесса в каталог метрик, если подошло время;
+        иначе ставит таймер, чтобы изменения попали в файл и без следующих запросов
+        """
+        directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+        if not directory:
+            return
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1)
+        now = time.monotonic()
+        if now - self._flushed < interval:
+            self.schedule(interval - (now - self._flushed))
+            return
+        self._flushed = now
+        self.flush(directory)
+
+    def schedule(self, delay):
+        with self._flush_lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(delay, self.flush_pending)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush_pending(self):
+        directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+        if directory:
+            self._flushed = time.monotonic()
+            self.flush(directory)
+
+    def flush_at_exit(self):
+        owner = self._owner
+        if owner is not None and owner[0] == os.getpid():
+            try:
+                self.flush(owner[1])
+            except OSError:
+                pass
+
+    def name(self, directory):
+        """Имя снимка процесса в каталоге или None, если процесс еще не сбрасывал снимок"""
+        owner = self._owner
+        if owner is not None and owner[0] == os.getpid() and owner[1] == directory:
+            return owner[2]
+        return None
+
+    def own(self, directory):
+        """
+        Имя снимка процесса. Файл блокировки создается и блокируется до первой записи
+        снимка и остается заблокированным до выхода процесса (после fork - новое имя).
+        """
+        name = self.name(directory)
+        if name is not None:
+            return name
+        if self._owner is None:
+            atexit.register(self.flush_at_exit)
+        else:
+            # после fork закрывается и унаследованный файл: блокировку держит только родитель
+            self._owner[3].close()
+        name = f'{os.getpid()}-{uuid4().hex[:12]}'
+        lock = open(os.path.join(directory, f'metrics-{name}.lock'), 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        self._owner = (os.getpid(), directory, name, lock)
+        return name
+
+    def flush(self, directory):
+        with self._flush_lock:
+            path = os.path.join(directory, f'metrics-{self.own(directory)}.json')
+            with open(f'{path}.tmp', 'w') as file:
+                file.write(dump_json(self.snapshot()))
+            os.replace(f'{path}.tmp', path)
+
+
+registry = Registry()
+
+
+FINISHED = 'finished'
+
+
+@contextmanager
+def directory_lock(directory):
+    """Исключительная блокировка каталога метрик на время сбора и переноса снимков"""
+    with open(os.path.join(directory, 'metrics.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as file:
+            return load_json(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def unmerge(counters, histograms, buckets):
+    """Снимок из результата merge"""
+    return {
+        'counters': [[name, [list(pair) for pair in labels], value] for (name, labels), value in counters.items()],
+        'histograms': [[name, [list(pair) for pair in labels], values] for (name, labels), values in
+                       histograms.items()],
+        'buckets': buckets,
+    }
+
+
+def retire(directory, name):
+    """
+    Переносит снимок завершившегося процесса в metrics-finished.json.
+    Процесс считается завершившимся, если его файл блокировки удалось заблокировать;
+    возвращает False, если процесс еще работает.
+    """
+    path = os.path.join(directory, f'metrics-{name}.json')
+    lock_path = os.path.join(directory, f'metrics-{name}.lock')
+    with open(lock_path, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        snapshot = load_snapshot(path)
+        if snapshot is not None:
+            finished_path = os.path.join(directory, f'metrics-{FINISHED}.json')
+            finished = load_snapshot(finished_path)
+            merged = unmerge(*merge([finished, snapshot] if finished else [snapshot]))
+            with open(f'{finished_path}.tmp', 'w') as file:
+                file.write(dump_json(merged))
+            os.replace(f'{finished_path}.tmp', finished_path)
+        for stale in (path, lock_path):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    return True
+
+
+def collect():
+    """
+    Снимки всех процессов: текущий процесс берется из памяти, остальные - из файлов.
+    Снимки завершившихся процессов сначала переносятся в metrics-finished.json.
+    """
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+    if directory:
+        own = registry.name(directory)
+        with directory_lock(directory):
+            names = [os.path.basename(path)[len('metrics-'):-len('.json')]
+                     for path in glob.glob(os.path.join(directory, 'metrics-*.json'))]
+            # сначала переносятся снимки завершившихся процессов, затем читаются оставшиеся файлы
+            names = [name for name in names if name in (own, FINISHED) or not retire(directory, name)]
+            if FINISHED not in names:
+                names.append(FINISHED)
+            for name in names:
+                if name == own:
+                    continue
+                snapshot = load_snapshot(os.path.join(directory, f'metrics-{name}.json'))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+    return snapshots
+
+
+def allowed(request):
+    """Доступ к /metrics: по токену METRICS_TOKEN, без токена - только с адресов INTERNAL_IPS"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip().encode(), token.encode())
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'INTERNAL_IPS', ())
+
+
+def merge(snapshots):
+    counters, histograms, buckets = {}, {}, {}
+    for snapshot in snapshots:
+        buckets.update(snapshot['buckets'])
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+    return counters, histograms, buckets
+
+
+def format_labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def exposition():
+    """Текст для эндпоинта /metrics"""
+    counters, histograms, buckets = merge(collect())
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {name} histogram')
+        bounds = [str(bound) for bound in buckets[name]] + ['+Inf']
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds, values[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {values[-2]}')
+            lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestState:
+    __slots__ = ('queries', 'db_time', 'serializer_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def instrument_serializers():
+    """Оборачивает BaseSerializer.data, чтобы учитывать время сериализации текущего запроса"""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(self):
+        state = current_request.get()
+        if state is None:
+            return data.fget(self)
+        started = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            state.serializer_time += time.perf_counter() - started
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики по имени маршрута и HTTP-методу: время ответа, число и время
+    запросов к базе данных, время сериализации и размер ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+        state = RequestState()
+        token = current_request.set(state)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(state):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.url_name or match.route or match.view_name) if match else '<unresolved>'
+        labels = (('view', view), ('method', request.method))
+        registry.inc('http_requests_total', labels + (('status', response.status_code),))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.inc('http_db_queries_total', labels, state.queries)
+        registry.inc('http_db_duration_seconds_total', labels, state.db_time)
+        registry.inc('http_serializer_duration_seconds_total', labels, state.serializer_time)
+        if not response.streaming:
+            registry.inc('http_response_size_bytes_total', labels, len(response.content))
+        registry.maybe_flush()
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='imported_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время последнего импорта'),
+        ),
+    ]
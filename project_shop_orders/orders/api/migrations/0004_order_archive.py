@@ -0,0 +1,55 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('cart', 'В корзине'), ('new', 'Новый'), ('confirmed', 'Подтвержден'), ('assembled', 'Собран'), ('sent', 'Отправлен'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], max_length=15, verbose_name='Статус')),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='Версия')),
+                ('archived', models.DateTimeField(auto_now_add=True, verbose_name='Перенесен в архив')),
+                ('contact', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.contact', verbose_name='Контакт')),
+                ('user', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('product_name', models.CharField(max_length=80, verbose_name='Название товара')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(default=0, verbose_name='Цена')),
+                ('total_amount', models.PositiveIntegerField(default=0, verbose_name='Общая стоимость')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.category', verbose_name='Категория товара')),
+                ('order', models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, related_name='ordered_items', to='api.archivedorder', verbose_name='Заказ')),
+                ('shop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.shop', verbose_name='магазин')),
+            ],
+            options={
+                'verbose_name': 'Архивная позиция',
+                'verbose_name_plural': 'Список архивных позиций',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'created'], name='archived_order_user_created'),
+        ),
+    ]
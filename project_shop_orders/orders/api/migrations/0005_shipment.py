@@ -0,0 +1,55 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:15
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def create_shipments(apps, schema_editor):
+    """Отправления для уже оформленных заказов, со статусом заказа"""
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Shipment = apps.get_model('api', 'Shipment')
+    statuses = dict(Order.objects.exclude(status='cart').values_list('id', 'status'))
+    rows = OrderItem.objects.filter(order_id__in=list(statuses), shop__isnull=False).values(
+        'order_id', 'shop_id').annotate(total_sum=Sum('total_amount'), total_quantity=Sum('quantity')).order_by()
+    Shipment.objects.bulk_create([Shipment(status=statuses[row['order_id']], **row) for row in rows],
+                                 batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shipment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('cart', 'В корзине'), ('new', 'Новый'), ('confirmed', 'Подтвержден'), ('assembled', 'Собран'), ('sent', 'Отправлен'), ('delivered', 'Доставлен'), ('canceled', 'Отменен')], default='new', max_length=15, verbose_name='Статус')),
+                ('total_sum', models.PositiveIntegerField(default=0, verbose_name='Общая стоимость')),
+                ('total_quantity', models.PositiveIntegerField(default=0, verbose_name='Количество товаров')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='Версия')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='api.order', verbose_name='Заказ')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='api.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Отправление',
+                'verbose_name_plural': 'Список отправлений',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['shop', '-created'], name='shipment_shop_created'),
+        ),
+        migrations.AddConstraint(
+            model_name='shipment',
+            constraint=models.UniqueConstraint(fields=('order', 'shop'), name='unique_order_shipment'),
+        ),
+        migrations.RunPython(create_shipments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_shipment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='user_email_prefix', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['type', 'email'], name='user_type_email'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['company', 'email'], name='user_company_email'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_offers(apps, schema_editor):
+    """Индекс предложений для уже загруженных товаров"""
+    Product = apps.get_model('api', 'Product')
+    BestOffer = apps.get_model('api', 'BestOffer')
+    rows = Product.objects.filter(shop__state=True, quantity__gt=0).exclude(model='').values_list(
+        'id', 'shop_id', 'model', 'price', 'quantity').order_by()
+    BestOffer.objects.bulk_create([BestOffer(product_id=product_id, shop_id=shop_id, model=model, price=price,
+                                             quantity=quantity)
+                                   for product_id, shop_id, model, price, quantity in rows.iterator(1000)],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestOffer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=80, verbose_name='Модель')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='best_offer', to='api.product', verbose_name='Товар')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Предложение',
+                'verbose_name_plural': 'Индекс лучших предложений',
+                'ordering': ('model', 'price'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bestoffer',
+            index=models.Index(fields=['model', 'price'], name='best_offer_model_price'),
+        ),
+        migrations.RunPython(create_offers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.5 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_best_offer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rebuilt', models.DateTimeField(blank=True, null=True, verbose_name='Полный пересчет')),
+                ('refreshed', models.DateTimeField(blank=True, null=True, verbose_name='Последний пересчет')),
+            ],
+            options={
+                'verbose_name': 'Состояние рекомендаций',
+                'verbose_name_plural': 'Состояние рекомендаций',
+            },
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='counted',
+            field=models.BooleanField(default=False, verbose_name='Учтено в рекомендациях'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('counted', False)), fields=['order'], name='shipment_uncounted'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.dispatch import Signal
 from django.utils.translation import gettext_lazy as _
 from django_rest_passwordreset.tokens import get_token_generator
 
@@ -23,10 +24,36 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+# Переходы статусов заказа, доступные магазину: текущий статус -> допустимые новые
+ORDER_TRANSITIONS = {
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled', 'canceled'),
+    'assembled': ('sent', 'canceled'),
+    'sent': ('delivered',),
+}
+
 # Create your models here.
 
 
-class UserManager(BaseUserManager):
+# Отправляется после UserQuerySet.update с идентификаторами измененных пользователей:
+# массовое изменение (например, is_active=False) не вызывает post_save
+users_updated = Signal()
+
+
+class UserQuerySet(models.QuerySet):
+    """Пользователи; update сообщает об изменении сигналом users_updated"""
+
+    def update(self, **kwargs):
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        if user_ids:
+            users_updated.send(sender=self.model, user_ids=user_ids, using=self.db)
+        return updated
+
+    update.alters_data = True
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """
     Миксин для управления пользователями
     """
@@ -125,6 +152,12 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = "Список пользователей"
         ordering = ('email',)
+        indexes = [
+            # поиск по началу email (LIKE 'abc%') в PostgreSQL при не-C локали
+            models.Index(fields=['email'], name='user_email_prefix', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['type', 'email'], name='user_type_email'),
+            models.Index(fields=['company', 'email'], name='user_company_email'),
+        ]
 
 
 class Contact(models.Model):
@@ -210,6 +243,8 @@ class Shop(models.Model):
 	user = models.OneToOneField(User, verbose_name='Пользователь', blank=True, null=True, on_delete=models.CASCADE)
 	# Статус получения заказов
 	state = models.BooleanField(verbose_name='Cтатус получения заказов', default=True)
+	# Время последнего импорта прайса, из него строится Last-Modified каталога
+	imported_at = models.DateTimeField(verbose_name='Время последнего импорта', null=True, blank=True)
 
 	class Meta:
 		verbose_name = 'Магазин'
@@ -348,11 +383,14 @@ class Order(models.Model):
 		on_delete=models.CASCADE)
 	created = models.DateTimeField(auto_now_add=True)
 	updated = models.DateTimeField(auto_now=True)
+	# Версия строки для оптимистичных блокировок, увеличивается при каждом изменении заказа
+	version = models.PositiveIntegerField(verbose_name='Версия', default=1)
 
 	class Meta:
 		verbose_name = 'Заказ'
 		verbose_name_plural = "Список заказов"
 		ordering = ('-created',)
+		indexes = [models.Index(fields=['user', 'created'], name='order_user_created'), ]
 
 	def __str__(self):
 		return str(self.created)
@@ -397,3 +435,163 @@ class OrderItem(models.Model):
 	def save(self, *args, **kwargs):
 		self.total_amount = self.price * self.quantity
 		super(OrderItem, self).save(*args, **kwargs)
+
+
+class Shipment(models.Model):
+	"""
+	Часть заказа одного магазина (отправление). Создается при оформлении заказа
+	для каждого магазина из корзины, хранит свои итоги и статус, поэтому магазин
+	читает и меняет свои заказы, не обращаясь к позициям и строке общего заказа.
+	"""
+	order = models.ForeignKey(Order, verbose_name='Заказ', related_name='shipments', on_delete=models.CASCADE)
+	shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='shipments', on_delete=models.CASCADE)
+	status = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15, default='new')
+	total_sum = models.PositiveIntegerField(verbose_name='Общая стоимость', default=0)
+	total_quantity = models.PositiveIntegerField(verbose_name='Количество товаров', default=0)
+	created = models.DateTimeField(auto_now_add=True)
+	updated = models.DateTimeField(auto_now=True)
+	version = models.PositiveIntegerField(verbose_name='Версия', default=1)
+	counted = models.BooleanField(verbose_name='Учтено в рекомендациях', default=False)
+
+	class Meta:
+		verbose_name = 'Отправление'
+		verbose_name_plural = "Список отправлений"
+		ordering = ('-created',)
+		constraints = [models.UniqueConstraint(fields=['order', 'shop'], name='unique_order_shipment'), ]
+		indexes = [
+			models.Index(fields=['shop', '-created'], name='shipment_shop_created'),
+			models.Index(fields=['order'], condition=models.Q(counted=False), name='shipment_uncounted'),
+		]
+
+	def __str__(self):
+		return f'{self.order_id} - {self.shop_id}'
+
+
+class ArchivedOrder(models.Model):
+	"""
+	Архивный заказ: доставленные и отмененные заказы старше ORDER_ARCHIVE_DAYS
+	переносятся сюда из Order с тем же идентификатором (api.archive),
+	чтобы таблицы текущих заказов и их индексы оставались небольшими.
+	"""
+	id = models.PositiveIntegerField(primary_key=True)
+	user = models.ForeignKey(User, verbose_name='Пользователь', related_name='archived_orders', blank=True,
+		on_delete=models.CASCADE)
+	status = models.CharField(verbose_name='Статус', choices=STATE_CHOICES, max_length=15)
+	contact = models.ForeignKey(Contact, verbose_name='Контакт', blank=True, null=True,
+		on_delete=models.SET_NULL)
+	created = models.DateTimeField()
+	updated = models.DateTimeField()
+	version = models.PositiveIntegerField(verbose_name='Версия', default=1)
+	archived = models.DateTimeField(verbose_name='Перенесен в архив', auto_now_add=True)
+
+	class Meta:
+		verbose_name = 'Архивный заказ'
+		verbose_name_plural = "Архив заказов"
+		ordering = ('-created',)
+		indexes = [models.Index(fields=['user', 'created'], name='archived_order_user_created'), ]
+
+	def __str__(self):
+		return str(self.created)
+
+
+class ArchivedOrderItem(models.Model):
+	"""
+	Позиция архивного заказа, копия OrderItem с тем же идентификатором.
+	"""
+	id = models.PositiveIntegerField(primary_key=True)
+	order = models.ForeignKey(ArchivedOrder, verbose_name='Заказ', related_name='ordered_items', blank=True,
+		on_delete=models.CASCADE)
+	category = models.ForeignKey(Category, verbose_name='Категория товара', related_name='+', blank=True,
+		null=True, on_delete=models.SET_NULL)
+	shop = models.ForeignKey(Shop, verbose_name='магазин', related_name='+', blank=True, null=True,
+		on_delete=models.SET_NULL)
+	product_name = models.CharField(max_length=80, verbose_name='Название товара')
+	external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+	quantity = models.PositiveIntegerField(default=1, verbose_name='Количество')
+	price = models.PositiveIntegerField(default=0, verbose_name='Цена')
+	total_amount = models.PositiveIntegerField(default=0, verbose_name='Общая стоимость')
+
+	class Meta:
+		verbose_name = 'Архивная позиция'
+		verbose_name_plural = "Список архивных позиций"
+
+	def __str__(self):
+		return self.product_name
+
+
+class CoPurchase(models.Model):
+	"""
+	Сколько раз два товара покупались в одном заказе; считается задачей api.recommendations.
+	"""
+	product = models.ForeignKey(Product, verbose_name='Товар', related_name='+', on_delete=models.CASCADE)
+	related = models.ForeignKey(Product, verbose_name='Товар из того же заказа', related_name='+',
+		on_delete=models.CASCADE)
+	count = models.PositiveIntegerField(verbose_name='Количество заказов')
+
+	class Meta:
+		verbose_name = 'Совместная покупка'
+		verbose_name_plural = "Совместные покупки"
+		constraints = [models.UniqueConstraint(fields=['product', 'related'], name='unique_copurchase'), ]
+
+	def __str__(self):
+		return f'{self.product_id} - {self.related_id}'
+
+
+class RelatedProduct(models.Model):
+	"""
+	Лучшие top-K товаров, которые покупают вместе с товаром, по порядку rank.
+	"""
+	product = models.ForeignKey(Product, verbose_name='Товар', related_name='related_products',
+		on_delete=models.CASCADE)
+	related = models.ForeignKey(Product, verbose_name='Рекомендуемый товар', related_name='+',
+		on_delete=models.CASCADE)
+	rank = models.PositiveSmallIntegerField(verbose_name='Место')
+	count = models.PositiveIntegerField(verbose_name='Количество заказов')
+
+	class Meta:
+		verbose_name = 'Рекомендуемый товар'
+		verbose_name_plural = "Рекомендуемые товары"
+		ordering = ('product', 'rank')
+		constraints = [models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'), ]
+
+	def __str__(self):
+		return f'{self.product_id} - {self.related_id}'
+
+
+class RecommendationState(models.Model):
+	"""
+	Состояние пересчета рекомендаций - одна строка. На время пересчета строка
+	блокируется, поэтому запуски из разных процессов выполняются по очереди.
+	"""
+	rebuilt = models.DateTimeField(verbose_name='Полный пересчет', null=True, blank=True)
+	refreshed = models.DateTimeField(verbose_name='Последний пересчет', null=True, blank=True)
+
+	class Meta:
+		verbose_name = 'Состояние рекомендаций'
+		verbose_name_plural = "Состояние рекомендаций"
+
+	def __str__(self):
+		return f'{self.rebuilt} - {self.refreshed}'
+
+
+class BestOffer(models.Model):
+	"""
+	Предложение товара в индексе лучших цен: товары с заполненной моделью и остатком
+	у магазинов, принимающих заказы. Обновляется импортом прайса и сменой статуса
+	магазина (api.offers); products/offers читает его по индексу (model, price).
+	"""
+	product = models.OneToOneField(Product, verbose_name='Товар', related_name='best_offer',
+		on_delete=models.CASCADE)
+	shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE)
+	model = models.CharField(max_length=80, verbose_name='Модель')
+	price = models.PositiveIntegerField(verbose_name='Цена')
+	quantity = models.PositiveIntegerField(verbose_name='Количество')
+
+	class Meta:
+		verbose_name = 'Предложение'
+		verbose_name_plural = "Индекс лучших предложений"
+		ordering = ('model', 'price')
+		indexes = [models.Index(fields=['model', 'price'], name='best_offer_model_price'), ]
+
+	def __str__(self):
+		return f'{self.model} - {self.price}'
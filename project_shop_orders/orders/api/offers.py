@@ -0,0 +1,44 @@
+"""
+Индекс лучших предложений по модели товара (Product.model).
+
+В BestOffer лежат копии цены и остатка товаров с заполненной моделью и ненулевым
+остатком у магазинов, принимающих заказы. Индекс перестраивается целиком для магазина:
+после импорта его прайса, при смене статуса магазина и при сохранении магазина;
+отдельный товар обновляется при сохранении. Чтение - диапазон индекса (model, price),
+без группировки по всей таблице товаров.
+"""
+from api.models import Product, BestOffer
+
+
+BATCH_SIZE = 1000
+
+OFFER_FIELDS = ('id', 'shop_id', 'model', 'price', 'quantity')
+
+
+def offers(queryset):
+    """Товары queryset, которые попадают в индекс"""
+    return queryset.filter(shop__state=True, quantity__gt=0).exclude(model='')
+
+
+def refresh_shop_offers(shop_id):
+    """Перестраивает предложения магазина, возвращает их количество"""
+    BestOffer.objects.filter(shop_id=shop_id).delete()
+    rows = offers(Product.objects.filter(shop_id=shop_id)).values_list(*OFFER_FIELDS).order_by()
+    return len(BestOffer.objects.bulk_create(
+        [BestOffer(product_id=row[0], **dict(zip(OFFER_FIELDS[1:], row[1:]))) for row in rows.iterator(BATCH_SIZE)],
+        batch_size=BATCH_SIZE))
+
+
+def refresh_product_offer(product):
+    """Обновляет предложение одного товара"""
+    if offers(Product.objects.filter(id=product.id)).exists():
+        BestOffer.objects.update_or_create(product_id=product.id, defaults={
+            field: getattr(product, field) for field in OFFER_FIELDS[1:]})
+    else:
+        BestOffer.objects.filter(product_id=product.id).delete()
+
+
+def best_offers(model):
+    """Предложения модели по возрастанию цены"""
+    return BestOffer.objects.filter(model=model).select_related('shop', 'product').order_by('price', '-quantity')
+
@@ -0,0 +1,103 @@
+"""
+Массовая смена статусов заказов магазином.
+
+Магазин меняет статусы своих отправлений (Shipment). Запрошенные переходы проверяются
+по ORDER_TRANSITIONS для всех заказов сразу, затем в одной транзакции выполняется
+по одному UPDATE на каждый новый статус. Письма покупателям и пересчет статусов общих
+заказов выполняются задачами Celery пачками после фиксации транзакции.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.concurrency import VersionConflict
+from api.models import Shop, Shipment, ORDER_TRANSITIONS, STATE_CHOICES
+from api.tasks import send_status_notifications, sync_shipment_orders
+
+
+NOTIFICATION_BATCH_SIZE = 500
+
+STATES = dict(STATE_CHOICES)
+
+
+class TransitionError(Exception):
+    """Переходы не прошли проверку; errors - список ошибок по заказам"""
+
+    def __init__(self, errors):
+        super().__init__('Недопустимые изменения статусов')
+        self.errors = errors
+
+
+def parse_changes(orders):
+    """
+    Приводит запрос к словарям {order_id: status} и {order_id: version}.
+    Аргументы:
+        orders: список словарей с ключами id, status и необязательным version.
+    """
+    changes, versions, errors = {}, {}, []
+    for row, item in enumerate(orders):
+        try:
+            order_id, state = int(item['id']), str(item['status'])
+        except (KeyError, TypeError, ValueError):
+            errors.append({'row': row, 'id': None, 'error': 'Нужны поля id и status'})
+            continue
+        if state not in STATES:
+            errors.append({'row': row, 'id': order_id, 'error': 'Неизвестный статус'})
+        elif order_id in changes and changes[order_id] != state:
+            errors.append({'row': row, 'id': order_id, 'error': 'Заказ указан несколько раз'})
+        else:
+            changes[order_id] = state
+            if str(item.get('version', '')).isdigit():
+                versions[order_id] = int(item['version'])
+    if errors:
+        raise TransitionError(errors)
+    return changes, versions
+
+
+def change_statuses(shop_user_id, changes, versions=None):
+    """
+    Переводит заказы магазина в новые статусы, все или ни одного.
+    Аргументы:
+        shop_user_id (int): пользователь-магазин.
+        changes (dict): {order_id: новый статус}.
+        versions (dict): {order_id: ожидаемая версия отправления}; при расхождении - VersionConflict.
+    Возвращает {статус: число заказов}.
+    """
+    versions = versions or {}
+    shop_id = Shop.objects.filter(user_id=shop_user_id).values_list('id', flat=True).first()
+    with transaction.atomic():
+        rows = list(Shipment.objects.select_for_update().filter(shop_id=shop_id, order_id__in=changes).values_list(
+            'order_id', 'id', 'status', 'version'))
+        current = {order_id: state for order_id, _, state, _ in rows}
+        shipments = {order_id: shipment_id for order_id, shipment_id, _, _ in rows}
+        for order_id, _, _, version in rows:
+            if versions.get(order_id, version) != version:
+                raise VersionConflict(order_id, version)
+        errors = []
+        targets = defaultdict(list)
+        for order_id, state in changes.items():
+            if order_id not in current:
+                errors.append({'id': order_id, 'error': 'Заказ не найден'})
+            elif current[order_id] == state:
+                continue
+            elif state not in ORDER_TRANSITIONS.get(current[order_id], ()):
+                errors.append({'id': order_id, 'error': f'Переход {current[order_id]} -> {state} недопустим'})
+            else:
+                targets[state].append(order_id)
+        if errors:
+            raise TransitionError(errors)
+
+        now = timezone.now()
+        for state, ids in targets.items():
+            Shipment.objects.filter(id__in=[shipments[order_id] for order_id in ids]).update(
+                status=state, updated=now, version=F('version') + 1)
+
+        notifications = [(order_id, state) for state, ids in targets.items() for order_id in ids]
+        for start in range(0, len(notifications), NOTIFICATION_BATCH_SIZE):
+            batch = notifications[start:start + NOTIFICATION_BATCH_SIZE]
+            transaction.on_commit(lambda batch=batch: send_status_notifications.delay(batch))
+            transaction.on_commit(lambda batch=batch: sync_shipment_orders.delay(
+                [order_id for order_id, _ in batch]))
+    return {state: len(ids) for state, ids in targets.items()}
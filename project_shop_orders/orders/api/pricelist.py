@@ -0,0 +1,89 @@
+"""
+Запись прайс-листов в формате импорта (shop/categories/goods/parameters).
+
+Документ пишется по частям, поэтому прайс на миллион товаров не собирается в памяти целиком.
+Строки записываются в двойных кавычках в JSON-нотации, которая является корректным YAML.
+"""
+import random
+
+from ujson import dumps as dump_json
+
+
+SYNTHETIC_CATEGORIES = (
+    (224, 'Смартфоны'),
+    (15, 'Аксессуары'),
+    (1, 'Flash-накопители'),
+    (5, 'Телевизоры'),
+)
+
+SYNTHETIC_COLORS = ('черный', 'белый', 'красный', 'золотистый', 'серебристый')
+
+
+def quote(value):
+    """Скаляр YAML: числа как есть, все остальное - строкой в кавычках"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return dump_json(str(value), ensure_ascii=False, escape_forward_slashes=False)
+    return str(value)
+
+
+def iter_price_list(shop, categories, goods):
+    """
+    Генератор фрагментов YAML-документа прайса.
+    Аргументы:
+        shop (str): название магазина.
+        categories: итерируемое пар (id, name).
+        goods: итерируемое словарей с ключами id, category, model, name,
+            price, price_rrc, quantity, parameters.
+    """
+    yield f'shop: {quote(shop)}\ncategories:\n'
+    for category_id, name in categories:
+        yield f'  - id: {category_id}\n    name: {quote(name)}\n'
+    yield 'goods:\n'
+    for item in goods:
+        lines = [
+            f'  - id: {item["id"]}\n',
+            f'    category: {item["category"]}\n',
+            f'    model: {quote(item.get("model", ""))}\n',
+            f'    name: {quote(item["name"])}\n',
+            f'    price: {item["price"]}\n',
+            f'    price_rrc: {item["price_rrc"]}\n',
+            f'    quantity: {item["quantity"]}\n',
+        ]
+        parameters = item.get('parameters')
+        if parameters:
+            lines.append('    parameters:\n')
+            lines.extend(f'      {quote(name)}: {quote(value)}\n' for name, value in parameters.items())
+        else:
+            lines.append('    parameters: {}\n')
+        yield ''.join(lines)
+
+
+def generate_goods(count, categories=SYNTHETIC_CATEGORIES, seed=0):
+    """Генератор синтетических товаров в схеме прайса"""
+    rnd = random.Random(seed)
+    category_ids = [category_id for category_id, _ in categories]
+    for external_id in range(1, count + 1):
+        price = rnd.randint(100, 200000)
+        color = rnd.choice(SYNTHETIC_COLORS)
+        memory = rnd.choice((16, 32, 64, 128, 256, 512))
+        yield {
+            'id': external_id,
+            'category': rnd.choice(category_ids),
+            'model': f'brand{external_id % 97}/model{external_id % 1013}',
+            'name': f'Товар {external_id} {memory}GB ({color})',
+            'price': price,
+            'price_rrc': price + rnd.randint(0, price // 10 + 1),
+            'quantity': rnd.randint(0, 50),
+            'parameters': {
+                'Диагональ (дюйм)': rnd.choice((5.5, 6.1, 6.5, 55, 65)),
+                'Встроенная память (Гб)': memory,
+                'Цвет': color,
+            },
+        }
+
+
+def write_price_list(path, count, shop='Синтетический магазин', seed=0):
+    """Записывает синтетический прайс на count товаров в файл path"""
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(iter_price_list(shop, SYNTHETIC_CATEGORIES, generate_goods(count, seed=seed)))
+    return path
@@ -0,0 +1,67 @@
+"""
+Очистка брошенных корзин и устаревших токенов подтверждения email.
+
+Таблица проходится окнами по первичному ключу размером batch_size, каждое окно
+удаляется в отдельной короткой транзакции, поэтому блокировки держатся недолго
+при любом объеме данных. Количество удаленных строк учитывается в метриках.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Max
+from django.utils import timezone
+
+from api.metrics import registry
+from api.models import Order, OrderItem, ConfirmEmailToken
+
+
+BATCH_SIZE = 1000
+
+
+def pk_windows(queryset, batch_size):
+    """Границы окон [start, stop) по первичному ключу строк queryset"""
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        yield start, start + batch_size
+
+
+def count(table, deleted):
+    registry.inc('reaper_deleted_rows_total', (('table', table),), deleted)
+
+
+def reap_carts(days=None, batch_size=BATCH_SIZE):
+    """
+    Удаляет корзины, которые не менялись больше days дней (CART_RETENTION_DAYS).
+    Возвращает {'orders': ..., 'items': ...}.
+    """
+    days = getattr(settings, 'CART_RETENTION_DAYS', 30) if days is None else days
+    carts = Order.objects.filter(status='cart', updated__lt=timezone.now() - timedelta(days=days))
+    result = {'orders': 0, 'items': 0}
+    for start, stop in pk_windows(carts, batch_size):
+        with transaction.atomic():
+            ids = list(carts.select_for_update().filter(pk__gte=start, pk__lt=stop).values_list('pk', flat=True))
+            if not ids:
+                continue
+            items = OrderItem.objects.filter(order_id__in=ids).delete()[0]
+            orders = Order.objects.filter(pk__in=ids).delete()[0]
+        result['items'] += items
+        result['orders'] += orders
+        count('api_orderitem', items)
+        count('api_order', orders)
+    return result
+
+
+def reap_confirm_tokens(ttl=None, batch_size=BATCH_SIZE):
+    """Удаляет токены подтверждения email старше ttl секунд (CONFIRM_EMAIL_TOKEN_TTL)"""
+    ttl = getattr(settings, 'CONFIRM_EMAIL_TOKEN_TTL', 2 * 24 * 60 * 60) if ttl is None else ttl
+    tokens = ConfirmEmailToken.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl))
+    deleted = 0
+    for start, stop in pk_windows(tokens, batch_size):
+        with transaction.atomic():
+            batch = tokens.filter(pk__gte=start, pk__lt=stop).delete()[0]
+        deleted += batch
+        count('api_confirmemailtoken', batch)
+    return {'tokens': deleted}
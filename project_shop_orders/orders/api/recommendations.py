@@ -0,0 +1,166 @@
+"""
+Рекомендации "покупают вместе".
+
+Позиции заказов загружаются в массивы NumPy, товар находится по ключу
+(shop, category, external_id), после чего пары товаров одного заказа и их
+количество считаются векторно: цикл идет только по сдвигу внутри заказа
+(не больше RECOMMENDATIONS_MAX_BASKET итераций), а не по строкам.
+Количество пар хранится в CoPurchase, лучшие top-K соседей товара - в RelatedProduct,
+откуда products/<id>/related читает их одним запросом по индексу.
+
+Учтенные заказы отмечаются флагом Shipment.counted в той же транзакции, что и
+запись количеств, а запуски выполняются по очереди под блокировкой строки
+RecommendationState. Поэтому заказ учитывается ровно один раз во всех процессах,
+а заказы, зафиксированные позже начала запуска (в том числе с меньшим id),
+остаются неотмеченными и попадут в следующий запуск.
+
+Полный пересчет отмечает все отправления и читает позиции отмеченных и архивных
+заказов. Инкрементальный - только неотмеченные заказы: прибавляет их пары
+к CoPurchase и пересобирает соседей затронутых товаров.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import (Product, OrderItem, ArchivedOrderItem, Shipment, CoPurchase, RelatedProduct,
+                        RecommendationState)
+
+
+LINE_FIELDS = ('order_id', 'shop_id', 'category_id', 'external_id')
+
+CHUNK_SIZE = 10000
+
+BATCH_SIZE = 5000
+
+
+def empty():
+    return np.empty(0, dtype=np.int64)
+
+
+def load_rows(queryset, fields):
+    """Строки queryset массивом int64 формы (n, len(fields)), без строк с пустыми полями"""
+    queryset = queryset.filter(**{f'{field}__isnull': False for field in fields})
+    rows = np.fromiter(queryset.values_list(*fields).order_by().iterator(CHUNK_SIZE),
+                       dtype=np.dtype((np.int64, len(fields))))
+    return rows.reshape(-1, len(fields))
+
+
+def order_products(lines, products):
+    """
+    Заказы и товары позиций: lines - (order, shop, category, external_id),
+    products - (shop, category, external_id, id). Позиции удаленных товаров отбрасываются.
+    """
+    keys = np.concatenate([products[:, :3], lines[:, 1:]])
+    _, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    ids = np.full(inverse.max() + 1 if len(inverse) else 0, -1, dtype=np.int64)
+    ids[inverse[:len(products)]] = products[:, 3]
+    found = ids[inverse[len(products):]]
+    return lines[found >= 0, 0], found[found >= 0]
+
+
+def co_purchases(orders, products, max_basket):
+    """Пары (товар, товар из того же заказа) и число заказов с ними; заказы больше max_basket не учитываются"""
+    basket = np.unique(np.stack([orders, products], axis=1), axis=0)
+    starts = np.flatnonzero(np.r_[True, basket[1:, 0] != basket[:-1, 0]]) if len(basket) else empty()
+    sizes = np.diff(np.r_[starts, len(basket)])
+    basket = basket[np.repeat(sizes <= max_basket, sizes)]
+    orders, products = basket[:, 0], basket[:, 1]
+    left, right = [], []
+    for offset in range(1, max_basket):
+        same = orders[offset:] == orders[:-offset]
+        if not same.any():
+            break
+        left.append(products[:-offset][same])
+        right.append(products[offset:][same])
+    if not left:
+        return empty(), empty(), empty()
+    pairs, counts = np.unique(np.stack([np.concatenate(left + right), np.concatenate(right + left)], axis=1),
+                              axis=0, return_counts=True)
+    return pairs[:, 0], pairs[:, 1], counts
+
+
+def top_related(product, related, counts, top_k):
+    """Первые top_k соседей каждого товара по убыванию количества; возвращает также места"""
+    order = np.lexsort((related, -counts, product))
+    product, related, counts = product[order], related[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, product[1:] != product[:-1]]) if len(product) else empty()
+    rank = np.arange(len(product)) - np.repeat(starts, np.diff(np.r_[starts, len(product)]))
+    keep = rank < top_k
+    return product[keep], related[keep], counts[keep], rank[keep]
+
+
+def merge_counts(product, related, counts):
+    """Складывает количество одинаковых пар"""
+    pairs, inverse = np.unique(np.stack([product, related], axis=1), axis=0, return_inverse=True)
+    return pairs[:, 0], pairs[:, 1], np.bincount(inverse.reshape(-1), weights=counts).astype(np.int64)
+
+
+def save_related(product, related, counts, rank):
+    RelatedProduct.objects.filter(product_id__in=np.unique(product).tolist()).delete()
+    RelatedProduct.objects.bulk_create([
+        RelatedProduct(product_id=row[0], related_id=row[1], count=row[2], rank=row[3])
+        for row in zip(product.tolist(), related.tolist(), counts.tolist(), rank.tolist())], batch_size=BATCH_SIZE)
+
+
+def claim_orders():
+    """Отмечает неучтенные заказы, возвращает их позиции"""
+    orders = np.fromiter(Shipment.objects.filter(counted=False).values_list('order_id', flat=True)
+                         .distinct().order_by().iterator(CHUNK_SIZE), dtype=np.int64)
+    lines = [empty().reshape(0, len(LINE_FIELDS))]
+    for start in range(0, len(orders), BATCH_SIZE):
+        batch = orders[start:start + BATCH_SIZE].tolist()
+        Shipment.objects.filter(order_id__in=batch, counted=False).update(counted=True)
+        lines.append(load_rows(OrderItem.objects.filter(order_id__in=batch), LINE_FIELDS))
+    return np.concatenate(lines)
+
+
+def claim_all_orders():
+    """Отмечает все заказы, возвращает позиции отмеченных и архивных заказов"""
+    Shipment.objects.filter(counted=False).update(counted=True)
+    # заказы, зафиксированные после UPDATE, остались неотмеченными и сюда не попадут
+    orders = Shipment.objects.filter(counted=True).values('order_id')
+    return np.concatenate([load_rows(OrderItem.objects.filter(order_id__in=orders), LINE_FIELDS),
+                           load_rows(ArchivedOrderItem.objects.all(), LINE_FIELDS)])
+
+
+def refresh_recommendations(full=False, top_k=None, max_basket=None):
+    """
+    Пересчитывает совместные покупки и рекомендации.
+    Без full обрабатывает только заказы, не учтенные прошлыми запусками;
+    если полного пересчета еще не было, выполняется полный пересчет.
+    Возвращает {'lines': ..., 'pairs': ..., 'products': ...}.
+    """
+    top_k = getattr(settings, 'RECOMMENDATIONS_TOP_K', 10) if top_k is None else top_k
+    max_basket = getattr(settings, 'RECOMMENDATIONS_MAX_BASKET', 50) if max_basket is None else max_basket
+    RecommendationState.objects.get_or_create(pk=1)
+
+    with transaction.atomic():
+        state = RecommendationState.objects.select_for_update().get(pk=1)
+        full = full or state.rebuilt is None
+        lines = claim_all_orders() if full else claim_orders()
+        products = load_rows(Product.objects.all(), ('shop_id', 'category_id', 'external_id', 'id'))
+        product, related, counts = co_purchases(*order_products(lines, products), max_basket)
+
+        if full:
+            CoPurchase.objects.all().delete()
+            RelatedProduct.objects.all().delete()
+        elif len(product):
+            known = load_rows(CoPurchase.objects.filter(product_id__in=np.unique(product).tolist()),
+                              ('product_id', 'related_id', 'count'))
+            product, related, counts = merge_counts(np.concatenate([known[:, 0], product]),
+                                                    np.concatenate([known[:, 1], related]),
+                                                    np.concatenate([known[:, 2], counts]))
+        upsert = {} if full else {
+            'update_conflicts': True, 'unique_fields': ['product', 'related'], 'update_fields': ['count']}
+        CoPurchase.objects.bulk_create([
+            CoPurchase(product_id=row[0], related_id=row[1], count=row[2])
+            for row in zip(product.tolist(), related.tolist(), counts.tolist())], batch_size=BATCH_SIZE, **upsert)
+        save_related(*top_related(product, related, counts, top_k))
+
+        state.refreshed = timezone.now()
+        if full:
+            state.rebuilt = state.refreshed
+        state.save()
+    return {'lines': len(lines), 'pairs': len(product), 'products': len(np.unique(product))}
@@ -53,6 +53,16 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class BestOfferSerializer(serializers.ModelSerializer):
+    shop = serializers.StringRelatedField()
+    shop_id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='product.name')
+
+    class Meta:
+        model = BestOffer
+        fields = ('product', 'name', 'shop', 'shop_id', 'model', 'price', 'quantity')
+
+
 class OrderItemAddSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -90,4 +100,46 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = "__all__"
         read_only_fields = ('id',)
+
+
+class ShipmentSerializer(serializers.ModelSerializer):
+    """
+    Отправление магазина с контактом покупателя и позициями магазина.
+    id - идентификатор заказа, его же принимает partner/orders/status; shipment_id - отправления.
+    Позиции передаются в контексте: {'items': {order_id: [OrderItem, ...]}}.
+    """
+    id = serializers.IntegerField(source='order_id', read_only=True)
+    shipment_id = serializers.IntegerField(source='id', read_only=True)
+    contact = ContactSerializer(source='order.contact', read_only=True)
+    ordered_items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Shipment
+        fields = ('id', 'shipment_id', 'status', 'total_sum', 'total_quantity', 'contact', 'ordered_items', 'created',
+                  'updated', 'version')
+
+    def get_ordered_items(self, obj):
+        return OrderItemSerializer(self.context['items'].get(obj.order_id, []), many=True).data
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    shop = serializers.StringRelatedField()
+    category = serializers.StringRelatedField()
+
+    class Meta:
+        model = ArchivedOrderItem
+        exclude = ('order',)
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """Архивный заказ в том же виде, что и OrderSerializer"""
+    ordered_items = ArchivedOrderItemSerializer(read_only=True, many=True)
+
+    total_sum = serializers.IntegerField()
+    total_quantity = serializers.IntegerField()
+    contact = ContactSerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = "__all__"
         
\ No newline at end of file
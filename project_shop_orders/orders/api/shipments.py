@@ -0,0 +1,49 @@
+"""
+Отправления - части заказа по магазинам.
+
+При оформлении заказа для каждого магазина из корзины создается Shipment с итогами
+по его позициям. Магазины меняют статус своих отправлений; статус общего заказа
+пересчитывается по ним отдельной задачей после фиксации транзакции, поэтому
+строка заказа покупателя не блокируется при работе магазинов.
+"""
+from collections import defaultdict
+
+from django.db.models import Sum, F
+from django.utils import timezone
+
+from api.models import Order, OrderItem, Shipment, STATE_CHOICES
+
+
+# порядок статусов: общий заказ находится в статусе самого отстающего отправления
+STATE_ORDER = [state for state, _ in STATE_CHOICES]
+
+
+def create_shipments(order_ids):
+    """Создает отправления заказов по позициям; уже созданные не меняются"""
+    rows = OrderItem.objects.filter(order_id__in=order_ids, shop__isnull=False).values(
+        'order_id', 'shop_id').annotate(total_sum=Sum('total_amount'), total_quantity=Sum('quantity')).order_by()
+    return Shipment.objects.bulk_create([Shipment(**row) for row in rows], ignore_conflicts=True)
+
+
+def rollup_status(statuses):
+    """Статус заказа по статусам отправлений"""
+    active = [state for state in statuses if state != 'canceled']
+    if not active:
+        return 'canceled'
+    return min(active, key=STATE_ORDER.index)
+
+
+def sync_order_statuses(order_ids):
+    """
+    Пересчитывает статусы заказов по отправлениям, по одному UPDATE на статус.
+    Возвращает число измененных заказов.
+    """
+    statuses = defaultdict(list)
+    for order_id, state in Shipment.objects.filter(order_id__in=order_ids).values_list('order_id', 'status'):
+        statuses[order_id].append(state)
+    targets = defaultdict(list)
+    for order_id, states in statuses.items():
+        targets[rollup_status(states)].append(order_id)
+    now = timezone.now()
+    return sum(Order.objects.filter(id__in=ids).exclude(status=state).update(
+        status=state, updated=now, version=F('version') + 1) for state, ids in targets.items())
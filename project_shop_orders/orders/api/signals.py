@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens
+from api.catalog import invalidate_catalog
+from api.models import User, Shop, Category, Product, Parameter, ProductParameter, users_updated
+from api.offers import refresh_shop_offers, refresh_product_offer
+
+# Сигнал отправляется стадией refresh импорта прайса после записи товаров магазина.
+# Аргументы: shop (Shop) - обновленный магазин, changed (int) - число измененных товаров,
+# modified (datetime) - время импорта.
+catalog_updated = Signal()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Выход и ротация токена: снимок пользователя больше не действителен"""
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """Смена пароля, is_active и других полей пользователя сбрасывает его снимки в кэше"""
+    if not created:
+        invalidate_tokens(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(users_updated, sender=User)
+def users_bulk_updated(sender, user_ids, **kwargs):
+    """Массовое изменение пользователей (QuerySet.update) тоже сбрасывает их снимки в кэше"""
+    invalidate_tokens(*Token.objects.filter(user_id__in=user_ids).values_list('key', flat=True))
+
+
+# Импорт пишет товары массово и сообщает об изменениях одним сигналом catalog_updated;
+# пока значение True, построчные сигналы товаров не сбрасывают каталог
+_bulk_write = ContextVar('catalog_bulk_write', default=False)
+
+
+@contextmanager
+def catalog_bulk_write():
+    """Блок массовой записи каталога: построчные сбросы каталога пропускаются"""
+    token = _bulk_write.set(True)
+    try:
+        yield
+    finally:
+        _bulk_write.reset(token)
+
+
+@receiver(catalog_updated)
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Parameter)
+@receiver(post_delete, sender=Parameter)
+@receiver(post_save, sender=ProductParameter)
+@receiver(post_delete, sender=ProductParameter)
+@receiver(m2m_changed, sender=Category.shops.through)
+def catalog_changed(sender, modified=None, **kwargs):
+    """
+    Изменение каталога (в том числе правка и удаление товаров и характеристик в админке)
+    сбрасывает пространство имен catalog после фиксации транзакции. Внутри
+    catalog_bulk_write построчные сигналы пропускаются: импорт отправит catalog_updated.
+    """
+    if _bulk_write.get() and sender in (Product, Parameter, ProductParameter):
+        return
+    transaction.on_commit(lambda: invalidate_catalog(modified))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """Правка товара поштучно (админка) обновляет его предложение; импорт обновляет индекс сам"""
+    refresh_product_offer(instance)
+
+
+@receiver(post_save, sender=Shop)
+def shop_saved(sender, instance, created, **kwargs):
+    """Статус магазина влияет на все его предложения"""
+    if not created:
+        refresh_shop_offers(instance.id)
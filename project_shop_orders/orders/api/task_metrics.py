@@ -0,0 +1,76 @@
+"""
+Метрики задач Celery на сигналах: ожидание в очереди, время выполнения, повторы,
+ошибки и размер аргументов. Задачи импорта дополнительно отдают скорость
+обработки строк по стадиям. Метрики попадают в тот же реестр, что и метрики
+веб-запросов, и отдаются эндпоинтом /metrics.
+"""
+import time
+
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_retry, task_failure
+from ujson import dumps as dump_json
+
+from api.metrics import registry
+
+
+PAYLOAD_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+ROWS_PER_SECOND_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+_started = {}
+
+
+def task_labels(task):
+    return (('task', getattr(task, 'name', None) or str(task)),)
+
+
+@before_task_publish.connect
+def on_publish(sender=None, headers=None, **kwargs):
+    # Время постановки в очередь передается воркеру в заголовке сообщения
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+    registry.inc('celery_tasks_published_total', (('task', sender),))
+
+
+@task_prerun.connect
+def on_prerun(task_id=None, task=None, args=None, kwargs=None, **extra):
+    labels = task_labels(task)
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    if enqueued_at:
+        registry.observe('celery_task_queue_latency_seconds', labels, max(0.0, time.time() - enqueued_at))
+    try:
+        size = len(dump_json([args or (), kwargs or {}]))
+    except (TypeError, OverflowError):
+        size = 0
+    registry.observe('celery_task_payload_bytes', labels, size, buckets=PAYLOAD_BUCKETS)
+    _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def on_postrun(task_id=None, task=None, state=None, **kwargs):
+    labels = task_labels(task)
+    started = _started.pop(task_id, None)
+    if started is not None:
+        registry.observe('celery_task_run_duration_seconds', labels, time.perf_counter() - started)
+    registry.inc('celery_task_runs_total', labels + (('state', state or 'UNKNOWN'),))
+    registry.maybe_flush()
+
+
+@task_retry.connect
+def on_retry(sender=None, **kwargs):
+    registry.inc('celery_task_retries_total', task_labels(sender))
+
+
+@task_failure.connect
+def on_failure(sender=None, exception=None, **kwargs):
+    registry.inc('celery_task_failures_total', task_labels(sender) + (('exception', type(exception).__name__),))
+
+
+def record_import_stats(stats):
+    """Учитывает замеры стадий импорта прайса (PriceListImport.stats)"""
+    for stage, values in stats.items():
+        labels = (('stage', stage),)
+        registry.inc('import_stage_seconds_total', labels, values['seconds'])
+        registry.inc('import_stage_rows_total', labels, values['rows'])
+        if values['seconds'] > 0:
+            registry.observe('import_stage_rows_per_second', labels, values['rows'] / values['seconds'],
+                             buckets=ROWS_PER_SECOND_BUCKETS)
@@ -1,13 +1,18 @@
-import requests
-from yaml import load as load_yaml, Loader
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 
 
-from api.models import Shop, Category, Product, Parameter, ProductParameter
+from api.fetcher import FetchError
+from api.importer import PriceListImport, PriceListError
+from api.models import Order, STATE_CHOICES
+from api.reaper import reap_carts, reap_confirm_tokens, BATCH_SIZE
+from api.archive import archive_orders
+from api.recommendations import refresh_recommendations
+from api.shipments import sync_order_statuses
+from api.task_metrics import record_import_stats
 from orders.celery import celery_app
 
 
@@ -24,6 +29,31 @@ def send_email(title, message, email, *args, **kwargs):
         raise e
 
 
+@celery_app.task()
+def send_status_notifications(changes):
+    """
+    Письма покупателям об изменении статуса заказов.
+    Аргументы:
+        changes: список пар (order_id, status).
+    Адреса загружаются одним запросом, письма отправляются через одно соединение.
+    """
+    states = dict(STATE_CHOICES)
+    emails = dict(Order.objects.filter(id__in=[order_id for order_id, _ in changes]).values_list('id', 'user__email'))
+    messages = [
+        EmailMultiAlternatives(subject='Статус заказа изменен',
+                               body=f'Твой заказ номер {order_id} имеет статус "{states[state].upper()}"',
+                               from_email=settings.EMAIL_HOST_USER, to=[emails[order_id]])
+        for order_id, state in changes if emails.get(order_id)
+    ]
+    return get_connection().send_messages(messages)
+
+
+@celery_app.task()
+def sync_shipment_orders(order_ids):
+    """Пересчитывает статусы заказов по статусам их отправлений"""
+    return sync_order_statuses(order_ids)
+
+
 @celery_app.task()
 def get_import(partner, url):
     if url:
@@ -32,40 +62,37 @@ def get_import(partner, url):
             validate_url(url)
         except ValidationError as e:
             return {'Status': False, 'Error': str(e)}
-        else:
-            stream = requests.get(url).content
 
-        data = load_yaml(stream, Loader=Loader)
+        price_list = PriceListImport(partner, url=url)
         try:
-            shop, _ = Shop.objects.get_or_create(name=data['shop'],
-                                            user_id=partner)
+            price_list.run()
+        except PriceListError as e:
+            return {'Status': False, 'Error': str(e), 'Errors': e.errors}
+        except FetchError as e:
+            return {'Status': False, 'Error': str(e)}
         except IntegrityError as e:
             return {'Status': False, 'Error': str(e)}
+        finally:
+            record_import_stats(price_list.stats)
+        return {'Status': True, 'Stats': price_list.stats}
+    return {'Status': False, 'Errors': 'Url is false'}
+
+
+@celery_app.task()
+def reap_abandoned_carts(days=None, batch_size=BATCH_SIZE):
+    return reap_carts(days, batch_size)
+
+
+@celery_app.task()
+def reap_stale_confirm_tokens(ttl=None, batch_size=BATCH_SIZE):
+    return reap_confirm_tokens(ttl, batch_size)
+
 
-        for category in data['categories']:
-            category_object, _ = Category.objects.get_or_create(
-                id=category['id'], name=category['name'])
-            category_object.shops.add(shop.id)
-            category_object.save()
-
-        # ProductInfo.objects.filter(shop_id=shop.id).delete()
-        # for item in data['goods']:
-        #     product, _ = Product.objects.get_or_create(
-        #         name=item['name'], category_id=item['category']
-        #     )
-        #     product_info = ProductInfo.objects.create(
-        #         product_id=product.id, external_id=item['id'],
-        #         model=item['model'], price=item['price'],
-        #         price_rrc=item['price_rrc'], quantity=item['quantity'],
-        #         shop_id=shop.id
-        #     )
-        #     for name, value in item['parameters'].items():
-        #         parameter_object, _ = Parameter.objects.get_or_create(
-        #             name=name
-        #         )
-        #         ProductParameter.objects.create(
-        #             product_info_id=product_info.id,
-        #             parameter_id=parameter_object.id, value=value
-        #         )
-        return {'Status': True}
-    return {'Status': False, 'Errors': 'Url is false'}
\ No newline at end of file
+@celery_app.task()
+def archive_old_orders(days=None, batch_size=BATCH_SIZE):
+    return archive_orders(days, batch_size)
+
+
+@celery_app.task()
+def refresh_related_products(full=False):
+    return refresh_recommendations(full)
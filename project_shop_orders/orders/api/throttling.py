@@ -0,0 +1,129 @@
+"""
+Ограничение частоты запросов скользящим окном со счетчиками в общем хранилище.
+
+Стандартные троттлы DRF хранят в кэше список отметок времени и перезаписывают его
+целиком при каждой проверке, а без общего кэша каждый воркер считает свой лимит.
+Здесь на каждое окно хранится один счетчик, который увеличивается атомарно
+(INCR в Redis), а число запросов за последние duration секунд оценивается по
+текущему и предыдущему окну. Проверка стоит O(1) и одинакова для всех воркеров.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import SimpleRateThrottle, AnonRateThrottle, UserRateThrottle, ScopedRateThrottle
+
+
+class CacheWindowStore:
+    """Счетчики в кэше Django (алиас THROTTLE_CACHE); incr атомарен в Redis и Memcached"""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # ключ истек между add и incr
+            self.cache.add(key, 0, timeout)
+            return self.cache.incr(key)
+
+    def decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+
+class MemoryWindowStore:
+    """Счетчики в памяти процесса, для тестов"""
+
+    def __init__(self):
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, timeout):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+    def decr(self, key):
+        with self._lock:
+            if self.counters.get(key):
+                self.counters[key] -= 1
+
+    def get(self, key):
+        return self.counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+
+
+_stores = {}
+
+
+def get_store():
+    path = getattr(settings, 'THROTTLE_STORE', 'api.throttling.CacheWindowStore')
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = import_string(path)()
+    return store
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Скользящее окно по двум счетчикам фиксированных окон:
+    оценка = предыдущее * (1 - доля прошедшего текущего окна) + текущее.
+    Запрос сначала резервируется атомарным увеличением счетчика и отменяется,
+    если лимит превышен, поэтому параллельные воркеры не могут пропустить
+    больше запросов, чем разрешено.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, self.elapsed = divmod(self.now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        store = get_store()
+        current = store.incr(current_key, self.duration * 2)
+        previous = store.get(f'{self.key}:{int(window) - 1}')
+        self.weight = 1 - self.elapsed / self.duration
+        if previous * self.weight + current > self.num_requests:
+            store.decr(current_key)
+            self.current, self.previous = current, previous
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        remaining = self.duration - self.elapsed
+        if self.current > self.num_requests or not self.previous:
+            return remaining
+        # время, за которое вклад предыдущего окна уменьшится настолько, чтобы запрос поместился
+        return min(remaining, self.duration * (self.weight - (self.num_requests - self.current) / self.previous))
+
+
+class SlidingWindowAnonRateThrottle(AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class SlidingWindowUserRateThrottle(UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class SlidingWindowScopedRateThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    pass
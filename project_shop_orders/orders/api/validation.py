@@ -0,0 +1,152 @@
+"""
+Проверка товаров прайс-листа по столбцам.
+
+Поля товаров раскладываются в массивы NumPy, и каждая проверка выполняется
+сразу над всем столбцом: наличие и тип полей, неотрицательность и предел
+PositiveIntegerField, price <= price_rrc, повторы (category, external_id)
+и неизвестные категории. Результат - отчет по строкам [{'row', 'field', 'error'}]
+и столбцы нормализованных значений; до записи в базу ничего не доходит.
+"""
+import numpy as np
+
+
+INT_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+
+# Текстовые поля и их максимальная длина (как у полей Product)
+TEXT_FIELDS = {'name': 80, 'model': 80}
+
+REQUIRED_FIELDS = ('id', 'category', 'name', 'price', 'price_rrc', 'quantity')
+
+# Верхняя граница PositiveIntegerField
+MAX_INT = 2147483647
+
+
+class Report:
+    """Ошибки проверки: маски строк с полем и текстом ошибки"""
+
+    def __init__(self, size):
+        self.size = size
+        self.checks = []
+
+    def add(self, mask, field, error):
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            self.checks.append((rows, field, error))
+
+    def __len__(self):
+        return sum(len(rows) for rows, _, _ in self.checks)
+
+    def errors(self, limit=None):
+        """Ошибки по возрастанию номера строки, не больше limit"""
+        if not self.checks:
+            return []
+        rows = np.concatenate([check[0] for check in self.checks])
+        checks = np.concatenate([np.full(len(check[0]), index) for index, check in enumerate(self.checks)])
+        order = np.lexsort((checks, rows))[:limit]
+        return [{'row': row, 'field': self.checks[check][1], 'error': self.checks[check][2]}
+                for row, check in zip(rows[order].tolist(), checks[order].tolist())]
+
+
+def object_column(rows, field):
+    """Значения поля товаров массивом объектов (None - поле не указано)"""
+    column = np.empty(len(rows), dtype=object)
+    column[:] = [item.get(field) for item in rows]
+    return column
+
+
+def int_column(column, present, report, field):
+    """
+    Столбец целых чисел. В отчет попадают заданные, но нецелые, отрицательные
+    и слишком большие значения. Возвращает (числа, маска корректных значений).
+    Значения типа int (обычный случай для YAML) приводятся к int64 напрямую,
+    остальные проверяются как строки.
+    """
+    numbers = np.zeros(len(column), dtype=np.int64)
+    exact = np.frompyfunc(type, 1, 1)(column) == int
+    try:
+        numbers[exact] = column[exact].astype(np.int64)
+    except OverflowError:
+        exact[:] = False
+    other = np.flatnonzero(~exact)
+    text = np.array([str(value) for value in column[other]], dtype=str)
+    digits = np.strings.isdigit(text)
+    long = np.zeros(len(column), dtype=bool)
+    long[other] = digits & (np.strings.str_len(text) > 10)
+    digits &= ~long[other]
+    numbers[other[digits]] = text[digits].astype(np.int64)
+    negative = exact & (numbers < 0)
+    negative[other] = np.strings.startswith(text, '-') & np.strings.isdigit(np.strings.lstrip(text, '-'))
+    wrong = np.zeros(len(column), dtype=bool)
+    wrong[other] = ~digits & ~long[other]
+    too_big = (numbers > MAX_INT) | long
+    report.add(present & negative, field, 'Отрицательное значение')
+    report.add(present & wrong & ~negative, field, 'Ожидается целое число')
+    report.add(too_big, field, f'Значение больше {MAX_INT}')
+    return numbers, ~wrong & ~negative & ~too_big
+
+
+def text_column(column, report, field, max_length):
+    """Столбец строк: пустые значения - пустые строки, слишком длинные - в отчет"""
+    text = ['' if value is None else str(value) for value in column]
+    lengths = np.fromiter(map(len, text), dtype=np.int64, count=len(text))
+    report.add(lengths > max_length, field, f'Длиннее {max_length} символов')
+    return text
+
+
+def validate_goods(goods, category_ids):
+    """
+    Проверяет товары прайса. Возвращает (столбцы, отчет); столбцы:
+    external_id, category_id, price, price_rrc, quantity - массивы int64,
+    name, model - списки строк, parameters - список словарей.
+    """
+    size = len(goods)
+    report = Report(size)
+    rows = [item if isinstance(item, dict) else {} for item in goods]
+    report.add(np.fromiter((not isinstance(item, dict) for item in goods), dtype=bool, count=size),
+               None, 'Ожидается описание товара')
+
+    raw = {field: object_column(rows, field) for field in INT_FIELDS + tuple(TEXT_FIELDS)}
+    present = {field: column != None for field, column in raw.items()}  # noqa: E711 - поэлементно
+    for field in REQUIRED_FIELDS:
+        report.add(~present[field], field, 'Не указано поле')
+
+    numbers, valid = {}, {}
+    for field in INT_FIELDS:
+        numbers[field], valid[field] = int_column(raw[field], present[field], report, field)
+    texts = {field: text_column(raw[field], report, field, max_length)
+             for field, max_length in TEXT_FIELDS.items()}
+    report.add(present['name'] & np.fromiter((not name.strip() for name in texts['name']), dtype=bool, count=size),
+               'name', 'Пустое значение')
+
+    prices = valid['price'] & valid['price_rrc']
+    report.add(prices & (numbers['price'] > numbers['price_rrc']), 'price',
+               'Цена больше рекомендуемой розничной')
+
+    categories = valid['category']
+    report.add(categories & ~np.isin(numbers['category'], list(category_ids)), 'category', 'Неизвестная категория')
+
+    # ключ товара (category, external_id) одним числом: оба значения меньше 2**31
+    keyed = np.flatnonzero(categories & valid['id'])
+    keys = (numbers['category'][keyed] << 31) | numbers['id'][keyed]
+    _, first = np.unique(keys, return_index=True)
+    repeated = np.ones(len(keyed), dtype=bool)
+    repeated[first] = False
+    duplicate = np.zeros(size, dtype=bool)
+    duplicate[keyed[repeated]] = True
+    report.add(duplicate, 'id', 'Товар с таким id и категорией уже есть в прайсе')
+
+    parameters = [item.get('parameters') or {} for item in rows]
+    report.add(np.fromiter((not isinstance(values, dict) for values in parameters), dtype=bool, count=size),
+               'parameters', 'Ожидается словарь характеристик')
+
+    columns = {
+        'external_id': numbers['id'],
+        'category_id': numbers['category'],
+        'price': numbers['price'],
+        'price_rrc': numbers['price_rrc'],
+        'quantity': numbers['quantity'],
+        'name': texts['name'],
+        'model': texts['model'],
+        'parameters': parameters,
+    }
+    return columns, report
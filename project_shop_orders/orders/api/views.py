@@ -1,16 +1,24 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Q, Prefetch
 from django.core.mail import EmailMessage
-from requests import get
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import status, generics, viewsets
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.authtoken.models import Token
 from .models import *
 from .serializers import *
@@ -18,6 +26,19 @@ from yaml import load as load_yaml, Loader
 from ujson import loads as load_json
 from distutils.util import strtobool
 from api.tasks import send_email, get_import
+from api.order_status import parse_changes, change_statuses, TransitionError
+from api.concurrency import etag, expected_version, handle_conflicts
+from api.cart import get_cart_storage, CartError
+from api.fetcher import fetch, FetchError
+from api.catalog_engine import ProductFilter, DatabaseCatalog, get_catalog_engine
+from api.offers import best_offers, refresh_shop_offers
+from api.contacts import ContactError, parse_items, create_contacts, update_contacts, delete_contacts
+from api.idempotency import idempotent
+from api.metrics import exposition, allowed as metrics_allowed
+from api.cache import catalog_cache
+from api.catalog import invalidate_catalog, catalog_etag, catalog_last_modified
+from api.export import NDJSONRenderer, CSVRenderer, FORMATS, iter_products, products_for_export, \
+    iter_shop_price_list, export_response
 from drf_spectacular.utils import extend_schema
 
 # Create your views here.
@@ -46,6 +67,17 @@ def on_change_order_status(user_id, order_id):
     email.send()
 
 
+# Ответ 304 на If-None-Match/If-Modified-Since до выполнения запросов к базе
+catalog_condition = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+
+
+def metrics(request):
+    """Метрики сервиса в текстовом формате Prometheus"""
+    if not metrics_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class ApiListPagination(PageNumberPagination):
     """ Класс пагинации
     page_size определяет количество объектов, которые будут отображаться на одной странице.
@@ -61,6 +93,17 @@ class ApiListPagination(PageNumberPagination):
     max_page_size = 10000
 
 
+class UserCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по email: следующая страница читается условием email > последнего
+    на странице, без OFFSET, поэтому стоимость не растет с номером страницы.
+    """
+    ordering = 'email'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
 class RegisterUser(APIView):
     """Класс для регистрации покупателя"""
     """
@@ -144,6 +187,15 @@ class LoginUser(APIView):
         return Response({'status': False, 'error': 'Не указаны все поля'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class LogoutUser(APIView):
+    """Класс для выхода: удаляет токен пользователя"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        Token.objects.filter(key=request.auth.key).delete()
+        return Response({'status': True})
+
+
 class DetailUser(APIView):
     """Класс для просмотра и изменения данных пользователя"""
     """
@@ -199,11 +251,29 @@ class DetailUser(APIView):
 class UserViewSet(viewsets.ModelViewSet):
     """
     API-точка, позволяющая просматривать или редактировать пользователей.
+    Доступна только администраторам.
+
+    Фильтры списка: email - начало адреса, type - тип пользователя, company - компания.
     """
-    # Запрос всех объектов пользователя
-    queryset = User.objects.all()
+    # Контакты, группы и права читаются одним запросом на связь для всей страницы
+    queryset = User.objects.prefetch_related('contacts', 'groups', 'user_permissions')
     # Класс сериализатора для модели пользователя
     serializer_class = UserSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = UserCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        if params.get('email'):
+            queryset = queryset.filter(email__startswith=params['email'])
+        if params.get('type'):
+            queryset = queryset.filter(type=params['type'])
+        if params.get('company'):
+            queryset = queryset.filter(company=params['company'])
+        return queryset
 
 
 class ContactView(APIView):
@@ -251,27 +321,40 @@ class ContactView(APIView):
         """
         contact = Contact.objects.filter(user_id=request.user.id)
         serializer = ContactSerializer(contact, many=True)
+        return Response(serializer.data)
+
+    # добавить контакты
+    def post(self, request, *args, **kwargs):
+        """Метод добавления контактов
+        Принимает поля одного контакта или список items; список создается одним запросом.
+        """
+        items = request.data.get('items')
+        try:
+            contacts = create_contacts(request.user.id, parse_items(items) if items else [request.data])
+        except ContactError as error:
+            return Response(error.data, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': True, 'num_objects': len(contacts),
+                         'ids': [contact.id for contact in contacts]}, status=status.HTTP_201_CREATED)
 
     # редактировать контакт
     def put(self, request, *args, **kwargs):
         """Метод изменения контакта"""
         """
             Update the contact information of the authenticated user.
+            Принимает поля одного контакта с id или список items [{id, ...}];
+            меняются только контакты текущего пользователя, одним запросом.
             Args:
                 - request (Request): The Django request object
             Returns:
                 - Response: The response indicating the status of the operation and any errors.
         """
-        if {'id'}.issubset(request.data):
+        items = request.data.get('items')
+        if items or {'id'}.issubset(request.data):
             try:
-                contact = Contact.objects.get(pk=int(request.data['id']))
-            except ValueError:
-                return Response({'status': False, 'error': 'Не верный тип поля ID'}, status=status.HTTP_400_BAD_REQUEST)
-            serializer = ContactSerializer(contact, data=request.data, partial=True)
-            if serializer.is_valid():
-                serializer.save()
-                return Response({'status': True}, status=status.HTTP_200_OK)
-            return Response({'status': False, 'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+                count = update_contacts(request.user.id, parse_items(items) if items else [request.data])
+            except ContactError as error:
+                return Response(error.data, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'status': True, 'edit_objects': count}, status=status.HTTP_200_OK)
         return Response({'status': False, 'error': 'Не указаны необходимые поля'}, status=status.HTTP_400_BAD_REQUEST)
 
     # удалить контакт
@@ -285,23 +368,28 @@ class ContactView(APIView):
                 - Response: The response indicating the status of the operation and any errors.
         """
         if {'items'}.issubset(request.data):
-            for item in request.data["items"].split(','):
-                try:
-                    contact = Contact.objects.get(pk=int(item))
-                    contact.delete()
-                except ValueError:
-                    return Response({'status': False, 'error': 'Не верный тип поля'}, status=status.HTTP_400_BAD_REQUEST
-                                    )
-            return Response({'status': True}, status=status.HTTP_204_NO_CONTENT)
+            try:
+                contact_ids = [int(item) for item in str(request.data['items']).split(',')]
+            except ValueError:
+                return Response({'status': False, 'error': 'Не верный тип поля'}, status=status.HTTP_400_BAD_REQUEST)
+            count = delete_contacts(request.user.id, contact_ids)
+            return Response({'status': True, 'del_objects': count}, status=status.HTTP_200_OK)
         return Response({'status': False, 'error': 'Не указаны ID контактов'}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class ContactAPIList(generics.ListCreateAPIView):
     """
-       API представление для списка и создания контактов.
+       API представление для списка и создания контактов текущего пользователя.
     """
-    queryset = Contact.objects.all()
     serializer_class = ContactSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ApiListPagination
+
+    def get_queryset(self):
+        return Contact.objects.filter(user_id=self.request.user.id).order_by('id')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
 
 
 class PartnerUpdate(APIView):
@@ -342,6 +430,7 @@ class PartnerUpdate(APIView):
     permission_classes = [IsAuthenticated]
     throttle_scope = 'change_price'
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         if request.user.type != 'shop':
             return Response({'status': False, 'error': 'Только для магазинов'}, status=status.HTTP_403_FORBIDDEN)
@@ -354,8 +443,11 @@ class PartnerUpdate(APIView):
             except ValidationError as e:
                 return Response({'status': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             else:
-                stream = get(url).content
-                data = load_yaml(stream, Loader=Loader)
+                try:
+                    with fetch(url) as stream:
+                        data = load_yaml(stream, Loader=Loader)
+                except FetchError as error:
+                    return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
                 shop, _ = Shop.objects.get_or_create(user_id=request.user.id, defaults={
                     'name': data['shop'], 'url': url})
                 if shop.name != data['shop']:
@@ -366,6 +458,26 @@ class PartnerUpdate(APIView):
                         status=status.HTTP_400_BAD_REQUEST)
 
 
+class PartnerExport(APIView):
+    """
+        Выгрузка прайса магазина в том же YAML-формате, который принимает partner/update.
+        Документ формируется по частям из товаров и параметров магазина
+        и сжимается gzip, если клиент его принимает.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'export'
+
+    def get(self, request, *args, **kwargs):
+        if request.user.type != 'shop':
+            return Response({'status': False, 'error': 'Только для магазинов'}, status=status.HTTP_403_FORBIDDEN)
+
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if shop is None:
+            return Response({'status': False, 'error': 'Магазин не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+        return export_response(request, iter_shop_price_list(shop), 'application/x-yaml', 'price.yaml')
+
+
 class PartnerState(APIView):
     """
         A class for managing partner state.
@@ -402,6 +514,7 @@ class PartnerState(APIView):
         return Response(serializer.data)
 
     # изменить текущий статус
+    @idempotent
     def post(self, request, *args, **kwargs):
         """Функция изменения статуса магазина"""
         if request.user.type != 'shop':
@@ -409,7 +522,11 @@ class PartnerState(APIView):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                with transaction.atomic():
+                    Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                    for shop_id in Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True):
+                        refresh_shop_offers(shop_id)
+                invalidate_catalog()
                 return Response({'status': True})
             except ValueError as error:
                 return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
@@ -429,14 +546,10 @@ class PartnerOrders(APIView):
         связанных с авторизованным партнером.
         Затем он проверяет, является ли тип пользователя 'shop' (магазин). 
         Если нет, возвращает JSON-ответ с кодом состояния 403 и сообщением об ошибке.
-        Затем он выполняет запрос к модели Order, чтобы получить заказы, 
-        связанные с партнером. Он фильтрует заказы на основе поля 
-        ordered_items__product_info__shop__user_id, исключает заказы с 
-        состоянием 'basket' и выполняет предварительную связь с несколькими полями 
-        модели Order. Затем он выбирает связанные данные и вычисляет общую сумму 
-        для каждого заказа, используя функцию Sum. Затем он суммирует все суммы 
-        с помощью функции Sum. Наконец, он возвращает сериализованные данные
-        заказов в виде ответа.
+        Затем он читает отправления (Shipment) магазина - части заказов с его товарами,
+        созданные при оформлении, с уже посчитанными итогами и своим статусом.
+        Позиции магазина загружаются одним запросом по заказам отправлений.
+        Наконец, он возвращает сериализованные данные отправлений в виде ответа.
 
     """
     permission_classes = [IsAuthenticated]
@@ -445,22 +558,63 @@ class PartnerOrders(APIView):
         """Функция для получения заказов поставщиками"""
         if request.user.type != 'shop':
             return Response({'status': False, 'error': 'Только для магазинов'}, status=status.HTTP_403_FORBIDDEN)
-        prefetch = Prefetch('ordered_items', queryset=OrderItem.objects.filter(
-            shop__user_id=request.user.id))
-        order = Order.objects.filter(
-            ordered_items__shop__user_id=request.user.id).exclude(status='cart')\
-            .prefetch_related(prefetch).select_related('contact').annotate(
-                    total_sum=Sum('ordered_items__total_amount'),
-                    total_quantity=Sum('ordered_items__quantity'))
-        serializer = OrderSerializer(order, many=True)
+        shop_id = Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True).first()
+        # отправления магазина читаются по индексу (shop, created), итоги уже посчитаны при оформлении
+        shipments = list(Shipment.objects.filter(shop_id=shop_id).select_related('order__contact'))
+        items = {}
+        order_ids = [shipment.order_id for shipment in shipments]
+        for item in OrderItem.objects.filter(shop_id=shop_id, order_id__in=order_ids):
+            items.setdefault(item.order_id, []).append(item)
+        serializer = ShipmentSerializer(shipments, many=True, context={'items': items})
         return Response(serializer.data)
 
 
+class PartnerOrderStatus(APIView):
+    """
+        Массовая смена статусов заказов магазином.
+        Принимает orders - список {"id": ..., "status": ...} (или его JSON-строку).
+        Все переходы проверяются по ORDER_TRANSITIONS; если хотя бы один недопустим,
+        не меняется ни один заказ. Покупатели получают письма пачками через Celery.
+        Если у заказа указана version и она устарела, возвращается 409 с текущей версией.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    @handle_conflicts
+    def post(self, request, *args, **kwargs):
+        if request.user.type != 'shop':
+            return Response({'status': False, 'error': 'Только для магазинов'}, status=status.HTTP_403_FORBIDDEN)
+
+        orders = request.data.get('orders')
+        if isinstance(orders, str):
+            try:
+                orders = load_json(orders)
+            except ValueError:
+                return Response({'status': False, 'error': 'Неверный формат запроса'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if not orders or not isinstance(orders, list):
+            return Response({'status': False, 'error': 'Не указаны все необходимые поля'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            updated = change_statuses(request.user.id, *parse_changes(orders))
+        except TransitionError as error:
+            return Response({'status': False, 'error': str(error), 'errors': error.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': True, 'updated': updated})
+
+
 class ShopView(generics.ListAPIView):
     """ Класс просмотра списка магазинов"""
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
+    @method_decorator(catalog_condition)
+    def list(self, request, *args, **kwargs):
+        """ Список магазинов берется из кэша каталога"""
+        data = catalog_cache.get_or_set('shops', lambda: self.get_serializer(self.get_queryset(), many=True).data)
+        return Response(data)
+
 
 class CategoryView(generics.ListCreateAPIView):
     """ Класс просмотра списка категорий"""
@@ -468,11 +622,12 @@ class CategoryView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
 
     @extend_schema(request=CategorySerializer, responses={200: CategorySerializer})
+    @method_decorator(catalog_condition)
     def get(self, request):
-        """ Метод возвращает список категорий. """
-
-        category_list = super().get(request)
-        return category_list
+        """ Метод возвращает список категорий из кэша каталога. """
+        data = catalog_cache.get_or_set('categories',
+                                        lambda: self.get_serializer(self.get_queryset(), many=True).data)
+        return Response(data)
 
 
 class ProductView(APIView):
@@ -484,6 +639,7 @@ class ProductView(APIView):
     """
     pagination_class = ApiListPagination
 
+    @method_decorator(catalog_condition)
     def get(self, request, *args, **kwargs):
         """
             Обрабатывает GET-запросы для списка продуктов.
@@ -494,23 +650,34 @@ class ProductView(APIView):
             Returns:
                 Response: Сериализованные данные о продуктах.
 
+            Параметры: shop_id, category_id, price_min, price_max, in_stock,
+            ordering (price, -price, quantity, -quantity), page и page_size.
         """
-        # Строим запрос для фильтрации продуктов по магазину и категории
-        query = Q(shop__state=True)
-        shop_id = request.query_params.get('shop_id')
-        category_id = request.query_params.get('category_id')
-        if shop_id:
-            query = query & Q(shop_id=shop_id)
-        if category_id:
-            query = query & Q(category_id=category_id)
+        try:
+            query = ProductFilter(request.query_params)
+        except ValueError as error:
+            return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        # Постраничный вывод по запросу page/page_size: порядок и число товаров дает движок каталога,
+        # из базы читаются только товары страницы
+        if {'page', 'page_size'} & set(request.query_params):
+            paginator = self.pagination_class()
+            ids = [int(product_id) for product_id in paginator.paginate_queryset(
+                get_catalog_engine().product_ids(query), request, view=self)]
+            products = Product.objects.filter(id__in=ids).select_related('shop', 'category').prefetch_related(
+                'product_parameters__parameter').in_bulk()
+            serializer = ProductSerializer([products[product_id] for product_id in ids if product_id in products],
+                                           many=True)
+            return paginator.get_paginated_response(serializer.data)
         # Запрос в базу данных для продуктов с указанными фильтрами
-        queryset = Product.objects.filter(query).select_related('shop', 'category').\
-            prefetch_related('product_parameters').distinct()
+        queryset = DatabaseCatalog().queryset(query).select_related('shop', 'category').\
+            prefetch_related('product_parameters__parameter')
         # Сериализация данных о продуктах
         serializer = ProductSerializer(queryset, many=True)
         # Возврат сериализованных данных о продуктах в ответе
         return Response(serializer.data)
 
+@method_decorator(catalog_condition, name='list')
+@method_decorator(catalog_condition, name='retrieve')
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     """
         API-конечная точка, которая позволяет просматривать товары.
@@ -521,6 +688,57 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductSerializer
 
 
+class ProductOffers(APIView):
+    """
+        Лучшие предложения модели у всех магазинов: products/offers?model=apple/iphone/xr.
+        Предложения с остатком у магазинов, принимающих заказы, по возрастанию цены.
+    """
+
+    @method_decorator(catalog_condition)
+    def get(self, request, *args, **kwargs):
+        model = request.query_params.get('model')
+        if not model:
+            return Response({'status': False, 'error': 'Не указана модель'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = BestOfferSerializer(best_offers(model), many=True)
+        return Response(serializer.data)
+
+
+class ProductRelated(APIView):
+    """
+        Товары, которые покупают вместе с данным: products/<id>/related.
+        Список заранее рассчитан задачей refresh_related_products (api.recommendations)
+        и читается одним запросом по индексу (product, rank).
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        related = RelatedProduct.objects.filter(product_id=pk, related__shop__state=True).select_related(
+            'related__shop', 'related__category').prefetch_related('related__product_parameters__parameter')
+        serializer = ProductSerializer([row.related for row in related], many=True)
+        return Response(serializer.data)
+
+
+class ProductExport(APIView):
+    """
+        Потоковая выгрузка каталога: products/export?format=ndjson|csv.
+        Поддерживает фильтры shop_id и category_id, как и список товаров.
+        Если клиент принимает gzip, выгрузка сжимается на лету.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    throttle_scope = 'export'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            queryset = products_for_export(shop_id=request.query_params.get('shop_id'),
+                                           category_id=request.query_params.get('category_id'))
+        except ValueError as error:
+            return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        renderer = request.accepted_renderer
+        return export_response(request, FORMATS[renderer.format](iter_products(queryset)), renderer.media_type,
+                               f'products.{renderer.format}')
+
+
 class CartView(APIView):
     """Класс корзины покупателей
     Этот код представляет собой часть класса BasketView,
@@ -541,18 +759,18 @@ class CartView(APIView):
     # получить корзину
     def get(self, request, *args, **kwargs):
         """Функция для получения содержимого корзины"""
-        cart = Order.objects.filter(
-            user_id=request.user.id, status='cart'
-        ).prefetch_related('ordered_items').annotate(
-            total_sum=Sum('ordered_items__total_amount'),
-            total_quantity=Sum('ordered_items__quantity')
-        )
-        serializer = OrderSerializer(cart, many=True)
-        return Response(serializer.data)
-
+        data = get_cart_storage().get(request.user.id)
+        response = Response(data)
+        if data:
+            response['ETag'] = etag(data[0]['version'])
+        return response
+
+    @idempotent
+    @handle_conflicts
     def post(self, request, *args, **kwargs):
         '''
         Функция для добавление товаров в корзину
+        Если передан If-Match (или поле version), корзина меняется только при совпадении версии.
         '''
         items = request.data.get('items')
         if items:
@@ -561,40 +779,26 @@ class CartView(APIView):
             except ValueError:
                 Response({'Status': False, 'Errors': 'Неверный формат запроса'})
             else:
-                cart, _ = Order.objects.get_or_create(user_id=request.user.id, status='cart')
-                objects_created = 0
-                for order_item in items_dict:
-                    order_item.update({'order': cart.id})
-                    product = Product.objects.filter(external_id=order_item['external_id']).values('category', 'shop',
-                                                                                                   'name', 'price')
-                    order_item.update({'category': product[0]['category'], 'shop': product[0]['shop'],
-                                       'product_name': product[0]['name'], 'price': product[0]['price']})
-                    serializer = OrderItemAddSerializer(data=order_item)
-                    if serializer.is_valid():
-                        try:
-                            serializer.save()
-                        except IntegrityError as error:
-                            return Response({'status': False, 'errors': str(error)},
-                                            status=status.HTTP_400_BAD_REQUEST)
-                        else:
-                            objects_created += 1
-                    else:
-                        return Response({'status': False, 'error': serializer.errors},
-                                        status=status.HTTP_400_BAD_REQUEST)
-                return Response({'status': True, 'num_objects': objects_created})
+                try:
+                    objects_created, version = get_cart_storage().add(request.user.id, items_dict,
+                                                                      expected_version(request))
+                except CartError as error:
+                    return Response(error.data, status=status.HTTP_400_BAD_REQUEST)
+                return Response({'status': True, 'num_objects': objects_created, 'version': version},
+                                headers={'ETag': etag(version)})
 
         return Response({'status': False, 'error': 'Не указаны необходимые поля'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @idempotent
+    @handle_conflicts
     def put(self, request, *args, **kwargs):
         """Функция для изменения количества товара в корзине"""
         """
            Метод put обрабатывает PUT-запросы и используется для обновления количества товаров
-            в корзине.  Если данные корректны, он обновляет количество товаров в 
-            корзине, используя OrderItem.objects.filter(order_id=basket.id, 
-            id=order_item['id']).update(quantity=order_item['quantity']). 
-            В конце метод возвращает JSON-ответ с информацией о статусе и количестве обновленных 
-            объектов.
+            в корзине. Если данные корректны, он обновляет количество товаров в хранилище
+            корзин (get_cart_storage). В конце метод возвращает JSON-ответ с информацией
+            о статусе и количестве обновленных объектов.
         """
         items = request.data.get('items')
         if items:
@@ -603,33 +807,71 @@ class CartView(APIView):
             except ValueError:
                 Response({'Status': False, 'Errors': 'Неверный формат запроса'})
             else:
-                cart, _ = Order.objects.get_or_create(user_id=request.user.id, status='cart')
-                objects_updated = 0
-                for item in items_dictionary:
-                    if isinstance(item['id'], int) and isinstance(item['quantity'], int):
-                        objects_updated += OrderItem.objects.filter(order_id=cart.id, id=item['id']).update(
-                            quantity=item['quantity'])
-                return Response({'status': True, 'edit_objects': objects_updated})
+                objects_updated, version = get_cart_storage().update(request.user.id, items_dictionary,
+                                                                     expected_version(request))
+                return Response({'status': True, 'edit_objects': objects_updated, 'version': version},
+                                headers={'ETag': etag(version)})
         return Response({'status': False, 'error': 'Не указаны все поля'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @idempotent
+    @handle_conflicts
     def delete(self, request, *args, **kwargs):
         """Функция для удаления товара из корзины"""
         items = request.data.get('items')
         if items:
-            items_list = items.split(',')
-            cart, _ = Order.objects.get_or_create(user_id=request.user.id, status='cart')
-            query = Q()
-            objects_deleted = False
-            for item_id in items_list:
-                if item_id.isdigit():
-                    query = query | Q(order_id=cart.id, id=item_id)
-                    objects_deleted = True
-            if objects_deleted:
-                count = OrderItem.objects.filter(query).delete()[0]
-                return Response({'status': True, 'del_objects': count}, status=status.HTTP_204_NO_CONTENT)
+            item_ids = [int(item_id) for item_id in items.split(',') if item_id.isdigit()]
+            if item_ids:
+                count, version = get_cart_storage().remove(request.user.id, item_ids, expected_version(request))
+                return Response({'status': True, 'del_objects': count, 'version': version},
+                                status=status.HTTP_204_NO_CONTENT, headers={'ETag': etag(version)})
         return Response({'status': False, 'error': 'Не указаны все поля'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def order_filters(params):
+    """
+    Условия выборки заказов из параметров created_from, created_to и status.
+    Дата без времени в created_to включает весь день. Ошибка формата - ValueError.
+    """
+    filters = {}
+    for param, lookup in (('created_from', 'created__gte'), ('created_to', 'created__lt')):
+        value = params.get(param)
+        if not value:
+            continue
+        try:
+            day, moment = parse_date(value), parse_datetime(value)
+        except ValueError:
+            day = moment = None
+        if day is not None:
+            moment = datetime.combine(day + timedelta(days=lookup == 'created__lt'), time.min)
+        elif moment is None:
+            raise ValueError(f'Неверный формат даты {param}')
+        elif lookup == 'created__lt':
+            lookup = 'created__lte'
+        filters[lookup] = moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+    if params.get('status'):
+        filters['status__in'] = params['status'].split(',')
+    return filters
+
+
+def archive_page(queryset, request):
+    """
+    Страница архива заказов: не больше ORDER_ARCHIVE_PAGE_SIZE заказов по убыванию id,
+    начиная с id меньше параметра archive_before. Возвращает (заказы, ссылка на следующую страницу или None).
+    """
+    size = getattr(settings, 'ORDER_ARCHIVE_PAGE_SIZE', 100)
+    before = request.query_params.get('archive_before')
+    if before:
+        if not before.isdigit():
+            raise ValueError('Параметр archive_before должен быть целым числом')
+        queryset = queryset.filter(id__lt=int(before))
+    orders = list(queryset.order_by('-id')[:size + 1])
+    if len(orders) <= size:
+        return orders, None
+    orders = orders[:size]
+    last = orders[-1]['id'] if isinstance(orders[-1], dict) else orders[-1].id
+    return orders, replace_query_param(request.build_absolute_uri(), 'archive_before', last)
+
+
 class OrderView(APIView):
     """Класс заказов покупателей"""
     """
@@ -644,14 +886,49 @@ class OrderView(APIView):
 
     # получить мои заказы
     def get(self, request, *args, **kwargs):
-        """Функция получения списка заказанных товаров """
-        order = Order.objects.filter(
-            user_id=request.user.id).annotate(total_quantity=Sum('ordered_items__quantity'), total_sum=Sum(
-                'ordered_items__total_amount')).distinct()
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        """Функция получения списка заказанных товаров
+        Старые завершенные заказы лежат в архиве (api.archive) и возвращаются
+        только с параметром include_archive=1: после текущих заказов идут не больше
+        ORDER_ARCHIVE_PAGE_SIZE архивных, ссылка на следующую страницу архива - в заголовке Link.
+        Параметры: view=summary - только id, статус, дата и итоги одним запросом;
+        created_from/created_to - период (дата или дата и время), status - статусы через запятую.
+        """
+        try:
+            filters = order_filters(request.query_params)
+        except ValueError as error:
+            return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        include_archive = request.query_params.get('include_archive', '').lower() in ('1', 'true', 'yes', 'on')
+        totals = {'total_quantity': Sum('ordered_items__quantity'), 'total_sum': Sum('ordered_items__total_amount')}
+        summary = request.query_params.get('view') == 'summary'
+
+        if include_archive and request.query_params.get('archive_before'):
+            # следующие страницы архива: текущие заказы уже отданы на первой
+            data = []
+        elif summary:
+            data = list(Order.objects.filter(user_id=request.user.id, **filters).values(
+                'id', 'status', 'created').annotate(**totals).order_by('-created'))
+        else:
+            order = Order.objects.filter(user_id=request.user.id, **filters).select_related(
+                'contact').prefetch_related('ordered_items__shop', 'ordered_items__category').annotate(**totals)
+            data = OrderSerializer(order, many=True).data
+        if not include_archive:
+            return Response(data)
+
+        archived = ArchivedOrder.objects.filter(user_id=request.user.id, **filters)
+        if summary:
+            archived = archived.values('id', 'status', 'created').annotate(**totals)
+        else:
+            archived = archived.prefetch_related('ordered_items').select_related('contact').annotate(**totals)
+        try:
+            archived, next_page = archive_page(archived, request)
+        except ValueError as error:
+            return Response({'status': False, 'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        data = list(data) + (archived if summary else ArchivedOrderSerializer(archived, many=True).data)
+        return Response(data, headers={'Link': f'<{next_page}>; rel="next"'} if next_page else None)
 
     # разместить заказ из корзины
+    @idempotent
+    @handle_conflicts
     def post(self, request, *args, **kwargs):
         """Функция подтверждения заказа"""
         if not request.user.is_authenticated:
@@ -659,16 +936,16 @@ class OrderView(APIView):
         if {'id', 'contact'}.issubset(request.data):
             if request.data['id'].isdigit():
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                            contact_id=request.data['contact'], status='new')
+                    version = get_cart_storage().checkout(request.user.id, int(request.data['id']),
+                                                          request.data['contact'], expected_version(request))
                 except IntegrityError as error:
                     print(error)
                     return Response({'Status': False, 'Errors': 'Неправильно указаны аргументы'})
                 else:
-                    if is_updated:
+                    if version:
                         #on_change_order_status(request.user.id, request.data['id'])
-                        return Response({'Status': True})
-                    else:
-                        error_message = 'Сбой'         
+                        return Response({'Status': True}, headers={'ETag': etag(version)})
+                    # заказ уже оформлен, корзина пуста или принадлежит другому пользователю
+                    return Response({'Status': False, 'Error': 'Корзина не найдена'},
+                                    status=status.HTTP_400_BAD_REQUEST)
         return Response({'Status': False, 'Error': 'Не указаны все необходимые аргументы'})
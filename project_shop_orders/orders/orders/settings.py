@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -40,7 +42,6 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'rest_framework',
     'api',                         # регистрируем все создаваемые приложения
     'rest_framework.authtoken',
@@ -56,7 +57,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,6 +68,13 @@ MIDDLEWARE = [
     'allauth.account.middleware.AccountMiddleware',
 ]
 
+# debug_toolbar не подходит для работы под нагрузкой, поэтому подключается только для отладки
+DEBUG_TOOLBAR = os.environ.get('DEBUG_TOOLBAR', str(DEBUG)) == 'True'
+
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'orders.urls'
 
 TEMPLATES = [
@@ -99,6 +107,58 @@ DATABASES = {
 }
 
 
+# Cache
+# Общий кэш нужен, чтобы лимиты запросов и кэши действовали сразу для всех воркеров.
+# Без CACHE_REDIS_URL используется память процесса (для разработки и тестов).
+
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Хранилище счетчиков для api.throttling
+THROTTLE_STORE = 'api.throttling.CacheWindowStore'
+THROTTLE_CACHE = 'default'
+
+# Хранилище корзин (api.cart): DatabaseCartStorage - таблицы заказов,
+# CacheCartStorage - общий кэш с записью в базу только при оформлении заказа
+CART_STORAGE = os.environ.get('CART_STORAGE', 'api.cart.DatabaseCartStorage')
+CART_CACHE = 'default'
+CART_TTL = 7 * 24 * 60 * 60
+
+# Загрузка прайс-листов по ссылке (api.fetcher): таймауты в секундах, предельный размер в байтах,
+# число повторов и начальная пауза между ними; тело пишется во временный файл в FETCH_SPOOL_DIR
+FETCH_CONNECT_TIMEOUT = 5
+FETCH_READ_TIMEOUT = 30
+FETCH_TOTAL_TIMEOUT = 300
+FETCH_MAX_BYTES = 100 * 1024 * 1024
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5
+FETCH_POOL_SIZE = 10
+FETCH_SPOOL_DIR = None
+
+# Поиск товаров для списка products (api.catalog_engine): DatabaseCatalog - запросы к базе,
+# ArrayCatalog - столбцы товаров в памяти процесса, из базы читается только страница
+CATALOG_ENGINE = os.environ.get('CATALOG_ENGINE', 'api.catalog_engine.DatabaseCatalog')
+
+# Сохраненные ответы на запросы с заголовком Idempotency-Key (api.idempotency)
+IDEMPOTENCY_CACHE = 'default'
+IDEMPOTENCY_TTL = 24 * 60 * 60
+# Сколько секунд ключ считается выполняющимся (порядка таймаута запроса воркера)
+IDEMPOTENCY_LOCK_TTL = 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -153,7 +213,7 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
 
 
@@ -161,12 +221,16 @@ REST_FRAMEWORK = {
 
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'api.throttling.SlidingWindowAnonRateThrottle',
+        'api.throttling.SlidingWindowUserRateThrottle',
+        'api.throttling.SlidingWindowScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'register': '20/hour',
+        'change_price': '10/minute',
+        'export': '30/hour',
     },
 
     # YOUR SETTINGS
@@ -190,6 +254,13 @@ THUMBNAIL_ALIASES = {
     },
 }
 
+# Кэш снимков пользователей для CachedTokenAuthentication
+AUTH_CACHE_TIMEOUT = 300
+AUTH_CACHE_LOCAL_TIMEOUT = 5
+AUTH_CACHE_LOCAL_SIZE = 10000
+# Срок действия токена в секундах, None - бессрочно
+AUTH_TOKEN_TTL = None
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
     'allauth.account.auth_backends.AuthenticationBackend',
@@ -209,6 +280,41 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
+# Периодическая очистка (api.reaper), запускается celery beat
+CELERY_BEAT_SCHEDULE = {
+    'reap-abandoned-carts': {
+        'task': 'api.tasks.reap_abandoned_carts',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'reap-stale-confirm-tokens': {
+        'task': 'api.tasks.reap_stale_confirm_tokens',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'archive-old-orders': {
+        'task': 'api.tasks.archive_old_orders',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'refresh-related-products': {
+        'task': 'api.tasks.refresh_related_products',
+        'schedule': crontab(minute=15),
+    },
+    'rebuild-related-products': {
+        'task': 'api.tasks.refresh_related_products',
+        'schedule': crontab(day_of_week=0, hour=5, minute=0),
+        'kwargs': {'full': True},
+    },
+}
+
+# Корзины без изменений дольше этого срока (дни) и токены подтверждения email старше TTL (секунды) удаляются
+CART_RETENTION_DAYS = 30
+CONFIRM_EMAIL_TOKEN_TTL = 2 * 24 * 60 * 60
+# Доставленные и отмененные заказы без изменений дольше этого срока (дни) переносятся в архив
+ORDER_ARCHIVE_DAYS = 180
+# Сколько архивных заказов отдается за один запрос /order?include_archive=1
+ORDER_ARCHIVE_PAGE_SIZE = 100
+# Рекомендации "покупают вместе": соседей на товар; заказы с большим числом позиций не учитываются
+RECOMMENDATIONS_TOP_K = 10
+RECOMMENDATIONS_MAX_BASKET = 50
 
 
 INTERNAL_IPS = [
@@ -216,5 +322,14 @@ INTERNAL_IPS = [
 ]
 
 
+# Метрики запросов в формате Prometheus, эндпоинт /metrics.
+# Для нескольких воркеров укажите общий каталог METRICS_MULTIPROCESS_DIR.
+METRICS_ENABLED = True
+METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR')
+METRICS_FLUSH_INTERVAL = 1
+# Токен для сборщика метрик (Authorization: Bearer <токен>); без токена /metrics доступен только с INTERNAL_IPS
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
 # Spectacular configuration:
 #SPECTACULAR_DEFAULTS: Dict[str, Any] = {'SCHEMA_PATH_PREFIX': None, }
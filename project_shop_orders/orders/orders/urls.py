@@ -13,13 +13,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from api.views import *
 from rest_framework import routers
 from django_rest_passwordreset.views import reset_password_confirm, reset_password_request_token
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
-import debug_toolbar
 router = routers.SimpleRouter()
 router.register(r'user', UserViewSet)
 router.register(r'product', ProductViewSet)
@@ -32,6 +32,7 @@ urlpatterns = [
     path('api/v1/', include(router.urls)),
     path('user/register/confirm', Сonfirmation.as_view()),
     path('user/login', LoginUser.as_view()),
+    path('user/logout', LogoutUser.as_view()),
     path('user/contact', ContactView.as_view()),
     path('user/contacts', ContactAPIList.as_view()),
     path('user/details', DetailUser.as_view()),
@@ -40,15 +41,23 @@ urlpatterns = [
     path('shops', ShopView.as_view()),
     path('categories', CategoryView.as_view()),
     path('products', ProductView.as_view()),
+    path('products/export', ProductExport.as_view()),
+    path('products/offers', ProductOffers.as_view()),
+    path('products/<int:pk>/related', ProductRelated.as_view()),
     path('partner/update', PartnerUpdate.as_view()),
     path('partner/state', PartnerState.as_view()),
+    path('partner/export', PartnerExport.as_view()),
     path('partner/orders', PartnerOrders.as_view()),
+    path('partner/orders/status', PartnerOrderStatus.as_view()),
     path('cart', CartView.as_view()),
     path('order', OrderView.as_view()),
-    path("__debug__/", include("debug_toolbar.urls")),
+    path('metrics', metrics, name='metrics'),
     # YOUR PATTERNS
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     # Optional UI:
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
+
+if settings.DEBUG_TOOLBAR:
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
@@ -0,0 +1,11 @@
+import pytest
+from django.core.cache import cache
+
+from api.cache import clear_local_caches
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    clear_local_caches()
+    yield
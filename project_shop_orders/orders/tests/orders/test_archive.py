@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.archive import archive_orders
+from api.models import User, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+
+
+def make_order(buyer, status, age_days):
+    order = Order.objects.create(user=buyer, status=status)
+    OrderItem.objects.create(order=order, product_name='Товар', external_id=1, quantity=2, price=100)
+    Order.objects.filter(id=order.id).update(updated=timezone.now() - timedelta(days=age_days))
+    return order
+
+
+@pytest.mark.django_db
+def test_finished_orders_move_to_archive(buyer):
+    delivered = make_order(buyer, 'delivered', 200)
+    canceled = make_order(buyer, 'canceled', 365)
+    recent = make_order(buyer, 'delivered', 10)
+    active = make_order(buyer, 'sent', 400)
+
+    assert archive_orders(days=180, batch_size=1) == {'orders': 2, 'items': 2}
+    assert set(Order.objects.values_list('id', flat=True)) == {recent.id, active.id}
+    assert set(ArchivedOrder.objects.values_list('id', flat=True)) == {delivered.id, canceled.id}
+    assert ArchivedOrderItem.objects.get(order_id=delivered.id).total_amount == 200
+
+
+@pytest.mark.django_db
+def test_archive_is_read_only_on_request(buyer):
+    archived = make_order(buyer, 'delivered', 200)
+    hot = make_order(buyer, 'new', 1)
+    archive_orders(days=180)
+    client = APIClient()
+    client.force_authenticate(buyer)
+
+    assert [order['id'] for order in client.get('/order').data] == [hot.id]
+    orders = client.get('/order?include_archive=1').data
+    assert [order['id'] for order in orders] == [hot.id, archived.id]
+    assert orders[1]['total_sum'] == 200
+    assert orders[1]['ordered_items'][0]['product_name'] == 'Товар'
+
+
+@pytest.mark.django_db
+def test_archive_is_paginated_by_cursor(buyer, settings):
+    settings.ORDER_ARCHIVE_PAGE_SIZE = 2
+    archived = [make_order(buyer, 'delivered', 200).id for _ in range(5)]
+    hot = make_order(buyer, 'new', 1)
+    archive_orders(days=180)
+    client = APIClient()
+    client.force_authenticate(buyer)
+
+    seen, url = [], '/order?include_archive=1&view=summary'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen += [order['id'] for order in response.data]
+        url = response.get('Link', '')[1:].partition('>')[0]
+    assert seen == [hot.id] + sorted(archived, reverse=True)
+
+    assert client.get('/order?include_archive=1&archive_before=x').status_code == 400
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+import api.authentication
+from api.authentication import token_cache, invalidate_tokens
+from api.models import User
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345', is_active=True)
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    client.token = token
+    return client
+
+
+def auth_queries(queries):
+    return [query['sql'] for query in queries if 'authtoken_token' in query['sql']]
+
+
+@pytest.mark.django_db
+def test_cached_requests_skip_token_query(client):
+    with CaptureQueriesContext(connection) as first:
+        assert client.get('/user/details').status_code == 200
+    with CaptureQueriesContext(connection) as second:
+        response = client.get('/user/details')
+
+    assert response.data['email'] == 'buyer@example.com'
+    assert len(auth_queries(first.captured_queries)) == 1
+    assert auth_queries(second.captured_queries) == []
+
+
+@pytest.mark.django_db
+def test_deactivation_invalidates_snapshot(client, user):
+    client.get('/user/details')
+    user.is_active = False
+    user.save()
+
+    assert client.get('/user/details').status_code == 401
+
+
+@pytest.mark.django_db
+def test_bulk_deactivation_invalidates_snapshot(client, user, django_capture_on_commit_callbacks):
+    assert client.get('/user/details').status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        assert User.objects.filter(id=user.id).update(is_active=False) == 1
+
+    assert client.get('/user/details').status_code == 401
+
+
+@pytest.mark.django_db
+def test_snapshot_keeps_database_alias(client):
+    client.get('/user/details')
+    assert token_cache.get(client.token.key)['db'] == 'default'
+    assert client.get('/user/details').wsgi_request.user._state.db == 'default'
+
+
+@pytest.mark.django_db
+def test_user_update_refreshes_snapshot(client, user):
+    client.get('/user/details')
+    assert client.post('/user/details', {'password': 'New-pass-54321', 'company': 'X8'}).status_code == 200
+
+    user.refresh_from_db()
+    assert user.company == 'X8'
+    assert user.email == 'buyer@example.com'
+    assert client.get('/user/details').data['company'] == 'X8'
+
+
+@pytest.mark.django_db
+def test_logout_revokes_token(client):
+    client.get('/user/details')
+    assert client.post('/user/logout').status_code == 200
+
+    assert client.get('/user/details').status_code == 401
+    assert token_cache.get(client.token.key) is None
+
+
+@pytest.mark.django_db
+def test_expired_token_is_rejected(client, settings):
+    settings.AUTH_TOKEN_TTL = 60
+    Token.objects.filter(key=client.token.key).update(created=timezone.now() - timedelta(minutes=5))
+
+    assert client.get('/user/details').status_code == 401
+    assert not Token.objects.filter(key=client.token.key).exists()
+
+
+@pytest.mark.django_db
+def test_snapshot_has_no_password_hash(client, user):
+    client.get('/user/details')
+    snapshot = token_cache.get(client.token.key)
+    assert user.password not in snapshot['user']
+
+
+@pytest.mark.django_db
+def test_deactivation_reaches_other_workers(client, user):
+    client.get('/user/details')
+    full_key = token_cache.make_key(client.token.key)
+    stale = token_cache.local.get(full_key)
+    user.is_active = False
+    user.save()
+    # у другого воркера в памяти процесса остался прежний снимок
+    token_cache.local.set(full_key, stale)
+
+    assert client.get('/user/details').status_code == 401
+
+
+@pytest.mark.django_db
+def test_invalidation_during_load_is_not_lost(client, monkeypatch):
+    make_snapshot = api.authentication.make_snapshot
+
+    def invalidated_after_read(token, version):
+        snapshot = make_snapshot(token, version)
+        invalidate_tokens(token.key)
+        return snapshot
+
+    monkeypatch.setattr(api.authentication, 'make_snapshot', invalidated_after_read)
+    client.get('/user/details')
+    monkeypatch.setattr(api.authentication, 'make_snapshot', make_snapshot)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get('/user/details').status_code == 200
+    assert len(auth_queries(queries.captured_queries)) == 1
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.cache import TwoTierCache, LRUCache
+from api.metrics import registry
+from api.models import Shop
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+
+    assert lru.get('a') == 1
+    assert lru.get('b') is None
+    assert len(lru) == 2
+
+
+def test_invalidation_reaches_other_workers():
+    first = TwoTierCache('test-ns', poll_interval=0)
+    second = TwoTierCache('test-ns', poll_interval=0)
+    first.set('key', 'old')
+    assert second.get('key') == 'old'
+
+    first.invalidate()
+    assert second.get('key') is None
+    assert first.get('key') is None
+
+
+def test_version_does_not_repeat_after_shared_cache_flush():
+    namespace = TwoTierCache('test-flush', poll_interval=0)
+    namespace.set('key', 'old')
+    seen = {namespace.version()}
+    namespace.invalidate()
+    seen.add(namespace.version())
+
+    cache.clear()
+    assert namespace.version() not in seen
+    assert namespace.get('key') is None
+
+
+def test_hits_and_misses_are_counted():
+    registry.reset()
+    namespace = TwoTierCache('test-metrics')
+    namespace.get('key')
+    namespace.set('key', 1)
+    namespace.get('key')
+
+    assert registry.counters[('cache_requests_total', (('namespace', 'test-metrics'), ('result', 'miss')))] == 1
+    assert registry.counters[('cache_requests_total', (('namespace', 'test-metrics'), ('result', 'local_hit')))] == 1
+
+
+def test_get_or_set_computes_once():
+    namespace = TwoTierCache('test-single-flight')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(namespace.get_or_set('key', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 8
+    assert len(calls) == 1
+
+
+def test_slow_foreign_lock_is_not_released():
+    namespace = TwoTierCache('test-slow-lock', lock_timeout=0.1)
+    lock_key = f'lock:{namespace.make_key("key")}'
+    cache.add(lock_key, 'other-worker', 10)
+
+    assert namespace.get_or_set('key', lambda: 42) == 42
+    assert cache.get(lock_key) == 'other-worker'
+
+
+@pytest.mark.django_db
+def test_shop_list_is_cached_until_catalog_changes(django_capture_on_commit_callbacks):
+    shop = Shop.objects.create(name='Связной')
+    client = APIClient()
+    client.get('/shops')
+    with CaptureQueriesContext(connection) as queries:
+        assert [item['name'] for item in client.get('/shops').data] == ['Связной']
+    assert len(queries) == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        shop.name = 'Евросеть'
+        shop.save()
+    assert [item['name'] for item in client.get('/shops').data] == ['Евросеть']
@@ -0,0 +1,139 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ujson import dumps as dump_json
+
+from api.cart import get_cart_storage
+from api.models import User, Shop, Category, Product, Order, OrderItem, Contact, Shipment
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def products(db):
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    shop = Shop.objects.create(name='Связной', user=partner)
+    category = Category.objects.create(id=224, name='Смартфоны')
+    return [Product.objects.create(name=name, category=category, shop=shop, external_id=external_id, quantity=5,
+                                   price=1000 * external_id, price_rrc=1100) for external_id, name in
+            ((1, 'iPhone'), (2, 'Galaxy'))]
+
+
+@pytest.fixture
+def cache_storage(settings):
+    settings.CART_STORAGE = 'api.cart.CacheCartStorage'
+
+
+ITEMS = dump_json([{'external_id': 1, 'quantity': 2}, {'external_id': 2, 'quantity': 1}])
+
+
+@pytest.mark.django_db
+def test_cache_cart_matches_database_cart(client, settings):
+    client.post('/cart', {'items': ITEMS})
+    expected = client.get('/cart').data[0]
+    Order.objects.all().delete()
+
+    settings.CART_STORAGE = 'api.cart.CacheCartStorage'
+    client.post('/cart', {'items': ITEMS})
+    cart = client.get('/cart').data[0]
+
+    assert set(cart) == set(expected)
+    assert set(cart['ordered_items'][0]) == set(expected['ordered_items'][0])
+    assert (cart['total_sum'], cart['total_quantity']) == (expected['total_sum'], expected['total_quantity'])
+    assert [(item['shop'], item['category'], item['product_name'], item['total_amount'])
+            for item in cart['ordered_items']] == \
+           [(item['shop'], item['category'], item['product_name'], item['total_amount'])
+            for item in expected['ordered_items']]
+
+
+@pytest.mark.django_db
+def test_cache_cart_does_not_write_until_checkout(client, buyer, cache_storage):
+    with CaptureQueriesContext(connection) as queries:
+        client.post('/cart', {'items': ITEMS})
+        cart = client.get('/cart').data[0]
+        item = cart['ordered_items'][0]
+        client.put('/cart', {'items': dump_json([{'id': item['id'], 'quantity': 3}])})
+        client.delete('/cart', {'items': str(cart['ordered_items'][1]['id'])})
+    # единственная запись - строка корзины, которая дает ей идентификатор
+    writes = [query['sql'] for query in queries if not query['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+    assert len(writes) == 1 and writes[0].startswith('INSERT INTO "api_order"')
+    assert Order.objects.get().id == cart['id']
+    assert not OrderItem.objects.exists()
+
+    cart = client.get('/cart').data[0]
+    assert cart['total_quantity'] == 3
+    contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+    response = client.post('/order', {'id': str(cart['id']), 'contact': contact.id},
+                           HTTP_IF_MATCH=f'"{cart["version"]}"')
+    assert response.data == {'Status': True}
+
+    order = Order.objects.get()
+    assert (order.id, order.status, order.contact_id) == (cart['id'], 'new', contact.id)
+    assert list(OrderItem.objects.values_list('product_name', 'quantity', 'total_amount')) == [('iPhone', 3, 3000)]
+    assert client.get('/cart').data == []
+
+
+@pytest.mark.django_db
+def test_cache_cart_rejects_stale_version(client, cache_storage):
+    client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])})
+    response = client.post('/cart', {'items': dump_json([{'external_id': 2, 'quantity': 1}])}, HTTP_IF_MATCH='"1"')
+    assert response.status_code == 409
+    assert response.data['version'] == 2
+    assert client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_cache_cart_id_survives_cache_flush(client, cache_storage):
+    client.post('/cart', {'items': ITEMS})
+    cart = client.get('/cart').data[0]
+    cache.clear()
+
+    client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])})
+    assert client.get('/cart').data[0]['id'] == cart['id']
+    assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_busy_cache_cart_answers_conflict(client, buyer, cache_storage, monkeypatch):
+    client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])})
+    storage = get_cart_storage()
+    monkeypatch.setattr(storage, 'lock_timeout', 0.05)
+    lock_key = f'lock:{storage.key(buyer.id)}'
+    cache.set(lock_key, 'other-request')
+
+    response = client.post('/cart', {'items': dump_json([{'external_id': 2, 'quantity': 1}])})
+    assert (response.status_code, response.data['version']) == (409, 2)
+    assert client.post('/order', {'id': str(response.data['id']), 'contact': 1}).status_code == 409
+    # чужая блокировка не снята, корзина не изменилась
+    assert cache.get(lock_key) == 'other-request'
+    assert len(client.get('/cart').data[0]['ordered_items']) == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('storage', ['api.cart.DatabaseCartStorage', 'api.cart.CacheCartStorage'])
+def test_placed_order_cannot_be_checked_out_again(client, buyer, settings, storage):
+    settings.CART_STORAGE = storage
+    contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+    client.post('/cart', {'items': ITEMS})
+    cart = client.get('/cart').data[0]
+    response = client.post('/order', {'id': str(cart['id']), 'contact': contact.id})
+    assert response.status_code == 200
+    assert response['ETag'] == f'"{cart["version"] + 1}"'
+
+    Order.objects.filter(id=cart['id']).update(status='delivered')
+    response = client.post('/order', {'id': str(cart['id']), 'contact': contact.id})
+    assert response.status_code == 400
+    assert Order.objects.get(id=cart['id']).status == 'delivered'
+    assert Shipment.objects.filter(order_id=cart['id']).count() == 1
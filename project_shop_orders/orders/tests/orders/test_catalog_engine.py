@@ -0,0 +1,68 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.catalog import invalidate_catalog
+from api.catalog_engine import ProductFilter, DatabaseCatalog, ArrayCatalog
+from api.models import User, Shop, Category, Product
+
+
+@pytest.fixture
+def products():
+    category = Category.objects.create(id=224, name='Смартфоны')
+    accessories = Category.objects.create(id=15, name='Аксессуары')
+    products = []
+    for number, state in enumerate((True, True, False), start=1):
+        partner = User.objects.create_user(email=f'shop{number}@example.com', password='Pass-12345', type='shop')
+        shop = Shop.objects.create(name=f'Магазин {number}', user=partner, state=state)
+        for external_id in range(1, 6):
+            products.append(Product.objects.create(
+                name=f'Товар {number}-{external_id}', category=category if external_id % 2 else accessories,
+                shop=shop, external_id=external_id, quantity=external_id % 3, price=1000 * external_id + number,
+                price_rrc=10000))
+    return products
+
+
+QUERIES = [
+    {},
+    {'shop_id': '1'},
+    {'category_id': '15', 'ordering': 'price'},
+    {'price_min': '2000', 'price_max': '4500', 'ordering': '-price'},
+    {'in_stock': '1', 'ordering': '-quantity'},
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', QUERIES)
+def test_array_catalog_matches_database(products, params):
+    query = ProductFilter(params)
+    assert ArrayCatalog().product_ids(query).tolist() == list(DatabaseCatalog().product_ids(query))
+
+
+@pytest.mark.django_db
+def test_snapshot_follows_catalog_version(products):
+    engine = ArrayCatalog()
+    assert len(engine.product_ids(ProductFilter({}))) == 10
+    Shop.objects.filter(state=False).update(state=True)
+    assert len(engine.product_ids(ProductFilter({}))) == 10
+    invalidate_catalog()
+    assert len(engine.product_ids(ProductFilter({}))) == 15
+
+
+@pytest.mark.django_db
+def test_paginated_list_reads_only_page_rows(products, settings):
+    settings.CATALOG_ENGINE = 'api.catalog_engine.ArrayCatalog'
+    client = APIClient()
+    client.get('/products', {'page': 1})
+    with CaptureQueriesContext(connection) as queries:
+        data = client.get('/products', {'page': 2, 'ordering': 'price'}).data
+    assert data['count'] == 10
+    assert [product['price'] for product in data['results']] == [2002, 3001, 3002]
+    assert not any('COUNT' in query['sql'] for query in queries)
+
+
+@pytest.mark.django_db
+def test_invalid_filters(products):
+    assert APIClient().get('/products', {'price_min': 'дешево'}).status_code == 400
+    assert APIClient().get('/products', {'ordering': 'name'}).status_code == 400
@@ -0,0 +1,85 @@
+import pytest
+from rest_framework.test import APIClient
+from ujson import dumps as dump_json
+
+from api.concurrency import bump_version
+from api.models import User, Shop, Category, Product, Order, OrderItem, Contact, Shipment
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+@pytest.fixture
+def product():
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    shop = Shop.objects.create(name='Связной', user=partner)
+    category = Category.objects.create(id=224, name='Смартфоны')
+    return Product.objects.create(name='iPhone', category=category, shop=shop, external_id=1, quantity=5,
+                                  price=1000, price_rrc=1100)
+
+
+@pytest.mark.django_db
+def test_stale_cart_update_is_rejected(client, product):
+    response = client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])})
+    assert response.data['version'] == 2
+    assert client.get('/cart')['ETag'] == '"2"'
+    item = OrderItem.objects.get()
+
+    items = dump_json([{'id': item.id, 'quantity': 3}])
+    assert client.put('/cart', {'items': items}, HTTP_IF_MATCH='"2"').data['version'] == 3
+    response = client.put('/cart', {'items': dump_json([{'id': item.id, 'quantity': 7}])}, HTTP_IF_MATCH='"2"')
+    assert response.status_code == 409
+    assert response.data['version'] == 3
+    assert response['ETag'] == '"3"'
+    assert OrderItem.objects.get().quantity == 3
+
+
+@pytest.mark.django_db
+def test_order_checkout_checks_version(client, buyer, product):
+    client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 1}])})
+    cart = Order.objects.get()
+    contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+
+    response = client.post('/order', {'id': str(cart.id), 'contact': contact.id, 'version': 1})
+    assert response.status_code == 409
+    response = client.post('/order', {'id': str(cart.id), 'contact': contact.id}, HTTP_IF_MATCH='"2"')
+    assert response.data == {'Status': True}
+    assert Order.objects.get().version == 3
+
+
+@pytest.mark.django_db
+def test_partner_status_change_checks_version(buyer, product):
+    order = Order.objects.create(user=buyer, status='new')
+    OrderItem.objects.create(order=order, shop=product.shop, product_name='iPhone', external_id=1)
+    Shipment.objects.create(order=order, shop=product.shop, version=4)
+    client = APIClient()
+    client.force_authenticate(product.shop.user)
+
+    response = client.post('/partner/orders/status', {'orders': [
+        {'id': order.id, 'status': 'confirmed', 'version': 3}]}, format='json')
+    assert response.status_code == 409
+    assert response.data['version'] == 4
+
+    client.post('/partner/orders/status', {'orders': [{'id': order.id, 'status': 'confirmed', 'version': 4}]},
+                format='json')
+    assert Shipment.objects.get().version == 5
+
+
+@pytest.mark.django_db
+def test_unconditional_changes_do_not_conflict(buyer):
+    order = Order.objects.create(user=buyer, status='cart')
+    stale = Order.objects.get(id=order.id)
+
+    assert bump_version(order) == 2
+    # второй запрос прочитал заказ до первого изменения и не передал If-Match
+    assert bump_version(stale) == 3
+    assert Order.objects.get(id=order.id).version == 3
@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.importer import PriceListImport
+from api.models import User, Shop, Product, ProductParameter
+from api.pricelist import iter_price_list, generate_goods, SYNTHETIC_CATEGORIES
+
+
+@pytest.fixture
+def partner():
+    return User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+
+
+def import_goods(partner, goods):
+    PriceListImport(partner.id, content=''.join(iter_price_list('Связной', SYNTHETIC_CATEGORIES, goods)).encode()).run()
+
+
+@pytest.mark.django_db
+def test_unchanged_catalog_answers_not_modified(partner, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        import_goods(partner, list(generate_goods(5)))
+    client = APIClient()
+    response = client.get('/shops')
+    assert response.status_code == 200
+    assert response['ETag'] and response['Last-Modified']
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/shops', HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+    assert len(queries) == 0
+
+    response = client.get('/products', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_catalog_changes_replace_etag(partner, django_capture_on_commit_callbacks):
+    goods = list(generate_goods(5))
+    with django_capture_on_commit_callbacks(execute=True):
+        import_goods(partner, goods)
+    client = APIClient()
+    etag = client.get('/categories')['ETag']
+
+    goods[0]['price'] += 1
+    with django_capture_on_commit_callbacks(execute=True):
+        import_goods(partner, goods)
+    response = client.get('/categories', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response['ETag']
+
+    client.force_authenticate(partner)
+    client.post('/partner/state', {'state': 'off'})
+    response = client.get('/categories', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert Shop.objects.get(user=partner).imported_at is not None
+
+
+@pytest.mark.django_db
+def test_parameter_edit_and_product_delete_replace_etag(partner, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        import_goods(partner, list(generate_goods(5)))
+    client = APIClient()
+    etag = client.get('/products')['ETag']
+
+    parameter = ProductParameter.objects.first()
+    parameter.value = 'другое значение'
+    with django_capture_on_commit_callbacks(execute=True):
+        parameter.save()
+    response = client.get('/products', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response['ETag']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.first().delete()
+    response = client.get('/products', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
@@ -0,0 +1,72 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import User, Contact
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+@pytest.fixture
+def stranger_contact():
+    stranger = User.objects.create_user(email='other@example.com', password='Pass-12345')
+    return Contact.objects.create(user=stranger, city='Казань', street='Баумана', phone='+79991111111')
+
+
+def addresses(count):
+    return [{'city': 'Москва', 'street': f'Тверская {number}', 'phone': '+79990000000'} for number in range(count)]
+
+
+@pytest.mark.django_db
+def test_bulk_create_and_update_take_one_query(client, buyer):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post('/user/contact', {'items': addresses(20)}, format='json')
+    assert response.data['num_objects'] == 20
+    assert len([query for query in queries if query['sql'].startswith('INSERT')]) == 1
+
+    items = [{'id': contact_id, 'house': '5'} for contact_id in response.data['ids']]
+    with CaptureQueriesContext(connection) as queries:
+        response = client.put('/user/contact', {'items': items}, format='json')
+    assert response.data == {'status': True, 'edit_objects': 20}
+    assert len([query for query in queries if query['sql'].startswith('UPDATE')]) == 1
+    assert set(Contact.objects.filter(user=buyer).values_list('house', flat=True)) == {'5'}
+    assert len(client.get('/user/contact').data) == 20
+
+
+@pytest.mark.django_db
+def test_foreign_contacts_are_not_changed(client, stranger_contact):
+    response = client.put('/user/contact', {'id': stranger_contact.id, 'city': 'Москва'})
+    assert response.status_code == 400
+    client.delete('/user/contact', {'items': str(stranger_contact.id)})
+    assert Contact.objects.get().city == 'Казань'
+
+
+@pytest.mark.django_db
+def test_contacts_are_deleted_in_one_statement(client, buyer):
+    client.post('/user/contact', {'items': addresses(5)}, format='json')
+    ids = ','.join(str(contact_id) for contact_id in Contact.objects.values_list('id', flat=True)[:3])
+    with CaptureQueriesContext(connection) as queries:
+        response = client.delete('/user/contact', {'items': ids})
+    assert response.status_code == 200
+    assert response.json() == {'status': True, 'del_objects': 3}
+    assert len([query for query in queries if query['sql'].startswith('DELETE FROM "api_contact"')]) == 1
+    assert Contact.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_contact_list_is_scoped_and_paginated(client, stranger_contact):
+    client.post('/user/contact', {'items': addresses(4)}, format='json')
+    response = client.get('/user/contacts')
+    assert response.data['count'] == 4
+    assert len(response.data['results']) == 3
@@ -0,0 +1,110 @@
+import csv
+import gzip
+import io
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from ujson import loads as load_json
+
+from api.export import FORMATS, iter_products, products_for_export, export_response, accepts_gzip
+from api.importer import PriceListImport
+from api.models import User
+from api.pricelist import iter_price_list, generate_goods, SYNTHETIC_CATEGORIES
+
+
+@pytest.fixture
+def goods():
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    goods = list(generate_goods(30))
+    PriceListImport(partner.id, content=''.join(iter_price_list('Связной', SYNTHETIC_CATEGORIES, goods)).encode()).run()
+    return goods
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='buyer@example.com', password='Pass-12345'))
+    return client
+
+
+@pytest.mark.django_db
+def test_ndjson_export_streams_products_with_parameters(client, goods):
+    response = client.get('/products/export?format=ndjson')
+    assert response.streaming
+    assert response['Content-Type'] == 'application/x-ndjson; charset=utf-8'
+
+    rows = [load_json(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert sorted(row['external_id'] for row in rows) == sorted(item['id'] for item in goods)
+    first = next(row for row in rows if row['external_id'] == goods[0]['id'])
+    assert first['shop'] == 'Связной'
+    assert first['parameters'] == {name: str(value) for name, value in goods[0]['parameters'].items()}
+
+
+@pytest.mark.django_db
+def test_csv_export_is_gzipped_on_request(client, goods):
+    response = client.get('/products/export?format=csv', HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert response['Content-Encoding'] == 'gzip'
+
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(b''.join(response.streaming_content)).decode())))
+    assert len(rows) == len(goods)
+    assert load_json(rows[0]['parameters'])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('header', ['gzip;q=0, deflate', 'identity, *;q=0', 'br'])
+def test_export_is_not_gzipped_when_refused(client, goods, header):
+    response = client.get('/products/export?format=ndjson', HTTP_ACCEPT_ENCODING=header)
+    assert not response.has_header('Content-Encoding')
+    assert len(b''.join(response.streaming_content).splitlines()) == len(goods)
+
+
+@pytest.mark.parametrize('header, expected', [('gzip', True), ('deflate, gzip;q=0.5', True), ('*', True),
+                                              ('gzip;q=0', False), ('gzip; q=0.0, *', False), ('', False)])
+def test_accepts_gzip_honours_weights(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+@pytest.mark.django_db
+def test_parameters_are_loaded_per_batch(rf, goods):
+    with CaptureQueriesContext(connection) as queries:
+        response = export_response(rf.get('/products/export'), FORMATS['ndjson'](
+            iter_products(products_for_export(), chunk_size=10)), 'application/x-ndjson', 'products.ndjson')
+        b''.join(response.streaming_content)
+    # курсор товаров и по запросу параметров на каждую из трех пачек
+    assert len(queries) == 4
+
+
+@pytest.mark.django_db
+def test_export_requires_authentication(goods):
+    assert APIClient().get('/products/export?format=ndjson').status_code == 401
+
+
+@pytest.mark.django_db
+def test_partner_export_reimports_as_noop(goods):
+    partner = User.objects.get(email='shop@example.com')
+    client = APIClient()
+    client.force_authenticate(partner)
+    response = client.get('/partner/export', HTTP_ACCEPT_ENCODING='gzip')
+    assert response.streaming
+    content = gzip.decompress(b''.join(response.streaming_content))
+
+    plan = PriceListImport(partner.id, content=content).run()
+    assert plan.changed == 0
+    assert plan.unchanged == len(goods)
+
+
+@pytest.mark.django_db
+def test_partner_export_is_for_shops_only(client):
+    assert client.get('/partner/export').status_code == 403
+
+
+@pytest.mark.django_db
+def test_partner_export_is_not_gzipped_when_refused(goods):
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email='shop@example.com'))
+    response = client.get('/partner/export', HTTP_ACCEPT_ENCODING='gzip;q=0')
+    assert not response.has_header('Content-Encoding')
+    assert 'Accept-Encoding' in response['Vary']
+    assert b''.join(response.streaming_content).startswith(b'shop:')
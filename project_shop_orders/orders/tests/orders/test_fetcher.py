@@ -0,0 +1,159 @@
+import gzip
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.fetcher import fetch, FetchError
+from api.importer import PriceListImport
+from api.metrics import registry
+from api.models import User, Product
+from api.pricelist import iter_price_list, generate_goods, SYNTHETIC_CATEGORIES
+
+
+PRICE_LIST = ''.join(iter_price_list('Тестовый магазин', SYNTHETIC_CATEGORIES, generate_goods(20))).encode()
+
+
+class SupplierHandler(BaseHTTPRequestHandler):
+    """Поставщик: медленные, оборванные, слишком большие, сжатые и временно недоступные ответы"""
+    attempts = {}
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, length=None):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        attempt = self.attempts[self.path] = self.attempts.get(self.path, 0) + 1
+        if self.path == '/price.yaml':
+            self.send_body(PRICE_LIST)
+        elif self.path == '/slow.yaml':
+            time.sleep(1)
+            self.send_body(PRICE_LIST)
+        elif self.path == '/drip.yaml':
+            # тело по байту: каждое чтение укладывается в таймаут чтения
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(PRICE_LIST)))
+            self.end_headers()
+            try:
+                for index in range(len(PRICE_LIST)):
+                    self.wfile.write(PRICE_LIST[index:index + 1])
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+        elif self.path == '/gzip.yaml':
+            body = gzip.compress(PRICE_LIST)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/truncated.yaml':
+            self.send_body(PRICE_LIST[:100], length=len(PRICE_LIST))
+        elif self.path == '/huge.yaml':
+            self.send_response(200)
+            self.end_headers()
+            for _ in range(100):
+                self.wfile.write(b'#' * 1024)
+        elif self.path == '/flaky.yaml' and attempt == 1:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/flaky.yaml':
+            self.send_body(PRICE_LIST)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+
+@pytest.fixture
+def supplier(settings):
+    settings.FETCH_READ_TIMEOUT = 0.3
+    settings.FETCH_RETRIES = 1
+    settings.FETCH_BACKOFF = 0
+    settings.FETCH_MAX_BYTES = 64 * 1024
+    SupplierHandler.attempts = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SupplierHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_body_is_memory_mapped(supplier):
+    with fetch(f'{supplier}/price.yaml') as content:
+        assert len(content) == len(PRICE_LIST)
+        assert content[:len(PRICE_LIST)] == PRICE_LIST
+
+
+def test_compressed_body_is_decoded(supplier):
+    with fetch(f'{supplier}/gzip.yaml') as content:
+        assert content[:] == PRICE_LIST
+
+
+def test_total_timeout_stops_slow_body(supplier, settings):
+    settings.FETCH_TOTAL_TIMEOUT = 1
+    started = time.monotonic()
+    with pytest.raises(FetchError, match='Превышено время'):
+        with fetch(f'{supplier}/drip.yaml'):
+            pass
+    assert time.monotonic() - started < 2
+    assert SupplierHandler.attempts['/drip.yaml'] == 1
+
+
+@pytest.mark.parametrize('path, error', [
+    ('/slow.yaml', 'ReadTimeout'),
+    ('/truncated.yaml', 'не полностью'),
+    ('/huge.yaml', 'больше 65536 байт'),
+    ('/missing.yaml', '404'),
+])
+def test_bad_responses_fail(supplier, path, error):
+    with pytest.raises(FetchError, match=error):
+        with fetch(f'{supplier}{path}'):
+            pass
+
+
+def test_temporary_errors_are_retried(supplier):
+    registry.reset()
+    with fetch(f'{supplier}/flaky.yaml') as content:
+        assert len(content) == len(PRICE_LIST)
+    assert SupplierHandler.attempts == {'/flaky.yaml': 2}
+
+    with pytest.raises(FetchError):
+        with fetch(f'{supplier}/truncated.yaml'):
+            pass
+    assert SupplierHandler.attempts['/truncated.yaml'] == 2
+    results = {dict(labels)['result']: value for (name, labels), value in registry.counters.items()
+               if name == 'fetch_attempts_total'}
+    assert results == {'retry': 2, 'ok': 1, 'error': 1}
+    with pytest.raises(FetchError):
+        with fetch(f'{supplier}/huge.yaml'):
+            pass
+    assert SupplierHandler.attempts['/huge.yaml'] == 1
+
+
+@pytest.mark.django_db
+def test_import_reads_fetched_price_list(supplier):
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    price_import = PriceListImport(partner.id, url=f'{supplier}/price.yaml')
+    price_import.run()
+    assert price_import.stats['fetch']['rows'] == len(PRICE_LIST)
+    assert Product.objects.count() == 20
+
+
+@pytest.mark.django_db
+def test_partner_update_reports_fetch_errors(supplier):
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop'))
+    response = client.post('/partner/update', {'url': f'{supplier}/truncated.yaml'})
+    assert response.status_code == 400
+    assert 'не полностью' in response.data['error']
+    assert client.post('/partner/update', {'url': f'{supplier}/price.yaml'}).data == {'status': True}
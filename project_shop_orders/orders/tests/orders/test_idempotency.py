@@ -0,0 +1,77 @@
+import pytest
+from rest_framework.test import APIClient
+from ujson import dumps as dump_json
+
+from api.idempotency import get_cache
+from api.models import User, Shop, Category, Product, OrderItem
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='buyer@example.com', password='Pass-12345'))
+    return client
+
+
+@pytest.fixture(autouse=True)
+def product(db):
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    shop = Shop.objects.create(name='Связной', user=partner)
+    category = Category.objects.create(id=224, name='Смартфоны')
+    return Product.objects.create(name='iPhone', category=category, shop=shop, external_id=1, quantity=5,
+                                  price=1000, price_rrc=1100)
+
+
+ITEMS = dump_json([{'external_id': 1, 'quantity': 1}])
+
+
+@pytest.mark.django_db
+def test_retry_replays_first_response(client):
+    first = client.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-1')
+    retry = client.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-1')
+
+    assert retry.status_code == first.status_code == 200
+    assert retry.data == first.data
+    assert retry['Idempotent-Replayed'] == 'true'
+    assert retry['ETag'] == first['ETag']
+    assert OrderItem.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_retry_without_key_hits_unique_constraint(client):
+    client.post('/cart', {'items': ITEMS})
+    assert client.post('/cart', {'items': ITEMS}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_key_reused_with_other_body_is_rejected(client):
+    client.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-2')
+    response = client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 2}])},
+                           HTTP_IDEMPOTENCY_KEY='retry-2')
+    assert response.status_code == 422
+
+
+@pytest.mark.django_db
+def test_keys_are_scoped_by_user(client):
+    client.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-3')
+    other = APIClient()
+    other.force_authenticate(User.objects.create_user(email='other@example.com', password='Pass-12345'))
+    response = other.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-3')
+    assert not response.has_header('Idempotent-Replayed')
+    assert OrderItem.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_pending_marker_expires_before_response(client, settings, monkeypatch):
+    settings.IDEMPOTENCY_LOCK_TTL = 30
+    cache = get_cache()
+    timeouts = []
+    for name in ('add', 'set'):
+        def recorded(key, value, *args, original=getattr(cache, name)):
+            if key.startswith('idempotency:'):
+                timeouts.append((value[1], *args))
+            return original(key, value, *args)
+        monkeypatch.setattr(cache, name, recorded)
+
+    client.post('/cart', {'items': ITEMS}, HTTP_IDEMPOTENCY_KEY='retry-4')
+    assert timeouts == [('pending', 30), (200, settings.IDEMPOTENCY_TTL)]
@@ -0,0 +1,90 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from yaml import dump as dump_yaml
+
+from api.importer import PriceListImport, PriceListError, STAGES
+from api.models import User, Shop, Product, ProductParameter, BestOffer
+from api.pricelist import iter_price_list, generate_goods, SYNTHETIC_CATEGORIES
+
+
+def price_list(goods, shop='Тестовый магазин'):
+    return ''.join(iter_price_list(shop, SYNTHETIC_CATEGORIES, goods)).encode()
+
+
+@pytest.fixture
+def partner():
+    return User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+
+
+@pytest.mark.django_db
+def test_import_records_every_stage(partner):
+    goods = list(generate_goods(50))
+    price_import = PriceListImport(partner.id, content=price_list(goods))
+    plan = price_import.run()
+
+    assert list(price_import.stats) == list(STAGES)
+    assert len(plan.create) == 50
+    assert Product.objects.filter(shop__user=partner).count() == 50
+    assert ProductParameter.objects.filter(product__shop__user=partner).count() == 150
+
+
+@pytest.mark.django_db
+def test_reimport_applies_only_changes(partner):
+    goods = list(generate_goods(20))
+    PriceListImport(partner.id, content=price_list(goods)).run()
+
+    plan = PriceListImport(partner.id, content=price_list(goods)).run()
+    assert plan.changed == 0
+    assert plan.unchanged == 20
+
+    goods[0]['price'] += 1
+    goods[1]['parameters']['Цвет'] = 'синий'
+    removed = goods.pop()
+    plan = PriceListImport(partner.id, content=price_list(goods)).run()
+    assert len(plan.update) == 1
+    assert plan.parameters_only == 1
+    assert plan.delete and not plan.create
+    assert not Product.objects.filter(external_id=removed['id']).exists()
+    assert ProductParameter.objects.count() == 19 * 3
+    assert Product.objects.get(external_id=goods[0]['id']).price == goods[0]['price']
+    assert ProductParameter.objects.get(product__external_id=goods[1]['id'], parameter__name='Цвет').value == 'синий'
+
+
+@pytest.mark.django_db
+def test_invalid_rows_abort_before_write(partner):
+    goods = list(generate_goods(3))
+    goods[1]['category'] = 999
+    goods[2]['price'] = 'дорого'
+    with pytest.raises(PriceListError) as error:
+        PriceListImport(partner.id, content=price_list(goods)).run()
+
+    assert [(row['row'], row['field']) for row in error.value.errors] == [(1, 'category'), (2, 'price')]
+    assert not Shop.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('categories, error', [
+    ({'id': 1}, 'Ожидается список категорий'),
+    (['Смартфоны'], 'Ожидается описание категории'),
+    ([{'name': 'Смартфоны'}], 'Ожидается целый неотрицательный id'),
+    ([{'id': '224', 'name': 'Смартфоны'}], 'Ожидается целый неотрицательный id'),
+    ([{'id': 224}], 'Не указано название категории'),
+])
+def test_malformed_categories_are_reported(partner, categories, error):
+    content = dump_yaml({'shop': 'Тестовый магазин', 'categories': categories, 'goods': []}, allow_unicode=True)
+    with pytest.raises(PriceListError) as raised:
+        PriceListImport(partner.id, content=content.encode()).run()
+    assert [row['error'] for row in raised.value.errors] == [error]
+    assert not Shop.objects.exists()
+
+
+@pytest.mark.django_db
+def test_offers_are_rebuilt_in_refresh_stage(partner):
+    price_import = PriceListImport(partner.id, content=price_list(list(generate_goods(5))))
+    price_import.run()
+    assert BestOffer.objects.filter(shop__user=partner).count() == 5
+
+    with CaptureQueriesContext(connection) as queries:
+        price_import.refresh()
+    assert any('api_bestoffer' in query['sql'] for query in queries)
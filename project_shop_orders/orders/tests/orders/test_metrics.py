@@ -0,0 +1,113 @@
+import fcntl
+import os
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.metrics import Registry, registry, merge, exposition
+from api.models import Shop
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    registry.reset()
+    yield
+    registry.reset()
+
+
+def test_histogram_exposition():
+    registry.observe('http_request_duration_seconds', (('view', 'cart'), ('method', 'GET')), 0.02)
+    registry.observe('http_request_duration_seconds', (('view', 'cart'), ('method', 'GET')), 3)
+    text = exposition()
+
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_bucket{view="cart",method="GET",le="0.025"} 1' in text
+    assert 'http_request_duration_seconds_bucket{view="cart",method="GET",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{view="cart",method="GET"} 2' in text
+
+
+def test_merge_sums_processes():
+    first, second = Registry(), Registry()
+    labels = (('view', 'shops'), ('method', 'GET'))
+    first.inc('http_db_queries_total', labels, 2)
+    second.inc('http_db_queries_total', labels, 3)
+    second.observe('http_request_duration_seconds', labels, 0.2)
+    first.observe('http_request_duration_seconds', labels, 0.3)
+
+    counters, histograms, _ = merge([first.snapshot(), second.snapshot()])
+    assert counters[('http_db_queries_total', labels)] == 5
+    assert histograms[('http_request_duration_seconds', labels)][-1] == 2
+
+
+@pytest.mark.django_db
+def test_middleware_records_requests(settings, tmp_path):
+    settings.METRICS_MULTIPROCESS_DIR = str(tmp_path)
+    settings.METRICS_FLUSH_INTERVAL = 0
+    write_snapshot(tmp_path, f'{os.getppid()}-worker', 10)
+    Shop.objects.create(name='Связной')
+
+    client = APIClient()
+    assert client.get('/shops').status_code == 200
+    text = client.get('/metrics').content.decode()
+
+    assert 'http_requests_total{view="shops",method="GET",status="200"} 11' in text
+    # время изменения каталога для Last-Modified и сам список магазинов
+    assert 'http_db_queries_total{view="shops",method="GET"} 2' in text
+    assert 'http_serializer_duration_seconds_total{view="shops",method="GET"}' in text
+    assert list(tmp_path.glob('metrics-*.json'))
+
+
+def write_snapshot(directory, name, requests, alive=True):
+    """Снимок другого процесса; для работающего процесса его файл блокировки удерживается"""
+    lock = open(directory / f'metrics-{name}.lock', 'w')
+    if alive:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    else:
+        lock.close()
+    (directory / f'metrics-{name}.json').write_text(
+        '{"counters": [["http_requests_total", [["view", "shops"], ["method", "GET"], ["status", 200]], %d]],'
+        ' "histograms": [], "buckets": {}}' % requests)
+    return lock
+
+
+def test_finished_processes_keep_their_counts(settings, tmp_path):
+    settings.METRICS_MULTIPROCESS_DIR = str(tmp_path)
+    line = 'http_requests_total{view="shops",method="GET",status="200"} %d'
+    live = write_snapshot(tmp_path, '100-live', 7)
+    write_snapshot(tmp_path, '101-gone', 5, alive=False)
+    assert line % 12 in exposition()
+    assert not (tmp_path / 'metrics-101-gone.json').exists()
+    assert (tmp_path / 'metrics-100-live.json').exists()
+
+    live.close()
+    write_snapshot(tmp_path, '102-gone', 3, alive=False)
+    assert line % 15 in exposition()
+    assert line % 15 in exposition()
+    assert sorted(path.name for path in tmp_path.glob('metrics-*.json')) == ['metrics-finished.json']
+
+
+def test_idle_process_flushes_last_interval(settings, tmp_path):
+    settings.METRICS_MULTIPROCESS_DIR = str(tmp_path)
+    settings.METRICS_FLUSH_INTERVAL = 0.1
+    registry.inc('http_db_queries_total', (('view', 'shops'),), 1)
+    registry.maybe_flush()
+    registry.inc('http_db_queries_total', (('view', 'shops'),), 1)
+    registry.maybe_flush()
+    path = tmp_path / f'metrics-{registry.name(str(tmp_path))}.json'
+    assert '"shops"]],1]' in path.read_text().replace(' ', '')
+
+    time.sleep(0.3)
+    assert '"shops"]],2]' in path.read_text().replace(' ', '')
+
+
+@pytest.mark.django_db
+def test_metrics_require_internal_address_or_token(settings):
+    client = APIClient()
+    assert client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code == 403
+    assert client.get('/metrics').status_code == 200
+
+    settings.METRICS_TOKEN = 'secret'
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 403
+    assert client.get('/metrics', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer secret').status_code == 200
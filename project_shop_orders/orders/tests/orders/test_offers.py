@@ -0,0 +1,55 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.importer import PriceListImport
+from api.models import User, Shop, BestOffer
+from api.pricelist import iter_price_list, SYNTHETIC_CATEGORIES
+
+
+def price_list(shop, goods):
+    return ''.join(iter_price_list(shop, SYNTHETIC_CATEGORIES, goods)).encode()
+
+
+def item(external_id, price, quantity, model='apple/iphone/xr'):
+    return {'id': external_id, 'category': 224, 'model': model, 'name': f'iPhone XR {external_id}', 'price': price,
+            'price_rrc': price, 'quantity': quantity, 'parameters': {}}
+
+
+@pytest.fixture
+def partners():
+    partners = []
+    for number, (name, goods) in enumerate((
+            ('Связной', [item(1, 50000, 3), item(2, 1000, 5, model='xiaomi/mi9')]),
+            ('Евросеть', [item(7, 45000, 1), item(8, 40000, 0)])), start=1):
+        partner = User.objects.create_user(email=f'shop{number}@example.com', password='Pass-12345', type='shop')
+        PriceListImport(partner.id, content=price_list(name, goods)).run()
+        partners.append(partner)
+    return partners
+
+
+def offers(model='apple/iphone/xr'):
+    return [(offer['shop'], offer['price']) for offer in APIClient().get('/products/offers', {'model': model}).data]
+
+
+@pytest.mark.django_db
+def test_offers_sorted_by_price_with_stock(partners):
+    assert offers() == [('Евросеть', 45000), ('Связной', 50000)]
+    assert offers('xiaomi/mi9') == [('Связной', 1000)]
+    assert APIClient().get('/products/offers').status_code == 400
+
+
+@pytest.mark.django_db
+def test_import_refreshes_offers(partners):
+    PriceListImport(partners[1].id, content=price_list('Евросеть', [item(7, 45000, 0), item(8, 40000, 2)])).run()
+    assert offers() == [('Евросеть', 40000), ('Связной', 50000)]
+
+
+@pytest.mark.django_db
+def test_partner_state_toggles_offers(partners):
+    client = APIClient()
+    client.force_authenticate(partners[1])
+    client.post('/partner/state', {'state': 'off'})
+    assert offers() == [('Связной', 50000)]
+    client.post('/partner/state', {'state': 'on'})
+    assert offers() == [('Евросеть', 45000), ('Связной', 50000)]
+    assert BestOffer.objects.count() == 3
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import User, Shop, Category, Order, OrderItem, Contact
+
+
+@pytest.fixture
+def buyer():
+    return User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+
+
+@pytest.fixture
+def client(buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client
+
+
+def make_orders(buyer, count, status='new', created=None):
+    partner, _ = User.objects.get_or_create(email='shop@example.com', type='shop')
+    shop, _ = Shop.objects.get_or_create(name='Связной', user=partner)
+    category, _ = Category.objects.get_or_create(id=224, name='Смартфоны')
+    contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+    orders = Order.objects.bulk_create([Order(user=buyer, status=status, contact=contact) for _ in range(count)])
+    OrderItem.objects.bulk_create([OrderItem(order=order, shop=shop, category=category, product_name=f'Товар {number}',
+                                             external_id=number, quantity=2, price=100, total_amount=200)
+                                   for order in orders for number in range(3)])
+    if created:
+        Order.objects.filter(id__in=[order.id for order in orders]).update(created=created)
+    return orders
+
+
+@pytest.mark.django_db
+def test_order_detail_query_count_does_not_grow(client, buyer):
+    make_orders(buyer, 2)
+    with CaptureQueriesContext(connection) as small:
+        client.get('/order')
+    make_orders(buyer, 10)
+    with CaptureQueriesContext(connection) as large:
+        data = client.get('/order').data
+    assert len(large) == len(small)
+    assert data[0]['total_sum'] == 600
+    assert data[0]['ordered_items'][0]['shop'] == 'Связной'
+    assert data[0]['contact']['city'] == 'Москва'
+
+
+@pytest.mark.django_db
+def test_order_summary_is_one_query(client, buyer):
+    orders = make_orders(buyer, 3)
+    with CaptureQueriesContext(connection) as queries:
+        data = client.get('/order', {'view': 'summary'}).data
+    assert len([query for query in queries if query['sql'].startswith('SELECT')]) == 1
+    assert sorted(order['id'] for order in data) == sorted(order.id for order in orders)
+    assert set(data[0]) == {'id', 'status', 'created', 'total_sum', 'total_quantity'}
+    assert data[0]['total_quantity'] == 6
+
+
+@pytest.mark.django_db
+def test_order_history_filters(client, buyer):
+    old = make_orders(buyer, 1, status='delivered', created=datetime(2026, 1, 10, 12, tzinfo=timezone.utc))[0]
+    recent = make_orders(buyer, 1, created=datetime(2026, 3, 1, 12, tzinfo=timezone.utc))[0]
+
+    def ids(**params):
+        return [order['id'] for order in client.get('/order', {'view': 'summary', **params}).data]
+
+    assert ids(created_from='2026-02-01') == [recent.id]
+    assert ids(created_to='2026-01-10') == [old.id]
+    assert ids(status='delivered,canceled') == [old.id]
+    assert client.get('/order', {'created_from': 'вчера'}).status_code == 400
@@ -0,0 +1,91 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import User, Shop, Order, OrderItem, Shipment
+from orders.celery import celery_app
+
+
+@pytest.fixture(autouse=True)
+def eager():
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+
+
+@pytest.fixture
+def partner():
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    Shop.objects.create(name='Связной', user=partner)
+    return partner
+
+
+@pytest.fixture
+def client(partner):
+    client = APIClient()
+    client.force_authenticate(partner)
+    return client
+
+
+def make_orders(partner, count, status='new'):
+    buyer, _ = User.objects.get_or_create(email='buyer@example.com')
+    orders = Order.objects.bulk_create([Order(user=buyer, status=status) for _ in range(count)])
+    OrderItem.objects.bulk_create([OrderItem(order=order, shop=partner.shop, product_name='Товар', external_id=1)
+                                   for order in orders])
+    Shipment.objects.bulk_create([Shipment(order=order, shop=partner.shop, status=status) for order in orders])
+    return orders
+
+
+@pytest.mark.django_db
+def test_orders_move_with_one_update_per_status(client, partner, mailoutbox, django_capture_on_commit_callbacks):
+    orders = make_orders(partner, 6)
+    changes = [{'id': order.id, 'status': 'confirmed'} for order in orders[:4]] + \
+              [{'id': order.id, 'status': 'canceled'} for order in orders[4:]]
+
+    with django_capture_on_commit_callbacks(execute=True), CaptureQueriesContext(connection) as queries:
+        response = client.post('/partner/orders/status', {'orders': changes}, format='json')
+    assert response.data == {'status': True, 'updated': {'confirmed': 4, 'canceled': 2}}
+    assert len([query for query in queries if query['sql'].startswith('UPDATE')]) == 2
+    assert Order.objects.filter(status='confirmed').count() == 4
+    assert len(mailoutbox) == 6
+    assert mailoutbox[0].to == ['buyer@example.com']
+
+
+@pytest.mark.django_db
+def test_invalid_transition_rejects_whole_batch(client, partner, mailoutbox):
+    new, sent = make_orders(partner, 1)[0], make_orders(partner, 1, status='sent')[0]
+
+    response = client.post('/partner/orders/status', {'orders': [
+        {'id': new.id, 'status': 'confirmed'}, {'id': sent.id, 'status': 'new'}]}, format='json')
+    assert response.status_code == 400
+    assert [error['id'] for error in response.data['errors']] == [sent.id]
+    assert Order.objects.get(id=new.id).status == 'new'
+    assert not mailoutbox
+
+
+@pytest.mark.django_db
+def test_foreign_orders_are_not_found(client, partner):
+    other = User.objects.create_user(email='other@example.com', password='Pass-12345', type='shop')
+    Shop.objects.create(name='Евросеть', user=other)
+    order = make_orders(other, 1)[0]
+
+    response = client.post('/partner/orders/status', {'orders': [{'id': order.id, 'status': 'confirmed'}]},
+                           format='json')
+    assert response.status_code == 400
+    assert Order.objects.get(id=order.id).status == 'new'
+
+
+@pytest.mark.django_db
+def test_shared_orders_change_only_own_shipment(client, partner):
+    other = User.objects.create_user(email='other@example.com', password='Pass-12345', type='shop')
+    Shop.objects.create(name='Евросеть', user=other)
+    order = make_orders(partner, 1)[0]
+    OrderItem.objects.create(order=order, shop=other.shop, product_name='Другой товар', external_id=2)
+    Shipment.objects.create(order=order, shop=other.shop, status='new')
+
+    response = client.post('/partner/orders/status', {'orders': [{'id': order.id, 'status': 'canceled'}]},
+                           format='json')
+    assert response.status_code == 200
+    assert Shipment.objects.get(order=order, shop=partner.shop).status == 'canceled'
+    assert Shipment.objects.get(order=order, shop=other.shop).status == 'new'
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.metrics import registry
+from api.models import User, Order, OrderItem, ConfirmEmailToken
+from api.reaper import reap_carts, reap_confirm_tokens
+
+
+@pytest.fixture
+def buyers():
+    return User.objects.bulk_create([User(email=f'buyer{number}@example.com')
+                                     for number in range(25)])
+
+
+def make_carts(buyers, age_days, status='cart'):
+    orders = Order.objects.bulk_create([Order(user=buyer, status=status) for buyer in buyers])
+    Order.objects.filter(id__in=[order.id for order in orders]).update(
+        updated=timezone.now() - timedelta(days=age_days))
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_name='Товар', external_id=1) for order in orders])
+    return orders
+
+
+@pytest.mark.django_db
+def test_old_carts_are_removed_in_batches(buyers):
+    registry.reset()
+    make_carts(buyers[:20], age_days=40)
+    fresh = make_carts(buyers[20:], age_days=1)
+    placed = make_carts(buyers[:5], age_days=40, status='new')
+
+    with CaptureQueriesContext(connection) as queries:
+        result = reap_carts(days=30, batch_size=10)
+    assert result == {'orders': 20, 'items': 20}
+    assert set(Order.objects.values_list('id', flat=True)) == {order.id for order in fresh + placed}
+    # два окна по 10 ключей, в каждом отдельная транзакция
+    assert len([query for query in queries if query['sql'].startswith('SAVEPOINT')]) == 2
+    assert registry.counters[('reaper_deleted_rows_total', (('table', 'api_order'),))] == 20
+
+
+@pytest.mark.django_db
+def test_expired_confirm_tokens_are_removed(buyers):
+    tokens = [ConfirmEmailToken.objects.create(user=buyer) for buyer in buyers[:4]]
+    ConfirmEmailToken.objects.filter(id__in=[token.id for token in tokens[:3]]).update(
+        created_at=timezone.now() - timedelta(days=3))
+
+    assert reap_confirm_tokens(ttl=24 * 60 * 60, batch_size=2) == {'tokens': 3}
+    assert list(ConfirmEmailToken.objects.values_list('id', flat=True)) == [tokens[3].id]
+
+
+@pytest.mark.django_db
+def test_command_reports_counts(buyers):
+    make_carts(buyers[:3], age_days=40)
+    out = StringIO()
+    call_command('reap', '--days=30', stdout=out)
+    assert 'Корзин удалено: 3, позиций: 3' in out.getvalue()
+    assert 'Токенов удалено: 0' in out.getvalue()
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from api.models import User, Shop, Category, Product, Order, OrderItem, Shipment, RelatedProduct, CoPurchase
+from api.recommendations import co_purchases, top_related, refresh_recommendations
+
+
+@pytest.fixture
+def products():
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    shop = Shop.objects.create(name='Связной', user=partner)
+    category = Category.objects.create(id=224, name='Смартфоны')
+    return [Product.objects.create(name=f'Товар {number}', category=category, shop=shop, external_id=number,
+                                   quantity=5, price=100, price_rrc=110) for number in range(4)]
+
+
+def checkout(*baskets, shipment_id=None):
+    buyer, _ = User.objects.get_or_create(email='buyer@example.com')
+    for basket in baskets:
+        order = Order.objects.create(user=buyer, status='new')
+        OrderItem.objects.bulk_create([OrderItem(order=order, shop=product.shop, category=product.category,
+                                                 product_name=product.name, external_id=product.external_id)
+                                       for product in basket])
+        Shipment.objects.create(id=shipment_id, order=order, shop=basket[0].shop)
+
+
+def related(product):
+    return [item['id'] for item in APIClient().get(f'/products/{product.id}/related').data]
+
+
+def test_co_purchases_counts_pairs_within_orders():
+    orders = np.array([1, 1, 1, 2, 2, 3])
+    products = np.array([10, 20, 30, 10, 20, 10])
+    product, other, counts = co_purchases(orders, products, max_basket=50)
+    pairs = {(a, b): c for a, b, c in zip(product.tolist(), other.tolist(), counts.tolist())}
+    assert pairs == {(10, 20): 2, (20, 10): 2, (10, 30): 1, (30, 10): 1, (20, 30): 1, (30, 20): 1}
+
+    product, other, counts, rank = top_related(product, other, counts, top_k=1)
+    assert list(zip(product.tolist(), other.tolist(), rank.tolist())) == [(10, 20, 0), (20, 10, 0), (30, 10, 0)]
+
+
+def test_large_baskets_are_skipped():
+    product, _, _ = co_purchases(np.array([1, 1, 1, 2, 2]), np.array([10, 20, 30, 10, 20]), max_basket=2)
+    assert product.tolist() == [10, 20]
+
+
+@pytest.mark.django_db
+def test_related_products_endpoint(products):
+    first, second, third, fourth = products
+    checkout([first, second], [first, second, third], [first, third], [third, fourth])
+    refresh_recommendations(full=True)
+
+    assert related(first) == [second.id, third.id]
+    assert related(fourth) == [third.id]
+    assert RelatedProduct.objects.filter(product=third).count() == 3
+
+
+@pytest.mark.django_db
+def test_incremental_refresh_adds_new_orders(products):
+    first, second, third, fourth = products
+    checkout([first, second])
+    refresh_recommendations(full=True)
+    checkout([first, third], [first, third])
+
+    assert refresh_recommendations()['lines'] == 4
+    assert related(first) == [third.id, second.id]
+    assert related(second) == [first.id]
+
+
+@pytest.mark.django_db
+def test_refresh_without_orders(products):
+    assert refresh_recommendations(full=True) == {'lines': 0, 'pairs': 0, 'products': 0}
+    assert related(products[0]) == []
+
+
+@pytest.mark.django_db
+def test_orders_are_counted_once(products):
+    first, second, third, fourth = products
+    checkout([first, second])
+    refresh_recommendations()
+    cache.clear()
+
+    assert refresh_recommendations()['lines'] == 0
+    assert CoPurchase.objects.get(product=first, related=second).count == 1
+    assert not Shipment.objects.filter(counted=False).exists()
+
+
+@pytest.mark.django_db
+def test_late_orders_with_lower_ids_are_counted(products):
+    first, second, third, fourth = products
+    checkout([first, second], shipment_id=100)
+    refresh_recommendations()
+    # заказ, зафиксированный после запуска, но получивший меньший id
+    checkout([first, third], shipment_id=50)
+
+    assert refresh_recommendations()['lines'] == 2
+    assert related(first) == [second.id, third.id]
+    assert CoPurchase.objects.get(product=first, related=third).count == 1
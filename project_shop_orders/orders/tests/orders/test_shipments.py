@@ -0,0 +1,85 @@
+import pytest
+from rest_framework.test import APIClient
+from ujson import dumps as dump_json
+
+from api.models import User, Shop, Category, Product, Order, Contact, Shipment
+from orders.celery import celery_app
+
+
+@pytest.fixture(autouse=True)
+def eager():
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+
+
+@pytest.fixture
+def partners():
+    category = Category.objects.create(id=224, name='Смартфоны')
+    partners = []
+    for number, name in enumerate(('Связной', 'Евросеть'), start=1):
+        partner = User.objects.create_user(email=f'shop{number}@example.com', password='Pass-12345', type='shop')
+        shop = Shop.objects.create(name=name, user=partner)
+        Product.objects.create(name=f'Товар {number}', category=category, shop=shop, external_id=number,
+                               quantity=5, price=1000 * number, price_rrc=1100)
+        partners.append(partner)
+    return partners
+
+
+@pytest.fixture
+def order(partners):
+    buyer = User.objects.create_user(email='buyer@example.com', password='Pass-12345')
+    contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+    client = APIClient()
+    client.force_authenticate(buyer)
+    client.post('/cart', {'items': dump_json([{'external_id': 1, 'quantity': 2}, {'external_id': 2, 'quantity': 1}])})
+    cart = Order.objects.get()
+    client.post('/order', {'id': str(cart.id), 'contact': contact.id})
+    return cart
+
+
+def partner_client(partner):
+    client = APIClient()
+    client.force_authenticate(partner)
+    return client
+
+
+@pytest.mark.django_db
+def test_checkout_creates_shipment_per_shop(order, partners):
+    assert sorted(Shipment.objects.values_list('shop__name', 'total_sum', 'total_quantity', 'status')) == [
+        ('Евросеть', 2000, 1, 'new'), ('Связной', 2000, 2, 'new')]
+
+    data = partner_client(partners[0]).get('/partner/orders').data
+    assert [(shipment['id'], shipment['total_sum']) for shipment in data] == [(order.id, 2000)]
+    assert data[0]['shipment_id'] == Shipment.objects.get(shop__user=partners[0]).id
+    assert [item['product_name'] for item in data[0]['ordered_items']] == ['Товар 1']
+    assert data[0]['contact']['city'] == 'Москва'
+
+
+@pytest.mark.django_db
+def test_order_status_follows_shipments(order, partners, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        partner_client(partners[0]).post('/partner/orders/status', {'orders': [
+            {'id': order.id, 'status': 'confirmed'}]}, format='json')
+    assert Order.objects.get().status == 'new'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        partner_client(partners[1]).post('/partner/orders/status', {'orders': [
+            {'id': order.id, 'status': 'canceled'}]}, format='json')
+    assert Order.objects.get().status == 'confirmed'
+
+
+@pytest.mark.django_db
+def test_listed_id_is_accepted_by_status_change(partners, order):
+    # пересозданные отправления получают идентификаторы, не совпадающие с id заказа
+    Shipment.objects.filter(order=order).delete()
+    Shipment.objects.bulk_create([Shipment(order=order, shop=Shop.objects.get(user=partner))
+                                  for partner in reversed(partners)])
+    client = partner_client(partners[0])
+    listed = client.get('/partner/orders').data[0]
+    assert listed['shipment_id'] != listed['id']
+
+    response = client.post('/partner/orders/status', {'orders': [
+        {'id': listed['id'], 'status': 'confirmed', 'version': listed['version']}]}, format='json')
+    assert response.status_code == 200
+    assert Shipment.objects.get(id=listed['shipment_id']).status == 'confirmed'
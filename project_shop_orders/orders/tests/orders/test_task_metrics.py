@@ -0,0 +1,63 @@
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from api.metrics import registry
+from api.models import User
+from api.pricelist import write_price_list
+from api.tasks import send_email, get_import
+from orders.celery import celery_app
+
+
+@celery_app.task()
+def failing_task():
+    raise ValueError('boom')
+
+
+@pytest.fixture(autouse=True)
+def eager():
+    registry.reset()
+    celery_app.conf.task_always_eager = True
+    yield
+    celery_app.conf.task_always_eager = False
+    registry.reset()
+
+
+@pytest.fixture
+def price_list_url(tmp_path):
+    write_price_list(tmp_path / 'shop.yaml', 30, shop='Магазин')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(SimpleHTTPRequestHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/shop.yaml'
+    server.shutdown()
+    server.server_close()
+
+
+def test_task_runs_are_recorded(mailoutbox):
+    send_email.delay('Статус заказа', 'Заказ собран', 'buyer@example.com')
+
+    labels = (('task', 'api.tasks.send_email'),)
+    assert len(mailoutbox) == 1
+    assert registry.counters[('celery_task_runs_total', labels + (('state', 'SUCCESS'),))] == 1
+    assert registry.histograms[('celery_task_run_duration_seconds', labels)][-1] == 1
+    assert registry.histograms[('celery_task_payload_bytes', labels)][-2] > 0
+
+
+def test_task_failures_are_recorded():
+    failing_task.apply()
+
+    labels = (('task', failing_task.name),)
+    assert registry.counters[('celery_task_failures_total', labels + (('exception', 'ValueError'),))] == 1
+    assert registry.counters[('celery_task_runs_total', labels + (('state', 'FAILURE'),))] == 1
+
+
+@pytest.mark.django_db
+def test_import_task_records_stage_rates(price_list_url):
+    partner = User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop')
+    result = get_import.delay(partner.id, price_list_url).get()
+
+    assert result['Status'] is True
+    assert registry.counters[('import_stage_rows_total', (('stage', 'write'),))] == 30
+    assert registry.histograms[('import_stage_rows_per_second', (('stage', 'parse'),))][-1] == 1
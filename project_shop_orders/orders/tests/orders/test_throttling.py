@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from api.throttling import SlidingWindowScopedRateThrottle, MemoryWindowStore, get_store
+
+
+class ScopedView(APIView):
+    throttle_scope = 'test'
+
+
+@pytest.fixture
+def memory_store(settings):
+    settings.THROTTLE_STORE = 'api.throttling.MemoryWindowStore'
+    store = get_store()
+    store.clear()
+    return store
+
+
+def anonymous_request():
+    request = APIRequestFactory().get('/')
+    request.user = AnonymousUser()
+    return request
+
+
+def make_throttle(now):
+    throttle = SlidingWindowScopedRateThrottle()
+    throttle.THROTTLE_RATES = {'test': '50/min'}
+    throttle.timer = lambda: now
+    return throttle
+
+
+def test_limit_is_exact_under_concurrency(memory_store):
+    request = anonymous_request()
+    allowed = []
+
+    def worker():
+        for _ in range(20):
+            allowed.append(make_throttle(6000.0).allow_request(request, ScopedView()))
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed.count(True) == 50
+    assert memory_store.get('throttle_test_127.0.0.1:100') == 50
+
+
+def test_previous_window_is_weighted(memory_store):
+    request = anonymous_request()
+    for _ in range(50):
+        assert make_throttle(6000.0).allow_request(request, ScopedView())
+
+    # середина следующего окна: половина предыдущего окна еще учитывается
+    throttle = make_throttle(6090.0)
+    results = [make_throttle(6090.0).allow_request(request, ScopedView()) for _ in range(30)]
+    assert results.count(True) == 25
+    assert not throttle.allow_request(request, ScopedView())
+    assert 0 < throttle.wait() <= 30
+
+
+@pytest.mark.django_db
+def test_register_scope_is_enforced(monkeypatch):
+    monkeypatch.setitem(SlidingWindowScopedRateThrottle.THROTTLE_RATES, 'register', '2/hour')
+    client = APIClient()
+    statuses = [client.post('/user/register', {}).status_code for _ in range(3)]
+
+    assert statuses == [400, 400, 429]
@@ -0,0 +1,65 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import User, Contact
+
+
+@pytest.fixture
+def admin_client():
+    admin = User.objects.create_superuser(email='admin@example.com', password='Pass-12345')
+    client = APIClient()
+    client.force_authenticate(admin)
+    return client
+
+
+def make_users(count, prefix='user', **fields):
+    users = User.objects.bulk_create([User(email=f'{prefix}{number:03}@example.com', **fields)
+                                      for number in range(count)])
+    Contact.objects.bulk_create([Contact(user=user, city='Москва', street='Тверская', phone='+79990000000')
+                                 for user in users])
+    return users
+
+
+@pytest.mark.django_db
+def test_user_list_is_for_admins_only():
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(email='buyer@example.com', password='Pass-12345'))
+    assert client.get('/api/v1/user/').status_code == 403
+
+
+@pytest.mark.django_db
+def test_user_list_query_count_does_not_grow(admin_client):
+    make_users(5)
+    with CaptureQueriesContext(connection) as small:
+        admin_client.get('/api/v1/user/')
+    make_users(50, prefix='staff', company='Связной')
+    with CaptureQueriesContext(connection) as large:
+        response = admin_client.get('/api/v1/user/')
+    assert len(large) == len(small)
+    assert all(user['contacts'] for user in response.data['results'] if user['email'] != 'admin@example.com')
+
+
+@pytest.mark.django_db
+def test_user_list_pages_by_cursor(admin_client):
+    make_users(5)
+    response = admin_client.get('/api/v1/user/', {'page_size': 2})
+    emails = [user['email'] for user in response.data['results']]
+    while response.data['next']:
+        response = admin_client.get(response.data['next'])
+        emails += [user['email'] for user in response.data['results']]
+    assert emails == sorted(User.objects.values_list('email', flat=True))
+
+
+@pytest.mark.django_db
+def test_user_list_filters(admin_client):
+    make_users(3)
+    User.objects.create_user(email='shop@example.com', password='Pass-12345', type='shop', company='Связной')
+
+    def emails(**params):
+        return [user['email'] for user in admin_client.get('/api/v1/user/', params).data['results']]
+
+    assert emails(email='user00') == ['user000@example.com', 'user001@example.com', 'user002@example.com']
+    assert emails(type='shop') == ['shop@example.com']
+    assert emails(company='Связной') == ['shop@example.com']
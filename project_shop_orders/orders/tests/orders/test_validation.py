@@ -0,0 +1,56 @@
+import time
+
+from api.pricelist import generate_goods, SYNTHETIC_CATEGORIES
+from api.validation import validate_goods
+
+
+CATEGORY_IDS = {category_id for category_id, _ in SYNTHETIC_CATEGORIES}
+
+
+def errors(goods):
+    _, report = validate_goods(goods, CATEGORY_IDS)
+    return [(error['row'], error['field'], error['error']) for error in report.errors()]
+
+
+def test_valid_goods_become_columns():
+    goods = list(generate_goods(5))
+    columns, report = validate_goods(goods, CATEGORY_IDS)
+    assert not len(report)
+    assert columns['external_id'].tolist() == [1, 2, 3, 4, 5]
+    assert columns['price'].tolist() == [item['price'] for item in goods]
+    assert columns['name'][0] == goods[0]['name']
+
+
+def test_row_level_report():
+    goods = list(generate_goods(7))
+    goods[0]['price'] = -5
+    goods[1]['quantity'] = '12 шт'
+    goods[2]['price'] = goods[2]['price_rrc'] + 1
+    goods[3]['category'] = 999
+    goods[4]['id'] = goods[5]['id']
+    goods[4]['category'] = goods[5]['category']
+    del goods[6]['name']
+
+    assert errors(goods) == [
+        (0, 'price', 'Отрицательное значение'),
+        (1, 'quantity', 'Ожидается целое число'),
+        (2, 'price', 'Цена больше рекомендуемой розничной'),
+        (3, 'category', 'Неизвестная категория'),
+        (5, 'id', 'Товар с таким id и категорией уже есть в прайсе'),
+        (6, 'name', 'Не указано поле'),
+    ]
+
+
+def test_values_must_fit_positive_integer_field():
+    goods = list(generate_goods(2))
+    goods[0]['quantity'] = 2 ** 31
+    goods[1]['price'] = 1.5
+    assert [(row, field) for row, field, _ in errors(goods)] == [(0, 'quantity'), (1, 'price')]
+
+
+def test_validates_large_price_list_quickly():
+    goods = list(generate_goods(100000))
+    started = time.perf_counter()
+    _, report = validate_goods(goods, CATEGORY_IDS)
+    assert not len(report)
+    assert time.perf_counter() - started < 5